@@ -0,0 +1,490 @@
+"""
+Throughput and latency of the HTTP API under concurrent clients.
+
+Seeds a synthetic catalog, starts the app with uvicorn and runs a weighted
+mix of the beat, user and checkout endpoints from signed in clients.
+Reports requests per second and p50/p95/p99 latency per endpoint, and
+compares them with a baseline file to catch regressions. The committed
+baseline.json was recorded with the default settings against the test
+database, its "recorded_on" entry names the machine, Postgres version and
+timings. Record a new one before comparing runs from other hardware.
+
+    python -m benchmarks.api --clients 16 --duration 30
+    python -m benchmarks.api --save-baseline
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+import httpx
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from benchmarks.common import machine, percentile, wait_until_ready
+from benchmarks.postgres import database_url, disposable_postgres, test_database_env
+from benchmarks.seed import PASSWORD, WORDS, CatalogSize, email, seed
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+# Latency changes below this many milliseconds are noise, not regressions
+NOISE_FLOOR_MS = 2.0
+
+
+class Catalog:
+    """What the clients need to know about the seeded rows"""
+
+    def __init__(self, rows: Dict[str, List[Dict]]):
+        self.beat_ids = [row["beat_id"] for row in rows["beats"]]
+        self.producer_ids = sorted({row["user_id"] for row in rows["beats"]})
+        self.likes: Dict[int, Set[int]] = defaultdict(set)
+        like_counts: Dict[int, int] = defaultdict(int)
+        for row in rows["likes"]:
+            self.likes[row["user_id"]].add(row["beat_id"])
+            like_counts[row["beat_id"]] += 1
+        self.carts: Dict[int, Set[int]] = defaultdict(set)
+        for row in rows["carts"]:
+            self.carts[row["user_id"]].add(row["beat_id"])
+        self.cart_user_ids = sorted(self.carts)
+        # The same skew as the likes, most views go to a few beats
+        self.popular_beat_ids = sorted(
+            self.beat_ids, key=lambda beat_id: -like_counts[beat_id]
+        )[: max(len(self.beat_ids) // 20, 1)]
+
+    def beat_id(self, rng: random.Random) -> int:
+        pool = self.popular_beat_ids if rng.random() < 0.8 else self.beat_ids
+        return rng.choice(pool)
+
+
+class Client:
+    def __init__(self, http: httpx.AsyncClient, user_id: int, catalog: Catalog):
+        self.http = http
+        self.user_id = user_id
+        self.catalog = catalog
+        self.rng = random.Random(user_id)
+        self.liked = set(catalog.likes.get(user_id, ()))
+
+    async def call(self, endpoint: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        response = await self.http.request(method, url, **kwargs)
+        return endpoint, response, time.perf_counter() - started
+
+
+async def trending(client: Client):
+    return [await client.call("GET /beat/trending", "GET", "/beat/trending")]
+
+
+async def search(client: Client):
+    params = {"q": client.rng.choice(WORDS)}
+    if client.rng.random() < 0.5:
+        low = client.rng.randint(70, 150)
+        params.update(bpm_min=low, bpm_max=low + 20)
+    return [await client.call("GET /beat/search", "GET", "/beat/search", params=params)]
+
+
+async def track(client: Client):
+    beat_id = client.catalog.beat_id(client.rng)
+    return [await client.call("GET /beat/{beat_id}", "GET", f"/beat/{beat_id}")]
+
+
+async def tracks_batch(client: Client):
+    ids = [client.catalog.beat_id(client.rng) for _ in range(20)]
+    return [
+        await client.call("POST /beat/batch", "POST", "/beat/batch", json={"ids": ids})
+    ]
+
+
+async def play(client: Client):
+    beat_id = client.catalog.beat_id(client.rng)
+    return [
+        await client.call("POST /beat/{beat_id}/play", "POST", f"/beat/{beat_id}/play")
+    ]
+
+
+async def profile(client: Client):
+    user_id = client.rng.choice(client.catalog.producer_ids)
+    return [await client.call("GET /user/{user_id}", "GET", f"/user/{user_id}")]
+
+
+async def producer_tracks(client: Client):
+    user_id = client.rng.choice(client.catalog.producer_ids)
+    return [
+        await client.call(
+            "GET /user/{user_id}/tracks", "GET", f"/user/{user_id}/tracks"
+        )
+    ]
+
+
+async def liked(client: Client):
+    return [
+        await client.call(
+            "GET /user/{user_id}/liked", "GET", f"/user/{client.user_id}/liked"
+        )
+    ]
+
+
+async def cart(client: Client):
+    user_id = client.rng.choice(client.catalog.cart_user_ids)
+    return [
+        await client.call("GET /user/{user_id}/cart", "GET", f"/user/{user_id}/cart")
+    ]
+
+
+async def like_and_unlike(client: Client):
+    """Like a beat and take the like back, the catalog stays as seeded"""
+    beat_id = client.catalog.beat_id(client.rng)
+    while beat_id in client.liked:
+        beat_id = client.rng.choice(client.catalog.beat_ids)
+    url = f"/user/{client.user_id}/like/{beat_id}"
+    return [
+        await client.call("POST /user/{user_id}/like/{beat_id}", "POST", url),
+        await client.call("DELETE /user/{user_id}/like/{beat_id}", "DELETE", url),
+    ]
+
+
+async def checkout(client: Client):
+    """
+    Add a beat to the cart and buy only that one, the seeded carts stay as
+    they are. Some purchases are retried with the same key, like a client
+    that lost the response.
+    """
+    beat_id = client.catalog.beat_id(client.rng)
+    while beat_id in client.catalog.carts.get(client.user_id, ()):
+        beat_id = client.rng.choice(client.catalog.beat_ids)
+    body = {
+        "beat_ids": [beat_id],
+        "licenses": {beat_id: client.rng.choice(["mp3", "wav", "stems"])},
+    }
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+    calls = [
+        await client.call(
+            "POST /user/{user_id}/add_to_cart/{beat_id}",
+            "POST",
+            f"/user/{client.user_id}/add_to_cart/{beat_id}",
+        ),
+        await client.call(
+            "POST /order/checkout",
+            "POST",
+            "/order/checkout",
+            json=body,
+            headers=headers,
+        ),
+    ]
+    if client.rng.random() < 0.1:
+        calls.append(
+            await client.call(
+                "POST /order/checkout (retry)",
+                "POST",
+                "/order/checkout",
+                json=body,
+                headers=headers,
+            )
+        )
+    return calls
+
+
+# Weighted like the traffic of the site: mostly browsing, a few writes
+SCENARIOS: Dict[Callable, int] = {
+    trending: 20,
+    search: 10,
+    track: 20,
+    tracks_batch: 10,
+    play: 10,
+    profile: 5,
+    producer_tracks: 10,
+    liked: 5,
+    cart: 5,
+    like_and_unlike: 5,
+    checkout: 3,
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.recording = False
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        if not self.recording:
+            return
+        self.latencies[endpoint].append(seconds * 1000)
+        if not ok:
+            self.errors[endpoint] += 1
+
+
+def summarize(recorder: Recorder, duration: float) -> Dict[str, Dict[str, float]]:
+    """Requests per second, errors and latency percentiles in ms per endpoint"""
+    everything = [value for values in recorder.latencies.values() for value in values]
+    summary = {}
+    for endpoint, latencies in sorted(
+        [*recorder.latencies.items(), ("all", everything)]
+    ):
+        if not latencies:
+            continue
+        errors = (
+            sum(recorder.errors.values())
+            if endpoint == "all"
+            else recorder.errors[endpoint]
+        )
+        summary[endpoint] = {
+            "requests": len(latencies),
+            "rps": len(latencies) / duration,
+            "errors": errors,
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+        }
+    return summary
+
+
+def compare_with_baseline(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float,
+) -> List[str]:
+    """Endpoints that got slower, lost throughput or started failing"""
+    regressions = []
+    for endpoint, before in baseline.items():
+        after = results.get(endpoint)
+        if after is None:
+            regressions.append(f"{endpoint}: no requests measured")
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            limit = max(before[key] * (1 + tolerance), before[key] + NOISE_FLOOR_MS)
+            if after[key] > limit:
+                regressions.append(
+                    f"{endpoint}: {key} {after[key]:.1f} > {before[key]:.1f}"
+                )
+        if after["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append(
+                f"{endpoint}: rps {after['rps']:.1f} < {before['rps']:.1f}"
+            )
+        if after["errors"] > before["errors"]:
+            regressions.append(
+                f"{endpoint}: errors {after['errors']} > {before['errors']}"
+            )
+    return regressions
+
+
+async def run_client(
+    client: Client, recorder: Recorder, deadline: float, rng: random.Random
+):
+    scenarios, weights = list(SCENARIOS), list(SCENARIOS.values())
+    while time.perf_counter() < deadline:
+        scenario = rng.choices(scenarios, weights)[0]
+        started = time.perf_counter()
+        try:
+            responses = await scenario(client)
+        except httpx.TransportError:
+            recorder.record(scenario.__name__, time.perf_counter() - started, False)
+            continue
+        for endpoint, response, seconds in responses:
+            recorder.record(endpoint, seconds, response.is_success)
+
+
+async def login(http: httpx.AsyncClient, user_id: int):
+    response = await http.post(
+        "/auth/login", data={"username": email(user_id), "password": PASSWORD}
+    )
+    response.raise_for_status()
+    # The cookie is marked secure and the benchmark runs over plain http
+    token = response.cookies["beats"]
+    http.cookies.clear()
+    http.cookies.set("beats", token)
+
+
+async def measure(
+    port: int, catalog: Catalog, clients: int, duration: float, warmup: float
+) -> Dict[str, Dict[str, float]]:
+    base_url = f"http://127.0.0.1:{port}"
+    # Listeners with likes, their liked lists are not empty
+    user_ids = sorted(
+        user_id
+        for user_id, liked in catalog.likes.items()
+        if liked and user_id not in catalog.producer_ids
+    )[:clients]
+    if len(user_ids) < clients:
+        raise RuntimeError("Not enough users with likes, seed a larger catalog")
+
+    https = [httpx.AsyncClient(base_url=base_url, timeout=60) for _ in user_ids]
+    try:
+        await wait_until_ready(https[0], "/monitoring/cache")
+        await asyncio.gather(*(login(http, u) for http, u in zip(https, user_ids)))
+
+        recorder = Recorder()
+        started = time.perf_counter()
+        deadline = started + warmup + duration
+
+        async def start_recording():
+            await asyncio.sleep(warmup)
+            recorder.recording = True
+
+        await asyncio.gather(
+            start_recording(),
+            *(
+                run_client(
+                    Client(http, user_id, catalog), recorder, deadline, random.Random(i)
+                )
+                for i, (http, user_id) in enumerate(zip(https, user_ids))
+            ),
+        )
+    finally:
+        await asyncio.gather(*(http.aclose() for http in https))
+    return summarize(recorder, duration)
+
+
+async def postgres_version(url: str) -> str:
+    engine = create_async_engine(url)
+    try:
+        async with engine.connect() as connection:
+            return await connection.scalar(text("SHOW server_version"))
+    finally:
+        await engine.dispose()
+
+
+@contextmanager
+def app_server(port: int, env: Dict[str, str], workers: int) -> Iterator[None]:
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "src.app.app:app",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ],
+        env={**os.environ, **env, "DB_REPLICA_HOST": ""},
+    )
+    try:
+        yield
+    finally:
+        server.terminate()
+        server.wait()
+
+
+@contextmanager
+def database(kind: str, port: int) -> Iterator[Dict[str, str]]:
+    if kind == "test":
+        yield test_database_env()
+    else:
+        with disposable_postgres(port) as env:
+            yield env
+
+
+def print_summary(summary: Dict[str, Dict[str, float]]):
+    print(f"{'endpoint':40} {'requests':>9} {'rps':>8} {'errors':>7}", end="")
+    print(f" {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8}")
+    for endpoint, values in summary.items():
+        print(
+            f"{endpoint:40} {values['requests']:>9} {values['rps']:>8.1f}"
+            f" {values['errors']:>7} {values['p50_ms']:>8.1f}"
+            f" {values['p95_ms']:>8.1f} {values['p99_ms']:>8.1f}"
+        )
+
+
+def read_baseline(path: Path, settings: Dict[str, Any]) -> Optional[Dict]:
+    if not path.exists():
+        print(f"No baseline at {path}, record one with --save-baseline")
+        return None
+    baseline = json.loads(path.read_text())
+    if baseline["settings"] != settings:
+        print("The baseline was recorded with other settings, not comparing")
+        return None
+    recorded_on = baseline.get("recorded_on")
+    if recorded_on:
+        print(
+            f"Comparing with a baseline from {recorded_on['cpus']} x"
+            f" {recorded_on['cpu']}, Postgres {recorded_on['postgres']}"
+        )
+    return baseline["endpoints"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--database",
+        choices=["disposable", "test"],
+        default="disposable",
+        help="a throwaway local cluster, or the TEST_DB_* database (overwritten)",
+    )
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--producers", type=int, default=200)
+    parser.add_argument("--beats", type=int, default=5000)
+    parser.add_argument("--likes", type=int, default=50000)
+    parser.add_argument("--carts", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--postgres-port", type=int, default=55432)
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="allowed relative change"
+    )
+    args = parser.parse_args()
+
+    size = CatalogSize(args.users, args.producers, args.beats, args.likes, args.carts)
+    settings = {
+        **size.as_dict(),
+        "seed": args.seed,
+        "clients": args.clients,
+        "workers": args.workers,
+    }
+
+    with database(args.database, args.postgres_port) as env:
+        rows = asyncio.run(seed(database_url(env), size, args.seed))
+        server_version = asyncio.run(postgres_version(database_url(env)))
+        catalog = Catalog(rows)
+        with app_server(args.port, env, args.workers):
+            summary = asyncio.run(
+                measure(args.port, catalog, args.clients, args.duration, args.warmup)
+            )
+
+    print_summary(summary)
+    results = {
+        "settings": settings,
+        "recorded_on": {
+            **machine(),
+            "postgres": server_version,
+            "database": args.database,
+            "duration": args.duration,
+            "warmup": args.warmup,
+        },
+        "endpoints": summary,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2))
+        print(f"Saved the baseline to {args.baseline}")
+        return
+
+    baseline = read_baseline(args.baseline, settings)
+    if baseline is None:
+        return
+    regressions = compare_with_baseline(summary, baseline, args.tolerance)
+    for regression in regressions:
+        print("REGRESSION", regression)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import asyncio
+import os
+import platform
+import statistics
+from typing import Any, Dict, List
+
+import httpx
+
+
+def percentile(values: List[float], q: int) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+async def wait_until_ready(client: httpx.AsyncClient, path: str = "/ping"):
+    for _ in range(300):
+        try:
+            await client.get(path)
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("Benchmark server did not start")
+
+
+def machine() -> Dict[str, Any]:
+    """The hardware a run was measured on, numbers from other machines differ"""
+    cpu = platform.processor()
+    try:
+        with open("/proc/cpuinfo") as cpuinfo:
+            for line in cpuinfo:
+                if line.startswith("model name"):
+                    cpu = line.split(":", 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    try:
+        memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        memory = None
+    return {
+        "cpu": cpu,
+        "cpus": os.cpu_count(),
+        "memory_gb": round(memory / 2**30, 1) if memory else None,
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+    }
@@ -0,0 +1,125 @@
+"""
+Latency of unrelated requests while a worker is busy with logins.
+
+Starts a uvicorn worker serving ``GET /ping`` next to a ``POST /login`` that
+verifies a bcrypt hash, either inline on the event loop or through the
+password hashing pool, and measures ``/ping`` during a login storm.
+
+    python -m benchmarks.password_hashing --duration 10 --logins 8
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from typing import Dict
+
+import httpx
+from fastapi import FastAPI
+
+from benchmarks.common import percentile, wait_until_ready
+from src.auth.passwords import password_helper
+
+PASSWORD = "benchmark-password"
+
+
+def create_app() -> FastAPI:
+    mode = os.environ["BENCH_HASH_MODE"]
+    hashed_password = password_helper.hash(PASSWORD)
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.post("/login")
+    async def login():
+        if mode == "inline":
+            verified, _ = password_helper.verify_and_update(PASSWORD, hashed_password)
+        else:
+            verified, _ = await password_helper.verify_and_update_async(
+                PASSWORD, hashed_password
+            )
+        return {"verified": verified}
+
+    return app
+
+
+async def storm(client: httpx.AsyncClient, deadline: float) -> int:
+    logins = 0
+    while time.perf_counter() < deadline:
+        await client.post("/login")
+        logins += 1
+    return logins
+
+
+async def probe(client: httpx.AsyncClient, deadline: float, interval: float):
+    latencies = []
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await client.get("/ping")
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def measure(port: int, duration: float, logins: int) -> Dict[str, float]:
+    base_url = f"http://127.0.0.1:{port}"
+    limits = httpx.Limits(max_connections=logins + 1)
+    async with httpx.AsyncClient(
+        base_url=base_url, timeout=60, limits=limits
+    ) as client:
+        await wait_until_ready(client)
+        deadline = time.perf_counter() + duration
+        results = await asyncio.gather(
+            probe(client, deadline, interval=0.01),
+            *(storm(client, deadline) for _ in range(logins)),
+        )
+
+    latencies = [latency * 1000 for latency in results[0]]
+    return {
+        "logins_per_second": sum(results[1:]) / duration,
+        "ping_p50_ms": percentile(latencies, 50),
+        "ping_p95_ms": percentile(latencies, 95),
+        "ping_p99_ms": percentile(latencies, 99),
+        "ping_max_ms": max(latencies),
+    }
+
+
+def run(mode: str, port: int, duration: float, logins: int) -> Dict[str, float]:
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "benchmarks.password_hashing:create_app",
+            "--factory",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        env={**os.environ, "BENCH_HASH_MODE": mode},
+    )
+    try:
+        return asyncio.run(measure(port, duration, logins))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--logins", type=int, default=8, help="concurrent logins")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    for mode in ("inline", "pooled"):
+        result = run(mode, args.port, args.duration, args.logins)
+        print(mode, " ".join(f"{key}={value:.1f}" for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    main()
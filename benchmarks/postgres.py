@@ -0,0 +1,91 @@
+"""
+Databases to benchmark against.
+
+The queries use Postgres features (arrays, ``ON CONFLICT``, writable CTEs,
+full-text search), so there is no SQLite stand-in: either a throwaway
+cluster is created with the ``initdb`` and ``pg_ctl`` found on the PATH,
+or the ``TEST_DB_*`` database of the test suite is used.
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+from src.config import (
+    TEST_DB_HOST,
+    TEST_DB_NAME,
+    TEST_DB_PASS,
+    TEST_DB_PORT,
+    TEST_DB_USER,
+)
+
+USER = "bench"
+DATABASE = "bench"
+
+
+def database_url(env: Dict[str, str]) -> str:
+    return (
+        f"postgresql+asyncpg://{env['DB_USER']}:{env['DB_PASS']}"
+        f"@{env['DB_HOST']}:{env['DB_PORT']}/{env['DB_NAME']}"
+    )
+
+
+def test_database_env() -> Dict[str, str]:
+    """The database of the test suite, its content is replaced by the seed"""
+    if not TEST_DB_HOST:
+        raise RuntimeError("TEST_DB_HOST is not set")
+    return {
+        "DB_USER": TEST_DB_USER,
+        "DB_PASS": TEST_DB_PASS or "",
+        "DB_HOST": TEST_DB_HOST,
+        "DB_PORT": TEST_DB_PORT or "5432",
+        "DB_NAME": TEST_DB_NAME,
+    }
+
+
+def _run(*args: str):
+    subprocess.run(args, check=True, stdout=subprocess.DEVNULL)
+
+
+@contextmanager
+def disposable_postgres(port: int) -> Iterator[Dict[str, str]]:
+    """
+    Run a Postgres cluster in a temporary directory for the duration of the
+    block, yields the ``DB_*`` settings of the app for it.
+    """
+    if shutil.which("initdb") is None or shutil.which("pg_ctl") is None:
+        raise RuntimeError(
+            "initdb and pg_ctl are not on the PATH, install Postgres or use --database test"
+        )
+
+    directory = tempfile.mkdtemp(prefix="beats-bench-")
+    data = os.path.join(directory, "data")
+    try:
+        _run("initdb", "-D", data, "-U", USER, "--auth=trust", "--no-sync")
+        _run(
+            "pg_ctl",
+            "start",
+            "-D",
+            data,
+            "-w",
+            "-l",
+            os.path.join(directory, "postgres.log"),
+            # No durability needed, the cluster is thrown away
+            "-o",
+            f"-p {port} -k {directory} -c fsync=off -c synchronous_commit=off",
+        )
+        try:
+            _run("createdb", "-h", directory, "-p", str(port), "-U", USER, DATABASE)
+            yield {
+                "DB_USER": USER,
+                "DB_PASS": "",
+                "DB_HOST": "127.0.0.1",
+                "DB_PORT": str(port),
+                "DB_NAME": DATABASE,
+            }
+        finally:
+            _run("pg_ctl", "stop", "-D", data, "-m", "fast", "-w")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
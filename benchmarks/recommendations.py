@@ -0,0 +1,101 @@
+"""
+Latency of similar beats and recommendations on a large catalog.
+
+Builds the feature matrix from a seeded catalog, the same rows the API
+benchmark loads into Postgres, then times single and batched queries on
+one core and the cost of applying a like.
+
+    python -m benchmarks.recommendations --beats 100000 --likes 1000000
+"""
+import argparse
+import random
+import time
+from typing import Callable, Dict, List
+
+from benchmarks.common import percentile
+from benchmarks.seed import CatalogSize, generate_catalog
+from src.recommendations import FeatureMatrix
+
+
+def build(rows: Dict[str, List[Dict]]) -> FeatureMatrix:
+    features = FeatureMatrix()
+    beats = rows["beats"]
+    features.add_beats(
+        [row["beat_id"] for row in beats],
+        [row["bpm"] for row in beats],
+        [row["price_amount"] for row in beats],
+        [row["duration_seconds"] for row in beats],
+    )
+    features.add_likes(
+        [row["user_id"] for row in rows["likes"]],
+        [row["beat_id"] for row in rows["likes"]],
+    )
+    return features
+
+
+def timed(call: Callable[[], object], repeat: int) -> Dict[str, float]:
+    call()
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        durations.append((time.perf_counter() - started) * 1000)
+    return {
+        "p50_ms": percentile(durations, 50),
+        "p95_ms": percentile(durations, 95),
+        "max_ms": max(durations),
+    }
+
+
+def run(size: CatalogSize, repeat: int, batch: int) -> Dict[str, Dict[str, float]]:
+    rows = generate_catalog(size, seed=1)
+    started = time.perf_counter()
+    features = build(rows)
+    build_seconds = time.perf_counter() - started
+
+    rng = random.Random(2)
+    liked: Dict[int, List[int]] = {}
+    for row in rows["likes"]:
+        liked.setdefault(row["user_id"], []).append(row["beat_id"])
+    users = list(liked)
+
+    def similar():
+        features.similar([rng.randint(1, size.beats)], 10)
+
+    def similar_batch():
+        features.similar([rng.randint(1, size.beats) for _ in range(batch)], 10)
+
+    def recommend():
+        user_liked = liked[rng.choice(users)]
+        features.top_k(features.profile(user_liked), 20, [user_liked])
+
+    def like():
+        features.add_likes([rng.randint(1, size.users)], [rng.randint(1, size.beats)])
+
+    return {
+        "build": {"seconds": build_seconds, "dims": features.dims},
+        "similar": timed(similar, repeat),
+        f"similar_batch_{batch}": timed(similar_batch, max(repeat // batch, 5)),
+        "recommend": timed(recommend, repeat),
+        "like": timed(like, repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--beats", type=int, default=100000)
+    parser.add_argument("--likes", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=32)
+    args = parser.parse_args()
+
+    size = CatalogSize(
+        users=args.users, producers=500, beats=args.beats, likes=args.likes, carts=0
+    )
+    for name, result in run(size, args.repeat, args.batch).items():
+        print(name, " ".join(f"{key}={value:.2f}" for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    main()
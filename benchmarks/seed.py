@@ -0,0 +1,214 @@
+"""
+Deterministic synthetic catalog for the API benchmarks.
+
+Drops and recreates every table, then inserts users, beats, likes and cart
+entries. Popularity is skewed like a real catalog: a few beats collect most
+likes and plays. The same seed and sizes always produce the same rows.
+
+    python -m benchmarks.seed --users 1000 --beats 5000 --likes 50000
+"""
+import argparse
+import asyncio
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List
+
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import src.app  # noqa: F401 registers every table on the metadata
+from benchmarks.postgres import database_url, test_database_env
+from src.auth.models import roles, users
+from src.auth.passwords import password_helper
+from src.beats.models import beats
+from src.database import metadata
+from src.users.models import carts, likes
+from src.users.reconcile import (
+    repair_author_totals_statement,
+    repair_beat_likes_statement,
+)
+
+PASSWORD = "benchmark-password"
+WORDS = [
+    "night",
+    "drill",
+    "trap",
+    "soul",
+    "lofi",
+    "summer",
+    "dark",
+    "gold",
+    "vibe",
+    "wave",
+    "smoke",
+    "city",
+    "dream",
+    "piano",
+    "guitar",
+    "bounce",
+]
+PRICES = ["19.99", "24.99", "29.99", "49.99", "99.99"]
+INSERT_BATCH = 5000
+
+
+class CatalogSize:
+    def __init__(
+        self,
+        users: int = 1000,
+        producers: int = 200,
+        beats: int = 5000,
+        likes: int = 50000,
+        carts: int = 5000,
+    ):
+        self.users = users
+        self.producers = min(producers, users)
+        self.beats = beats
+        self.likes = min(likes, users * beats)
+        self.carts = min(carts, users * beats)
+
+    def as_dict(self) -> Dict[str, int]:
+        return dict(vars(self))
+
+
+def email(user_id: int) -> str:
+    return f"user{user_id}@bench.local"
+
+
+def _skewed_index(rng: random.Random, size: int) -> int:
+    """Index in ``range(size)``, low indexes are much more likely"""
+    return min(int(rng.paretovariate(1.1)) - 1, size - 1)
+
+
+def _pairs(rng: random.Random, count: int, size: CatalogSize, skewed: bool):
+    pairs = set()
+    while len(pairs) < count:
+        user_id = rng.randint(1, size.users)
+        if skewed:
+            beat_id = _skewed_index(rng, size.beats) + 1
+            # Spread the popular beats over the catalog
+            beat_id = (beat_id * 7919) % size.beats + 1
+        else:
+            beat_id = rng.randint(1, size.beats)
+        pairs.add((user_id, beat_id))
+    return sorted(pairs)
+
+
+def generate_catalog(size: CatalogSize, seed: int = 0) -> Dict[str, List[Dict]]:
+    """Rows of every seeded table, counters are fixed up after the insert"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    hashed_password = password_helper.hash(PASSWORD)
+
+    user_rows = [
+        {
+            "user_id": user_id,
+            "email": email(user_id),
+            "username": (
+                f"producer{user_id}"
+                if user_id <= size.producers
+                else f"listener{user_id}"
+            ),
+            "profile_photo": f"backend/images/profiles/{user_id}.jpg",
+            "registered_at": now - timedelta(days=rng.randint(30, 1000)),
+            "role_id": 1,
+            "total_likes": 0,
+            "total_plays": 0,
+            "hashed_password": hashed_password,
+            "is_active": True,
+            "is_superuser": False,
+            "is_verified": True,
+        }
+        for user_id in range(1, size.users + 1)
+    ]
+
+    beat_rows = []
+    for beat_id in range(1, size.beats + 1):
+        price = rng.choice(PRICES)
+        beat_rows.append(
+            {
+                "beat_id": beat_id,
+                "user_id": rng.randint(1, size.producers),
+                "title": " ".join(rng.sample(WORDS, 2)),
+                "price": price,
+                "price_amount": Decimal(price),
+                "bpm": rng.randint(70, 180),
+                "image": f"backend/images/beats/{beat_id}.jpg",
+                "audio_file": f"backend/beats_src/{beat_id}.mp3",
+                "added_at": now - timedelta(minutes=rng.randint(0, 365 * 24 * 60)),
+                "likes_count": 0,
+                "plays_count": int(rng.paretovariate(1.2) * 10),
+                "duration_seconds": round(rng.uniform(90, 240), 1),
+            }
+        )
+
+    def added_at():
+        # Recent enough for the trending window
+        return now - timedelta(minutes=rng.randint(0, 30 * 24 * 60))
+
+    like_rows = [
+        {"user_id": user_id, "beat_id": beat_id, "added_at": added_at()}
+        for user_id, beat_id in _pairs(rng, size.likes, size, skewed=True)
+    ]
+    cart_rows = [
+        {"user_id": user_id, "beat_id": beat_id, "added_at": added_at()}
+        for user_id, beat_id in _pairs(rng, size.carts, size, skewed=False)
+    ]
+    return {
+        "users": user_rows,
+        "beats": beat_rows,
+        "likes": like_rows,
+        "carts": cart_rows,
+    }
+
+
+async def seed(url: str, size: CatalogSize, seed: int = 0) -> Dict[str, List[Dict]]:
+    """Replace the content of the database with a generated catalog"""
+    catalog = generate_catalog(size, seed)
+    engine = create_async_engine(url)
+    try:
+        async with engine.begin() as connection:
+            await connection.run_sync(metadata.drop_all)
+            await connection.run_sync(metadata.create_all)
+            await connection.execute(
+                insert(roles), [{"role_id": 1, "name": "user", "permissions": None}]
+            )
+            for table in (users, beats, likes, carts):
+                rows = catalog[table.name]
+                for start in range(0, len(rows), INSERT_BATCH):
+                    await connection.execute(
+                        insert(table), rows[start : start + INSERT_BATCH]
+                    )
+
+            await connection.execute(repair_beat_likes_statement())
+            await connection.execute(repair_author_totals_statement())
+            for table, column in (("users", "user_id"), ("beats", "beat_id")):
+                await connection.execute(
+                    text(
+                        f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'),"
+                        f" (SELECT max({column}) FROM {table}))"
+                    )
+                )
+            await connection.execute(text("ANALYZE"))
+    finally:
+        await engine.dispose()
+    return catalog
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--producers", type=int, default=200)
+    parser.add_argument("--beats", type=int, default=5000)
+    parser.add_argument("--likes", type=int, default=50000)
+    parser.add_argument("--carts", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    size = CatalogSize(args.users, args.producers, args.beats, args.likes, args.carts)
+    asyncio.run(seed(database_url(test_database_env()), size, args.seed))
+    print("seeded", " ".join(f"{key}={value}" for key, value in size.as_dict().items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+CPU spent per request to send a large list of track cards.
+
+Serves the same 1000 rows as ``Page[TrackCard]`` twice: validated through
+the response model, and shaped by the fast row serializer. Both endpoints
+document the same schema, and their JSON bodies are checked to be equal.
+
+    python -m benchmarks.serialization --rows 1000 --requests 200
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import httpx
+from fastapi import FastAPI
+
+from src.beats.schemas import TrackCard, track_card_rows
+from src.pagination import Page
+from src.serialization import FastJSONResponse
+
+
+def make_rows(count: int) -> List[Dict]:
+    added_at = datetime(2024, 1, 1, 12, 0, 0, 123456)
+    return [
+        {
+            "beat_id": beat_id,
+            "user_id": beat_id % 50 + 1,
+            "title": f"beat {beat_id}",
+            "price": "29.99",
+            "bpm": 90 + beat_id % 80,
+            "image": f"backend/images/beats/{beat_id}.jpg",
+            "audio_file": f"backend/beats_src/{beat_id}.mp3",
+            "added_at": added_at - timedelta(minutes=beat_id),
+            "likes_count": beat_id * 3,
+            "plays_count": beat_id * 40,
+            "duration_seconds": 150.5,
+            "username": f"producer{beat_id % 50 + 1}",
+            "user_total_likes": 1000,
+            "user_total_plays": 50000,
+            "profile_photo": f"backend/images/profiles/{beat_id % 50 + 1}.jpg",
+        }
+        for beat_id in range(1, count + 1)
+    ]
+
+
+def create_app(rows: List[Dict]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/validated", response_model=Page[TrackCard])
+    async def validated():
+        return {"items": rows, "next_cursor": None}
+
+    @app.get("/fast", response_model=Page[TrackCard])
+    async def fast():
+        return FastJSONResponse(
+            {"items": track_card_rows.many(rows), "next_cursor": None}
+        )
+
+    return app
+
+
+async def measure(app: FastAPI, path: str, requests: int) -> Dict[str, float]:
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        await client.get(path)
+        cpu_started, started = time.process_time(), time.perf_counter()
+        for _ in range(requests):
+            response = await client.get(path)
+        cpu = time.process_time() - cpu_started
+        elapsed = time.perf_counter() - started
+    return {
+        "cpu_ms_per_request": cpu / requests * 1000,
+        "requests_per_second": requests / elapsed,
+        "body": response.content,
+    }
+
+
+async def run(rows: int, requests: int):
+    app = create_app(make_rows(rows))
+    results = {
+        path: await measure(app, path, requests) for path in ("/validated", "/fast")
+    }
+    bodies = [json.loads(result.pop("body")) for result in results.values()]
+    if bodies[0] != bodies[1]:
+        raise RuntimeError("The fast path does not send the same JSON")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.rows, args.requests))
+    for path, result in results.items():
+        print(path, " ".join(f"{key}={value:.1f}" for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,21 @@ from fastapi.middleware.cors import CORSMiddleware
 from loguru import logger
 
 from src.auth.base_config import auth_backend, fastapi_users
+from src.auth.passwords import password_helper
 from src.auth.schemas import UserCreate, UserRead
+from src.beats.live import live_counters
+from src.beats.plays import play_buffer
 from src.beats.router import router as router_beats
+from src.database import replica_monitor
+from src.images.router import router as router_images
+from src.monitoring.metrics import MetricsMiddleware
+from src.monitoring.router import metrics_router
+from src.monitoring.router import router as router_monitoring
+from src.orders.router import router as router_orders
+from src.recommendations import recommendation_index
+from src.uploads.router import router as router_uploads
+from src.uploads.worker import upload_worker
+from src.users.reconcile import counter_reconciler
 from src.users.router import router as router_users
 
 # logger.add("logs/app_logs.log", format="{time} {level} {message}", level="INFO")
@@ -14,6 +27,73 @@ logger.info("Started the app")
 app = FastAPI()
 
 
+@app.on_event("startup")
+async def start_play_buffer():
+    play_buffer.start()
+
+
+@app.on_event("shutdown")
+async def stop_play_buffer():
+    await play_buffer.stop()
+
+
+@app.on_event("startup")
+async def start_live_counters():
+    live_counters.start()
+
+
+@app.on_event("shutdown")
+async def stop_live_counters():
+    await live_counters.stop()
+
+
+@app.on_event("startup")
+async def start_counter_reconciler():
+    counter_reconciler.start()
+
+
+@app.on_event("shutdown")
+async def stop_counter_reconciler():
+    await counter_reconciler.stop()
+
+
+@app.on_event("startup")
+async def start_upload_worker():
+    upload_worker.start()
+
+
+@app.on_event("shutdown")
+async def stop_upload_worker():
+    await upload_worker.stop()
+
+
+@app.on_event("startup")
+async def start_recommendation_index():
+    recommendation_index.start()
+
+
+@app.on_event("shutdown")
+async def stop_recommendation_index():
+    await recommendation_index.stop()
+
+
+@app.on_event("shutdown")
+async def stop_password_hashing():
+    password_helper.shutdown()
+
+
+@app.on_event("startup")
+async def start_replica_monitor():
+    if replica_monitor is not None:
+        replica_monitor.start()
+
+
+@app.on_event("shutdown")
+async def stop_replica_monitor():
+    if replica_monitor is not None:
+        await replica_monitor.stop()
+
+
 # Allow requests from the local origin (e.g., http://localhost:5500)
 app.add_middleware(
     CORSMiddleware,
@@ -21,6 +101,7 @@ app.add_middleware(
     allow_methods=["GET", "POST", "PUT", "DELETE"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware, routes=lambda: app.routes)
 
 
 # app.mount("/backend/images", StaticFiles(directory="backend/images"), name="images")
@@ -43,3 +124,8 @@ app.include_router(
 
 app.include_router(router_beats)
 app.include_router(router_users)
+app.include_router(router_images)
+app.include_router(router_uploads)
+app.include_router(router_orders)
+app.include_router(router_monitoring)
+app.include_router(metrics_router)
@@ -1,12 +1,20 @@
-from fastapi_users import FastAPIUsers
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import jwt
+from fastapi import Depends, HTTPException, status
+from fastapi_users import BaseUserManager, FastAPIUsers, exceptions
 from fastapi_users.authentication import (
     AuthenticationBackend,
     CookieTransport,
     JWTStrategy,
 )
+from fastapi_users.jwt import decode_jwt, generate_jwt
 
 from src.auth.manager import get_user_manager
 from src.auth.models import User
+from src.auth.principal import Principal, cache_user, get_cached_user
 from src.config import ACCESS_TOKEN_EXPIRE_SECONDS, SECRET_KEY
 
 cookie_transport = CookieTransport(
@@ -14,8 +22,79 @@ cookie_transport = CookieTransport(
 )
 
 
-def get_jwt_strategy() -> JWTStrategy:
-    return JWTStrategy(secret=SECRET_KEY, lifetime_seconds=ACCESS_TOKEN_EXPIRE_SECONDS)
+class CachedJWTStrategy(JWTStrategy[User, int]):
+    """
+    JWT strategy that only loads the user once per token and cache TTL.
+
+    Tokens carry the role of the user and a token id (``jti``). The user
+    loaded for a token is cached under that id, and a token whose role no
+    longer matches the database is rejected, so role changes take effect
+    as soon as the cache entries of the user are invalidated.
+    """
+
+    def decode(self, token: Optional[str]) -> Optional[Dict[str, Any]]:
+        if token is None:
+            return None
+        try:
+            claims = decode_jwt(
+                token, self.decode_key, self.token_audience, algorithms=[self.algorithm]
+            )
+        except jwt.PyJWTError:
+            return None
+        if claims.get("sub") is None:
+            return None
+        return claims
+
+    async def read_token(
+        self, token: Optional[str], user_manager: BaseUserManager[User, int]
+    ) -> Optional[User]:
+        claims = self.decode(token)
+        if claims is None:
+            return None
+        return await self.user_for_claims(claims, user_manager)
+
+    async def user_for_claims(
+        self, claims: Dict[str, Any], user_manager: BaseUserManager[User, int]
+    ) -> Optional[User]:
+        try:
+            user_id = user_manager.parse_id(claims["sub"])
+        except exceptions.InvalidID:
+            return None
+
+        token_id = claims.get("jti")
+        if token_id is not None:
+            user = await get_cached_user(user_id, token_id)
+            if user is not None:
+                return user
+
+        try:
+            user = await user_manager.get(user_id)
+        except exceptions.UserNotExists:
+            return None
+
+        if "role_id" in claims and claims["role_id"] != user.role_id:
+            return None
+        if token_id is not None:
+            await cache_user(token_id, user)
+        return user
+
+    async def write_token(self, user: User) -> str:
+        data = {
+            "sub": str(user.id),
+            "aud": self.token_audience,
+            "role_id": user.role_id,
+            "jti": uuid.uuid4().hex,
+            "iat": datetime.utcnow(),
+        }
+        return generate_jwt(
+            data, self.encode_key, self.lifetime_seconds, algorithm=self.algorithm
+        )
+
+
+def get_jwt_strategy() -> CachedJWTStrategy:
+    return CachedJWTStrategy(
+        secret=SECRET_KEY, lifetime_seconds=ACCESS_TOKEN_EXPIRE_SECONDS
+    )
 
 
 auth_backend = AuthenticationBackend(
@@ -30,3 +109,47 @@ fastapi_users = FastAPIUsers[User, int](
 )
 
 get_current_user = fastapi_users.current_user()
+
+
+async def _principal_for_token(
+    token: Optional[str],
+    user_manager: BaseUserManager[User, int],
+    strategy: CachedJWTStrategy,
+) -> Optional[Principal]:
+    claims = strategy.decode(token)
+    if claims is None:
+        return None
+
+    user = await strategy.user_for_claims(claims, user_manager)
+    if user is None or not user.is_active:
+        return None
+
+    return Principal(
+        id=user.id,
+        role_id=claims.get("role_id", user.role_id),
+        token_id=claims.get("jti"),
+    )
+
+
+async def get_current_principal(
+    token: Optional[str] = Depends(cookie_transport.scheme),
+    user_manager: BaseUserManager[User, int] = Depends(get_user_manager),
+    strategy: CachedJWTStrategy = Depends(get_jwt_strategy),
+) -> Principal:
+    """
+    Lighter ``get_current_user`` for endpoints that only need the user id and
+    role: they come from the token, the database is only hit on a cache miss.
+    """
+    principal = await _principal_for_token(token, user_manager, strategy)
+    if principal is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    return principal
+
+
+async def get_optional_principal(
+    token: Optional[str] = Depends(cookie_transport.scheme),
+    user_manager: BaseUserManager[User, int] = Depends(get_user_manager),
+    strategy: CachedJWTStrategy = Depends(get_jwt_strategy),
+) -> Optional[Principal]:
+    """``get_current_principal`` for endpoints anonymous visitors can use too"""
+    return await _principal_for_token(token, user_manager, strategy)
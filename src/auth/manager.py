@@ -1,11 +1,16 @@
-from typing import Optional, Union
+from typing import Any, Dict, Optional, Union
 
 from fastapi import Depends, Request
+from fastapi.security import OAuth2PasswordRequestForm
 from fastapi_users import BaseUserManager, IntegerIDMixin, exceptions, models, schemas
 
 from src.auth.models import User
+from src.auth.passwords import password_helper
+from src.auth.principal import invalidate_principals
 from src.auth.utils import get_user_db
 from src.config import SECRET_KEY
+from src.users.authors import author_summaries
+from src.users.membership import membership_index
 
 
 class UserManager(IntegerIDMixin, BaseUserManager[User, int]):
@@ -15,6 +20,20 @@ class UserManager(IntegerIDMixin, BaseUserManager[User, int]):
     async def on_after_register(self, user: User, request: Optional[Request] = None):
         print(f"User {user.id} has registered.")
 
+    async def on_after_update(
+        self,
+        user: User,
+        update_dict: Dict[str, Any],
+        request: Optional[Request] = None,
+    ):
+        # Deactivations and role changes must not be hidden by cached logins
+        await invalidate_principals(user.id)
+        author_summaries.invalidate(user.id)
+
+    async def on_after_delete(self, user: User, request: Optional[Request] = None):
+        await invalidate_principals(user.id)
+        membership_index.invalidate(user.id)
+
     async def create(
         self,
         user_create: schemas.UC,
@@ -33,7 +52,7 @@ class UserManager(IntegerIDMixin, BaseUserManager[User, int]):
             else user_create.create_update_dict_superuser()
         )
         password = user_dict.pop("password")
-        user_dict["hashed_password"] = self.password_helper.hash(password)
+        user_dict["hashed_password"] = await self.password_helper.hash_async(password)
         user_dict["role_id"] = 1
 
         created_user = await self.user_db.create(user_dict)
@@ -42,6 +61,30 @@ class UserManager(IntegerIDMixin, BaseUserManager[User, int]):
 
         return created_user
 
+    async def authenticate(
+        self, credentials: OAuth2PasswordRequestForm
+    ) -> Optional[models.UP]:
+        try:
+            user = await self.get_by_email(credentials.username)
+        except exceptions.UserNotExists:
+            # Hash anyway so that unknown emails take as long as wrong passwords
+            await self.password_helper.hash_async(credentials.password)
+            return None
+
+        (
+            verified,
+            updated_password_hash,
+        ) = await self.password_helper.verify_and_update_async(
+            credentials.password, user.hashed_password
+        )
+        if not verified:
+            return None
+        # Hashes made with other rounds are upgraded while we have the password
+        if updated_password_hash is not None:
+            await self.user_db.update(user, {"hashed_password": updated_password_hash})
+
+        return user
+
     async def validate_password(
         self, password: str, user: Union[schemas.UC, models.UP]
     ) -> None:
@@ -65,4 +108,4 @@ class UserManager(IntegerIDMixin, BaseUserManager[User, int]):
 
 
 async def get_user_manager(user_db=Depends(get_user_db)):
-    yield UserManager(user_db)
+    yield UserManager(user_db, password_helper)
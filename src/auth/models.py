@@ -6,11 +6,14 @@ from sqlalchemy import (
     TIMESTAMP,
     Boolean,
     Column,
+    Computed,
     ForeignKey,
+    Index,
     Integer,
     String,
     Table,
 )
+from sqlalchemy.dialects.postgresql import TSVECTOR
 
 from src.database import Base, metadata
 
@@ -38,6 +41,12 @@ users = Table(
     Column("is_active", Boolean, default=True, nullable=False),
     Column("is_superuser", Boolean, default=False, nullable=False),
     Column("is_verified", Boolean, default=False, nullable=False),
+    Column(
+        "search_vector",
+        TSVECTOR,
+        Computed("to_tsvector('simple', username)", persisted=True),
+    ),
+    Index("ix_users_search_vector", "search_vector", postgresql_using="gin"),
 )
 
 
@@ -0,0 +1,137 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi_users.password import PasswordHelper
+from passlib.context import CryptContext
+
+from src.config import (
+    PASSWORD_HASH_EXECUTOR,
+    PASSWORD_HASH_ROUNDS,
+    PASSWORD_HASH_WORKERS,
+)
+
+
+def create_crypt_context(rounds: int = PASSWORD_HASH_ROUNDS) -> CryptContext:
+    # Pinning min and max rounds makes any other cost a reason to rehash
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+
+# Module level so that worker processes can rebuild it from the settings
+_context = create_crypt_context()
+
+
+def _hash(password: str) -> str:
+    return _context.hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str) -> Tuple[bool, str]:
+    return _context.verify_and_update(password, hashed_password)
+
+
+class PasswordHashStats:
+    def __init__(self):
+        self.completed = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+        self.rehashes = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+
+class PooledPasswordHelper(PasswordHelper):
+    """
+    Password helper running bcrypt in a bounded pool off the event loop.
+
+    At most ``workers`` hashes run at once, the other callers wait on a
+    semaphore where their queueing time is measured. The synchronous methods
+    stay available for the fastapi-users code paths that still call them.
+    """
+
+    def __init__(
+        self,
+        executor: str = PASSWORD_HASH_EXECUTOR,
+        workers: int = PASSWORD_HASH_WORKERS,
+    ):
+        super().__init__(_context)
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown password hash executor: {executor}")
+        self.executor_kind = executor
+        self.workers = workers
+        self.stats = PasswordHashStats()
+        self._executor: Optional[Executor] = None
+        self._semaphore = asyncio.Semaphore(workers)
+
+    async def hash_async(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify_and_update_async(
+        self, password: str, hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        verified, updated = await self._run(
+            _verify_and_update, password, hashed_password
+        )
+        if updated is not None:
+            self.stats.rehashes += 1
+        return verified, updated
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "executor": self.executor_kind,
+            "workers": self.workers,
+            **self.stats.as_dict(),
+        }
+
+    async def _run(self, func, *args):
+        stats = self.stats
+        queued_at = time.perf_counter()
+        stats.waiting += 1
+        stats.max_waiting = max(stats.max_waiting, stats.waiting)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            stats.waiting -= 1
+
+        started = time.perf_counter()
+        wait = started - queued_at
+        stats.total_wait_seconds += wait
+        stats.max_wait_seconds = max(stats.max_wait_seconds, wait)
+        stats.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            stats.in_flight -= 1
+            stats.completed += 1
+            stats.total_run_seconds += time.perf_counter() - started
+            self._semaphore.release()
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="password-hash"
+                )
+        return self._executor
+
+
+password_helper = PooledPasswordHelper()
@@ -0,0 +1,55 @@
+from typing import Any, Dict, Optional
+
+from src.auth.models import User
+from src.cache import LRUCacheBackend
+from src.config import AUTH_PRINCIPAL_CACHE_SIZE, AUTH_PRINCIPAL_TTL_SECONDS
+
+# Kept in process on purpose: other workers only see an invalidation through
+# the TTL, so it bounds how long a deactivated user keeps access
+principal_cache = LRUCacheBackend(max_entries=AUTH_PRINCIPAL_CACHE_SIZE)
+
+
+class Principal:
+    """Identity of an authenticated request, taken from its access token"""
+
+    __slots__ = ("id", "role_id", "token_id")
+
+    def __init__(self, id: int, role_id: Optional[int], token_id: Optional[str]):
+        self.id = id
+        self.role_id = role_id
+        self.token_id = token_id
+
+    def __repr__(self) -> str:
+        return f"Principal(id={self.id}, role_id={self.role_id})"
+
+
+def _principal_key(user_id: int, token_id: str) -> str:
+    return f"{user_id}:{token_id}"
+
+
+def user_snapshot(user: User) -> Dict[str, Any]:
+    """Column values of a user, without the password hash"""
+    return {
+        attr.key: getattr(user, attr.key)
+        for attr in User.__mapper__.column_attrs
+        if attr.key != "hashed_password"
+    }
+
+
+async def get_cached_user(user_id: int, token_id: str) -> Optional[User]:
+    snapshot = await principal_cache.get(_principal_key(user_id, token_id))
+    return User(**snapshot) if snapshot is not None else None
+
+
+async def cache_user(token_id: str, user: User):
+    await principal_cache.set(
+        _principal_key(user.id, token_id),
+        user_snapshot(user),
+        AUTH_PRINCIPAL_TTL_SECONDS,
+        tags=[f"user:{user.id}"],
+    )
+
+
+async def invalidate_principals(user_id: int):
+    """Drop every cached session of a user, e.g. after a role change"""
+    await principal_cache.invalidate_tags([f"user:{user_id}"])
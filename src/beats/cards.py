@@ -0,0 +1,31 @@
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.principal import Principal
+from src.beats.queries import track_cards_by_ids_query
+from src.cache import response_cache, track_tags
+from src.users.authors import attach_authors
+from src.users.membership import add_membership_flags
+
+
+async def fetch_track_cards(
+    session: AsyncSession, beat_ids: List[int]
+) -> Dict[int, Dict[str, Any]]:
+    result = await session.execute(track_cards_by_ids_query(beat_ids))
+    return {row["beat_id"]: dict(row) for row in result.mappings()}
+
+
+async def get_track_cards(
+    session: AsyncSession, beat_ids: List[int], viewer: Optional[Principal] = None
+) -> Dict[int, Dict[str, Any]]:
+    """Cached cards of beats with their authors, missing beats are left out"""
+    rows = await response_cache.get_or_load_many(
+        beat_ids,
+        key=lambda beat_id: f"beat:{beat_id}:card",
+        loader=lambda missing: fetch_track_cards(session, missing),
+        tags=lambda card: track_tags([card]),
+    )
+    cards = await attach_authors(session, rows.values())
+    cards = await add_membership_flags(session, viewer, cards)
+    return {card["beat_id"]: card for card in cards}
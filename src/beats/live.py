@@ -0,0 +1,239 @@
+import asyncio
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Set
+
+from loguru import logger
+
+from src.config import (
+    LIVE_KEEPALIVE_SECONDS,
+    LIVE_MAX_CONNECTIONS,
+    LIVE_QUEUE_SIZE,
+    LIVE_TICK_SECONDS,
+)
+from src.serialization import dumps
+
+# Latest counters of the beats changed during a tick, e.g. {12: {"likes": 3}}
+Updates = Dict[int, Dict[str, int]]
+
+
+class TooManySubscriptions(Exception):
+    pass
+
+
+def counters_event(updates: Updates) -> bytes:
+    return b"event: counters\ndata: " + dumps(updates) + b"\n\n"
+
+
+class LocalBroker:
+    """
+    In-process stand-in for a pub/sub server shared by the workers. Every
+    hub subscribed gets every message, its own included, so several hubs on
+    one broker behave like workers on one channel.
+
+    A networked broker only needs the same three methods and to hand the
+    messages back as they were published.
+    """
+
+    def __init__(self):
+        self._callbacks: List[Callable[[Updates], Any]] = []
+        self.messages = 0
+
+    def subscribe(self, callback: Callable[[Updates], Any]):
+        self._callbacks.append(callback)
+
+    def unsubscribe(self, callback: Callable[[Updates], Any]):
+        if callback in self._callbacks:
+            self._callbacks.remove(callback)
+
+    async def publish(self, message: Updates):
+        self.messages += 1
+        for callback in list(self._callbacks):
+            callback(message)
+
+
+class LiveSubscription:
+    """
+    Counter updates waiting to be sent to one client.
+
+    At most ``max_queue`` batches are queued. While the queue is full, new
+    updates are merged into a pending batch instead, which only keeps the
+    latest counters of each beat: a slow client skips intermediate values
+    but never holds more than ``max_queue + 1`` batches.
+    """
+
+    def __init__(self, beat_ids: Iterable[int], max_queue: int = LIVE_QUEUE_SIZE):
+        self.beat_ids = frozenset(beat_ids)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._pending: Updates = {}
+        self.merged = 0
+
+    def offer(self, updates: Updates):
+        for beat_id, counters in updates.items():
+            self._pending.setdefault(beat_id, {}).update(counters)
+        self._enqueue()
+
+    async def next(self, timeout: Optional[float] = None) -> Optional[Updates]:
+        """The next batch of updates, None once ``timeout`` seconds passed"""
+        try:
+            updates = await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._enqueue()
+        return updates
+
+    def _enqueue(self):
+        if not self._pending:
+            return
+        try:
+            self._queue.put_nowait(self._pending)
+        except asyncio.QueueFull:
+            self.merged += 1
+            return
+        self._pending = {}
+
+
+class LiveCounters:
+    """
+    Pub/sub hub pushing like and play counters to the clients following
+    the beats.
+
+    Write paths ``publish`` the new counters of a beat without waiting.
+    Once per ``tick`` the counters changed since the previous tick are sent
+    to the broker as one message, the latest value of each winning, and
+    every message received from the broker is handed to the subscriptions
+    of its beats. With a shared broker the counters changed on any worker
+    reach the clients of every worker.
+    """
+
+    def __init__(
+        self,
+        broker=None,
+        tick: float = LIVE_TICK_SECONDS,
+        max_queue: int = LIVE_QUEUE_SIZE,
+        max_connections: int = LIVE_MAX_CONNECTIONS,
+    ):
+        self.broker = broker if broker is not None else LocalBroker()
+        self.tick = tick
+        self.max_queue = max_queue
+        self.max_connections = max_connections
+
+        self._outgoing: Updates = {}
+        self._subscriptions: Set[LiveSubscription] = set()
+        self._by_beat: Dict[int, Set[LiveSubscription]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        self.published = 0
+        self.sent = 0
+        self.send_errors = 0
+        self.received = 0
+        self.delivered = 0
+        self.merged = 0
+
+    def publish(self, beat_id: int, **counters: int):
+        self._outgoing.setdefault(beat_id, {}).update(counters)
+        self.published += 1
+
+    def subscribe(self, beat_ids: Iterable[int]) -> LiveSubscription:
+        if len(self._subscriptions) >= self.max_connections:
+            raise TooManySubscriptions()
+        subscription = LiveSubscription(beat_ids, self.max_queue)
+        self._subscriptions.add(subscription)
+        for beat_id in subscription.beat_ids:
+            self._by_beat.setdefault(beat_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: LiveSubscription):
+        if subscription not in self._subscriptions:
+            return
+        self._subscriptions.remove(subscription)
+        self.merged += subscription.merged
+        for beat_id in subscription.beat_ids:
+            followers = self._by_beat.get(beat_id)
+            if followers is None:
+                continue
+            followers.discard(subscription)
+            if not followers:
+                del self._by_beat[beat_id]
+
+    async def events(
+        self,
+        subscription: LiveSubscription,
+        snapshot: Updates,
+        keepalive: float = LIVE_KEEPALIVE_SECONDS,
+    ) -> AsyncIterator[bytes]:
+        """
+        Server-sent events of a subscription, starting with the counters
+        read when it was made. It is closed when the client goes away.
+        """
+        try:
+            yield b"retry: 5000\n" + counters_event(snapshot)
+            while True:
+                updates = await subscription.next(keepalive)
+                yield b": keepalive\n\n" if updates is None else counters_event(updates)
+        finally:
+            self.unsubscribe(subscription)
+
+    def receive(self, message: Updates):
+        self.received += 1
+        touched: Dict[LiveSubscription, Updates] = {}
+        for beat_id, counters in message.items():
+            for subscription in self._by_beat.get(beat_id, ()):
+                touched.setdefault(subscription, {})[beat_id] = counters
+        for subscription, updates in touched.items():
+            subscription.offer(updates)
+        self.delivered += len(touched)
+
+    async def flush(self):
+        if not self._outgoing:
+            return
+        message, self._outgoing = self._outgoing, {}
+        try:
+            await self.broker.publish(message)
+        except Exception:
+            # Counters published since are newer and stay on top
+            for beat_id, counters in message.items():
+                self._outgoing[beat_id] = {
+                    **counters,
+                    **self._outgoing.get(beat_id, {}),
+                }
+            self.send_errors += 1
+            logger.exception("Failed to send {} beats live counters", len(message))
+            return
+        self.sent += 1
+
+    def start(self):
+        if self._task is None:
+            self.broker.subscribe(self.receive)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+        self.broker.unsubscribe(self.receive)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscriptions": len(self._subscriptions),
+            "followed_beats": len(self._by_beat),
+            "outgoing_beats": len(self._outgoing),
+            "published": self.published,
+            "sent": self.sent,
+            "send_errors": self.send_errors,
+            "received": self.received,
+            "delivered": self.delivered,
+            "merged": self.merged + sum(sub.merged for sub in self._subscriptions),
+        }
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            await self.flush()
+
+
+live_counters = LiveCounters()
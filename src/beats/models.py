@@ -1,6 +1,18 @@
 from datetime import datetime
 
-from sqlalchemy import TIMESTAMP, Column, ForeignKey, Integer, String, Table
+from sqlalchemy import (
+    TIMESTAMP,
+    Column,
+    Computed,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    Numeric,
+    String,
+    Table,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
 
 from src.auth.models import users
 from src.database import metadata
@@ -12,10 +24,25 @@ beats = Table(
     Column("user_id", Integer, ForeignKey(users.c.user_id)),
     Column("title", String, nullable=False),
     Column("price", String, nullable=False),
+    # Numeric copy of the price for range filters
+    Column("price_amount", Numeric(10, 2)),
     Column("bpm", Integer, nullable=False),
     Column("image", String, nullable=False),
     Column("audio_file", String, nullable=False),
     Column("added_at", TIMESTAMP, default=datetime.utcnow),
     Column("likes_count", Integer, nullable=False),
     Column("plays_count", Integer, nullable=False),
+    # Read from the audio file when the beat is uploaded
+    Column("duration_seconds", Float),
+    Column(
+        "search_vector",
+        TSVECTOR,
+        Computed("to_tsvector('simple', title)", persisted=True),
+    ),
+    # Keyset pagination of a producer's tracks
+    Index("ix_beats_user_id_added_at", "user_id", "added_at", "beat_id"),
+    # Search filters and full-text match
+    Index("ix_beats_bpm", "bpm"),
+    Index("ix_beats_price_amount", "price_amount"),
+    Index("ix_beats_search_vector", "search_vector", postgresql_using="gin"),
 )
@@ -0,0 +1,229 @@
+import asyncio
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from loguru import logger
+from sqlalchemy import Integer, column, func, select, update, values
+
+from src.auth.models import users
+from src.beats.live import live_counters
+from src.beats.models import beats
+from src.beats.trending import trending
+from src.cache import response_cache
+from src.config import (
+    PLAYS_FLUSH_INTERVAL_SECONDS,
+    PLAYS_FLUSH_THRESHOLD,
+    PLAYS_QUEUE_SIZE,
+)
+from src.database import async_session_maker
+from src.users.authors import author_summaries
+
+_STOP = object()
+
+
+def add_plays_statement(counts: Dict[int, int]):
+    """
+    Add coalesced plays to ``beats.plays_count`` and to the authors'
+    ``users.total_plays`` in one statement. Unknown beat ids are ignored.
+    Returns the new plays count of every beat with its author and the plays
+    added to the author.
+    """
+    played = values(
+        column("beat_id", Integer), column("plays", Integer), name="played"
+    ).data(sorted(counts.items()))
+    played_beats = (
+        update(beats)
+        .where(beats.c.beat_id == played.c.beat_id)
+        .values(plays_count=beats.c.plays_count + played.c.plays)
+        .returning(
+            beats.c.beat_id, beats.c.user_id, beats.c.plays_count, played.c.plays
+        )
+        .cte("played_beats")
+    )
+    per_author = (
+        select(played_beats.c.user_id, func.sum(played_beats.c.plays).label("plays"))
+        .group_by(played_beats.c.user_id)
+        .subquery("per_author")
+    )
+    played_authors = (
+        update(users)
+        .where(users.c.user_id == per_author.c.user_id)
+        .values(total_plays=func.coalesce(users.c.total_plays, 0) + per_author.c.plays)
+        .returning(users.c.user_id, per_author.c.plays)
+        .cte("played_authors")
+    )
+    return select(
+        played_beats.c.beat_id,
+        played_beats.c.plays_count,
+        played_authors.c.user_id,
+        played_authors.c.plays,
+    ).join_from(
+        played_beats, played_authors, played_beats.c.user_id == played_authors.c.user_id
+    )
+
+
+async def flush_plays(counts: Dict[int, int]):
+    async with async_session_maker() as session:
+        result = await session.execute(add_plays_statement(counts))
+        played = result.fetchall()
+        await session.commit()
+
+    # The counts are committed, failures from here on must not get them
+    # added again by the buffer
+    try:
+        await after_plays(counts, played)
+    except Exception:
+        logger.exception("Failed to propagate {} beats play counts", len(counts))
+
+
+async def after_plays(counts: Dict[int, int], played):
+    per_author = {user_id: plays for _, _, user_id, plays in played}
+    for user_id, plays in per_author.items():
+        author_summaries.add_counts(user_id, plays=plays)
+    # Only beats that exist come back, unknown ids never reach the ranking
+    for beat_id, plays_count, _, _ in played:
+        trending.record_play(beat_id, counts[beat_id])
+        live_counters.publish(beat_id, plays=plays_count)
+    # Cached cards keep their play counts until they expire, but clients
+    # revalidating them should get the new counts
+    await response_cache.bump_versions(
+        "trending",
+        *(f"beat:{beat_id}" for beat_id in counts),
+        *(f"author:{user_id}" for user_id in per_author),
+    )
+
+
+class PlayBufferFull(Exception):
+    pass
+
+
+class PlayBuffer:
+    """
+    Write-behind buffer for play events.
+
+    Events are queued without touching the database and coalesced per beat
+    by a single consumer, which hands the counts to ``flush`` once
+    ``flush_threshold`` plays are pending or ``flush_interval`` seconds have
+    passed. A full queue rejects new events instead of growing. Counts of a
+    failed flush are kept and retried with the next one.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[Dict[int, int]], Awaitable[Any]],
+        max_queue: int = PLAYS_QUEUE_SIZE,
+        flush_interval: float = PLAYS_FLUSH_INTERVAL_SECONDS,
+        flush_threshold: int = PLAYS_FLUSH_THRESHOLD,
+    ):
+        self._flush = flush
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._pending: Counter = Counter()
+        self._pending_plays = 0
+        self._task: Optional[asyncio.Task] = None
+
+        self.accepted = 0
+        self.rejected = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.flushed_plays = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+
+    def record(self, beat_id: int):
+        """Queue one play, raise ``PlayBufferFull`` when the queue is full"""
+        try:
+            self._queue.put_nowait(beat_id)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise PlayBufferFull()
+        self.accepted += 1
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything queued so far and stop the consumer"""
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def flush(self):
+        if not self._pending:
+            return
+        counts, plays = dict(self._pending), self._pending_plays
+        self._pending, self._pending_plays = Counter(), 0
+
+        started = time.perf_counter()
+        try:
+            await self._flush(counts)
+        except Exception:
+            self._pending.update(counts)
+            self._pending_plays += plays
+            self.flush_errors += 1
+            logger.exception("Failed to flush {} beats play counts", len(counts))
+            return
+        finally:
+            elapsed = time.perf_counter() - started
+            self.last_flush_seconds = elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+            self.total_flush_seconds += elapsed
+
+        self.flushes += 1
+        self.flushed_plays += plays
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "pending_beats": len(self._pending),
+            "pending_plays": self._pending_plays,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "flushed_plays": self.flushed_plays,
+            "last_flush_seconds": self.last_flush_seconds,
+            "max_flush_seconds": self.max_flush_seconds,
+            "total_flush_seconds": self.total_flush_seconds,
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        stopping = False
+
+        while not stopping:
+            try:
+                item = await asyncio.wait_for(
+                    self._queue.get(), timeout=max(deadline - loop.time(), 0)
+                )
+                stopping = self._collect(item)
+                while not stopping and not self._queue.empty():
+                    stopping = self._collect(self._queue.get_nowait())
+            except asyncio.TimeoutError:
+                pass
+
+            if (
+                stopping
+                or self._pending_plays >= self.flush_threshold
+                or loop.time() >= deadline
+            ):
+                await self.flush()
+                deadline = loop.time() + self.flush_interval
+
+    def _collect(self, item) -> bool:
+        if item is _STOP:
+            return True
+        self._pending[item] += 1
+        self._pending_plays += 1
+        return False
+
+
+play_buffer = PlayBuffer(flush_plays)
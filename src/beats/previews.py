@@ -0,0 +1,166 @@
+import asyncio
+import io
+import shutil
+import subprocess
+import threading
+import wave
+from pathlib import PurePosixPath
+from typing import BinaryIO, Dict
+
+from loguru import logger
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+
+from src.beats.models import beats
+from src.config import PREVIEW_PREFIX, PREVIEW_SECONDS
+from src.database import async_session_maker
+from src.storage import Storage, StoredFileNotFound, storage
+
+READ_SIZE = 64 * 1024
+
+
+class PreviewUnavailable(Exception):
+    pass
+
+
+def preview_key(beat_id: int, audio_key: str) -> str:
+    return f"{PREVIEW_PREFIX}/{beat_id}{PurePosixPath(audio_key).suffix.lower()}"
+
+
+def make_preview(source: BinaryIO, suffix: str, seconds: float) -> bytes:
+    """First ``seconds`` of an audio file, in the same format"""
+    if suffix != ".wav":
+        return _ffmpeg_preview(source, suffix, seconds)
+
+    output = io.BytesIO()
+    try:
+        with wave.open(source, "rb") as reader:
+            frames = reader.readframes(int(reader.getframerate() * seconds))
+            with wave.open(output, "wb") as writer:
+                writer.setparams(reader.getparams())
+                writer.writeframes(frames)
+    except (wave.Error, EOFError) as error:
+        # Truncated or corrupt WAV files
+        raise PreviewUnavailable(f"Unreadable WAV file: {error}") from error
+    return output.getvalue()
+
+
+def _ffmpeg_preview(source: BinaryIO, suffix: str, seconds: float) -> bytes:
+    """
+    Cut by ffmpeg without re-encoding. The file is piped through it in
+    chunks and only the preview is read back, so memory does not grow with
+    the track.
+    """
+    if shutil.which("ffmpeg") is None:
+        raise PreviewUnavailable(f"Cutting {suffix} files requires ffmpeg")
+
+    process = subprocess.Popen(
+        ["ffmpeg", "-v", "error", "-i", "pipe:0", "-t", str(seconds)]
+        + ["-c", "copy", "-f", suffix.lstrip("."), "pipe:1"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+    )
+
+    def feed():
+        try:
+            while True:
+                chunk = source.read(READ_SIZE)
+                if not chunk:
+                    break
+                process.stdin.write(chunk)
+        except BrokenPipeError:
+            # ffmpeg stops reading once the preview is cut
+            pass
+        finally:
+            process.stdin.close()
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    try:
+        data = process.stdout.read()
+    finally:
+        process.stdout.close()
+        feeder.join()
+    if process.wait() != 0 or not data:
+        raise PreviewUnavailable("ffmpeg could not cut the file")
+    return data
+
+
+def ensure_preview(
+    storage: Storage, beat_id: int, audio_key: str, seconds: float = PREVIEW_SECONDS
+) -> str:
+    """
+    Key of the preview clip of a beat, cutting it first when it is missing or
+    older than the audio file. Blocking, run it in a thread.
+    """
+    key = preview_key(beat_id, audio_key)
+    source = storage.stat(audio_key)
+    try:
+        if storage.stat(key).mtime >= source.mtime:
+            return key
+    except StoredFileNotFound:
+        pass
+
+    with storage.open(audio_key) as file:
+        data = make_preview(file, PurePosixPath(audio_key).suffix.lower(), seconds)
+    storage.save(key, data)
+    return key
+
+
+class PreviewGenerator:
+    """
+    Cuts previews in the thread pool. Requests arriving for a beat whose
+    preview is already being cut wait for it instead of cutting it again.
+    """
+
+    def __init__(self, storage: Storage):
+        self.storage = storage
+        self._pending: Dict[int, "asyncio.Task[str]"] = {}
+
+    async def get(self, beat_id: int, audio_key: str) -> str:
+        task = self._pending.get(beat_id)
+        if task is None:
+            task = asyncio.create_task(
+                run_in_threadpool(ensure_preview, self.storage, beat_id, audio_key)
+            )
+            self._pending[beat_id] = task
+            task.add_done_callback(lambda done: self._done(beat_id, done))
+        return await asyncio.shield(task)
+
+    def _done(self, beat_id: int, task: "asyncio.Task[str]"):
+        del self._pending[beat_id]
+        if not task.cancelled():
+            # Marks it retrieved, asyncio would log it when every request left
+            task.exception()
+
+
+async def generate_missing_previews(batch_size: int = 100):
+    """Cut the previews of every beat ahead of the first listener"""
+    last_id = 0
+    generated = failed = 0
+    while True:
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(beats.c.beat_id, beats.c.audio_file)
+                .where(beats.c.beat_id > last_id)
+                .order_by(beats.c.beat_id)
+                .limit(batch_size)
+            )
+            rows = result.fetchall()
+        if not rows:
+            break
+
+        for beat_id, audio_key in rows:
+            try:
+                await run_in_threadpool(ensure_preview, storage, beat_id, audio_key)
+                generated += 1
+            except (PreviewUnavailable, StoredFileNotFound) as error:
+                failed += 1
+                logger.warning("No preview for beat {}: {}", beat_id, error)
+        last_id = rows[-1].beat_id
+
+    logger.info("Previews ready for {} beats, {} failed", generated, failed)
+
+
+if __name__ == "__main__":
+    asyncio.run(generate_missing_previews())
@@ -0,0 +1,119 @@
+import asyncio
+import re
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import Integer, Numeric, String, cast, column, select, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.beats.models import beats
+from src.config import PRICE_SYNC_BATCH_SIZE
+from src.database import async_session_maker
+
+CENT = Decimal("0.01")
+# Largest value of a Numeric(10, 2) column
+MAX_PRICE = Decimal("99999999.99")
+_NUMBER = re.compile(r"\d[\d.,]*")
+
+
+def parse_price(price: Optional[str]) -> Optional[Decimal]:
+    """
+    Amount of a free-form price such as "19.99", "$20", "20,00" or
+    "1,299.00 USD", None when it cannot be read as a non-negative amount.
+    """
+    if price is None:
+        return None
+    numbers = _NUMBER.findall(str(price))
+    # "1e9" or "10-20" are not one amount
+    if len(numbers) != 1 or "-" in str(price):
+        return None
+    text = numbers[0].rstrip(".,")
+    if "," in text and "." in text:
+        # The last separator is the decimal one
+        thousands = "," if text.rindex(",") < text.rindex(".") else "."
+        text = text.replace(thousands, "")
+    if "," in text:
+        whole, _, cents = text.rpartition(",")
+        text = (
+            f"{whole.replace(',', '')}.{cents}"
+            if len(cents) <= 2 and "," not in whole
+            else text.replace(",", "")
+        )
+    if text.count(".") > 1:
+        text = text.replace(".", "")
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        return None
+    if not amount.is_finite() or amount > MAX_PRICE:
+        return None
+    return amount.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def price_amounts_statement(changes: List[Tuple[int, str, Optional[Decimal]]]):
+    """
+    Set ``price_amount`` of (beat id, price, amount) rows. A beat whose price
+    changed since it was read is left for the next run.
+    """
+    parsed = values(
+        column("beat_id", Integer),
+        column("price", String),
+        column("amount", Numeric(10, 2)),
+        name="parsed",
+    ).data(changes)
+    return (
+        update(beats)
+        .where(beats.c.beat_id == parsed.c.beat_id, beats.c.price == parsed.c.price)
+        # A batch of unparseable prices only has NULL amounts, typed as text
+        .values(price_amount=cast(parsed.c.amount, Numeric(10, 2)))
+        .returning(beats.c.beat_id)
+    )
+
+
+async def sync_price_amounts(
+    session: AsyncSession, batch_size: int = PRICE_SYNC_BATCH_SIZE
+) -> Dict[str, Any]:
+    """
+    Backfill ``beats.price_amount`` from ``beats.price`` and repair it where
+    the price was changed without it. Walks the beats by id, one transaction
+    per batch, and only writes the rows that differ.
+    """
+    stats = {"scanned": 0, "updated": 0, "unparseable": 0}
+    after = 0
+    while True:
+        result = await session.execute(
+            select(beats.c.beat_id, beats.c.price, beats.c.price_amount)
+            .where(beats.c.beat_id > after)
+            .order_by(beats.c.beat_id)
+            .limit(batch_size)
+        )
+        rows = result.fetchall()
+        if not rows:
+            break
+        after = rows[-1][0]
+        stats["scanned"] += len(rows)
+
+        changes = []
+        for beat_id, price, stored in rows:
+            amount = parse_price(price)
+            if amount is None:
+                stats["unparseable"] += 1
+            if amount != stored:
+                changes.append((beat_id, price, amount))
+        if changes:
+            updated = await session.execute(price_amounts_statement(changes))
+            stats["updated"] += len(updated.fetchall())
+        await session.commit()
+    return stats
+
+
+async def sync_prices_with_new_session() -> Dict[str, Any]:
+    async with async_session_maker() as session:
+        return await sync_price_amounts(session)
+
+
+if __name__ == "__main__":
+    # One-off backfill, it also runs with the counter reconciler:
+    # python -m src.beats.prices
+    logger.info("Synced beat prices: {}", asyncio.run(sync_prices_with_new_session()))
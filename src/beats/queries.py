@@ -0,0 +1,42 @@
+from typing import List
+
+from sqlalchemy import Integer, any_, bindparam, select
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from src.beats.models import beats
+
+# The beat fields of a card, without the search vector
+track_card_columns = [
+    beats.c.beat_id,
+    beats.c.user_id,
+    beats.c.title,
+    beats.c.price,
+    beats.c.bpm,
+    beats.c.image,
+    beats.c.audio_file,
+    beats.c.added_at,
+    beats.c.likes_count,
+    beats.c.plays_count,
+    beats.c.duration_seconds,
+]
+
+
+def track_cards_query():
+    """
+    Beat side of ``TrackCard`` rows. The author fields are not joined, they
+    come from ``src.users.authors.attach_authors``.
+    """
+    return select(*track_card_columns)
+
+
+def track_cards_by_ids_query(beat_ids: List[int]):
+    """One statement for any number of ids, bound as a single array parameter"""
+    return track_cards_query().where(
+        beats.c.beat_id == any_(bindparam("beat_ids", beat_ids, ARRAY(Integer)))
+    )
+
+
+def live_counters_query(beat_ids: List[int]):
+    return select(beats.c.beat_id, beats.c.likes_count, beats.c.plays_count).where(
+        beats.c.beat_id == any_(bindparam("beat_ids", beat_ids, ARRAY(Integer)))
+    )
@@ -1,45 +1,402 @@
-from typing import List
+from datetime import datetime
+from decimal import Decimal
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from loguru import logger
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
-from src.auth.models import users
+from src.auth.base_config import get_optional_principal
+from src.auth.principal import Principal
+from src.beats.cards import get_track_cards
+from src.beats.live import TooManySubscriptions, live_counters
 from src.beats.models import beats
-from src.beats.schemas import TrackCard
-from src.database.database import get_async_session
+from src.beats.plays import PlayBufferFull, play_buffer
+from src.beats.previews import PreviewGenerator, PreviewUnavailable
+from src.beats.queries import live_counters_query, track_cards_query
+from src.beats.schemas import (
+    BatchRequest,
+    SearchFacets,
+    TrackCard,
+    TrackCardBatch,
+    TrackSearchPage,
+    track_card_rows,
+)
+from src.beats.search import SearchFilters, bpm_facet, price_facet
+from src.beats.trending import trending
+from src.beats.waveforms import (
+    WaveformGenerator,
+    WaveformUnavailable,
+    resample_waveform,
+)
+from src.cache import cache_headers, not_modified, versioned_etag, with_headers
+from src.config import (
+    BATCH_MAX_IDS,
+    PAGE_SIZE_DEFAULT,
+    PAGE_SIZE_MAX,
+    RECOMMENDATIONS_MAX,
+    TRENDING_TOP_K,
+    WAVEFORM_PEAKS,
+)
+from src.database.database import get_read_session
+from src.pagination import Page, decode_cursor, encode_cursor, fetch_page
+from src.recommendations import RecommendationsUnavailable, recommendation_index
+from src.recommendations.neighbours import beat_neighbours_query
+from src.serialization import json_item, json_page
+from src.storage import StoredFileNotFound, StoredFileResponse, storage
+from src.users.authors import attach_authors
+from src.users.membership import add_membership_flags, membership_tags
 
 router = APIRouter(prefix="/beat", tags=["Beat"])
 
+preview_generator = PreviewGenerator(storage)
+waveform_generator = WaveformGenerator(storage)
 
-@router.get("/trending", response_model=List[TrackCard])
+# The audio of a beat is never replaced, neither is its waveform
+IMMUTABLE = {"cache-control": "public, max-age=31536000, immutable"}
+
+
+@router.get("/trending", response_model=Page[TrackCard])
 async def get_popular_tracks(
-    limit: int = 6, session: AsyncSession = Depends(get_async_session)
-) -> List[TrackCard]:
-    try:
-        query = (
-            select(
-                beats,
-                users.c.username,
-                users.c.total_likes.label("user_total_likes"),
-                users.c.total_plays.label("user_total_plays"),
-                users.c.profile_photo,
-            )
-            .join(users, users.c.user_id == beats.c.user_id)
-            .order_by(beats.c.likes_count.desc())
-            .limit(limit)
+    request: Request,
+    response: Response,
+    limit: int = Query(6, ge=1, le=TRENDING_TOP_K),
+    cursor: Optional[str] = None,
+    viewer: Optional[Principal] = Depends(get_optional_principal),
+    session: AsyncSession = Depends(get_read_session),
+):
+    after = decode_cursor(cursor, (float, float, int, int))
+    try:
+        await trending.ensure_fresh(session)
+        etag = await versioned_etag(
+            ["trending", *membership_tags(viewer)],
+            "trending",
+            limit,
+            cursor,
+            viewer and viewer.id,
+            local_versions=[trending.version],
         )
+        headers = cache_headers(etag, private=viewer is not None)
+        unchanged = not_modified(request, headers)
+        if unchanged is not None:
+            return unchanged
 
-        result = await session.execute(query)
-        trending_tracks = result.mappings().fetchall()
+        trending_tracks, next_key = trending.page(limit, after)
+        trending_tracks = await add_membership_flags(
+            session, viewer, await attach_authors(session, trending_tracks)
+        )
 
-        if not trending_tracks:
+        if cursor is None and not trending_tracks:
             raise HTTPException(
                 status_code=404, detail="User not found or no tracks available"
             )
-        return trending_tracks
-    except:
+        page = {
+            "items": trending_tracks,
+            "next_cursor": encode_cursor(next_key) if next_key else None,
+        }
+        return with_headers(json_page(page, track_card_rows), response, headers)
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Error while retrieving tracks")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An error occurred while retrieving tracks.",
         )
+
+
+@router.get("/search", response_model=TrackSearchPage)
+async def search_tracks(
+    q: Optional[str] = Query(None, max_length=200),
+    bpm_min: Optional[int] = Query(None, ge=0),
+    bpm_max: Optional[int] = Query(None, ge=0),
+    price_min: Optional[Decimal] = Query(None, ge=0),
+    price_max: Optional[Decimal] = Query(None, ge=0),
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    viewer: Optional[Principal] = Depends(get_optional_principal),
+    session: AsyncSession = Depends(get_read_session),
+):
+    after = decode_cursor(cursor, (datetime.fromisoformat, int))
+    filters = SearchFilters(q, bpm_min, bpm_max, price_min, price_max)
+    try:
+        page = await fetch_page(
+            session,
+            track_cards_query().where(*filters.all()),
+            order_by=[(beats.c.added_at, "added_at"), (beats.c.beat_id, "beat_id")],
+            limit=limit,
+            after=after,
+        )
+        page["items"] = await add_membership_flags(
+            session, viewer, await attach_authors(session, page["items"])
+        )
+        # Facets describe the whole result, the first page is enough
+        if cursor is None:
+            page["facets"] = SearchFacets(
+                bpm=await bpm_facet(session, filters),
+                price=await price_facet(session, filters),
+            ).dict()
+        return json_page(page, track_card_rows)
+    except Exception:
+        logger.exception("Error while searching tracks")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while searching tracks.",
+        )
+
+
+@router.post("/batch", response_model=TrackCardBatch)
+async def get_tracks_batch(
+    batch: BatchRequest,
+    viewer: Optional[Principal] = Depends(get_optional_principal),
+    session: AsyncSession = Depends(get_read_session),
+):
+    beat_ids = list(dict.fromkeys(batch.ids))
+    try:
+        cards = await get_track_cards(session, beat_ids, viewer)
+    except Exception:
+        logger.exception("Error while retrieving tracks")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while retrieving tracks.",
+        )
+
+    return json_page(
+        {
+            "items": [cards[beat_id] for beat_id in beat_ids if beat_id in cards],
+            "missing": [beat_id for beat_id in beat_ids if beat_id not in cards],
+        },
+        track_card_rows,
+    )
+
+
+@router.get("/live")
+async def stream_live_counters(
+    ids: List[int] = Query(...),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Server-sent events with the like and play counters of the ``ids``
+    beats: their current values, then their changes at most once per tick.
+    """
+    beat_ids = list(dict.fromkeys(ids))
+    if len(beat_ids) > BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=400, detail=f"At most {BATCH_MAX_IDS} beats can be followed"
+        )
+    try:
+        # Subscribed first so no change is missed between the read and it
+        subscription = live_counters.subscribe(beat_ids)
+    except TooManySubscriptions:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many live streams are open, retry later.",
+            headers={"Retry-After": "5"},
+        )
+
+    try:
+        result = await session.execute(live_counters_query(beat_ids))
+        snapshot = {
+            row.beat_id: {"likes": row.likes_count, "plays": row.plays_count}
+            for row in result
+        }
+        # The stream stays open, its connection goes back to the pool now
+        await session.commit()
+    except Exception:
+        live_counters.unsubscribe(subscription)
+        logger.exception("Error while reading the live counters")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while reading the live counters.",
+        )
+
+    return StreamingResponse(
+        live_counters.events(subscription, snapshot),
+        media_type="text/event-stream",
+        headers={"cache-control": "no-cache", "x-accel-buffering": "no"},
+    )
+
+
+@router.get("/{beat_id}", response_model=TrackCard)
+async def get_track(
+    beat_id: int,
+    viewer: Optional[Principal] = Depends(get_optional_principal),
+    session: AsyncSession = Depends(get_read_session),
+):
+    try:
+        cards = await get_track_cards(session, [beat_id], viewer)
+    except Exception:
+        logger.exception("Error while retrieving the track")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while retrieving the track.",
+        )
+
+    if beat_id not in cards:
+        raise HTTPException(status_code=404, detail="Beat not found")
+    return json_item(cards[beat_id], track_card_rows)
+
+
+@router.get("/{beat_id}/similar", response_model=Page[TrackCard])
+async def get_similar_tracks(
+    beat_id: int,
+    limit: int = Query(6, ge=1, le=RECOMMENDATIONS_MAX),
+    viewer: Optional[Principal] = Depends(get_optional_principal),
+    session: AsyncSession = Depends(get_read_session),
+):
+    try:
+        neighbours = recommendation_index.similar(beat_id, limit)
+    except RecommendationsUnavailable:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Recommendations are not available yet",
+        )
+    if neighbours is None:
+        raise HTTPException(status_code=404, detail="Beat not found")
+
+    beat_ids = [neighbour_id for neighbour_id, _ in neighbours]
+    try:
+        cards = await get_track_cards(session, beat_ids, viewer)
+    except Exception:
+        logger.exception("Error while retrieving similar tracks")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while retrieving similar tracks.",
+        )
+    page = {
+        "items": [
+            cards[neighbour_id] for neighbour_id in beat_ids if neighbour_id in cards
+        ],
+        "next_cursor": None,
+    }
+    return json_page(page, track_card_rows)
+
+
+@router.get("/{beat_id}/also_liked", response_model=Page[TrackCard])
+async def get_also_liked_tracks(
+    beat_id: int,
+    limit: int = Query(6, ge=1, le=RECOMMENDATIONS_MAX),
+    viewer: Optional[Principal] = Depends(get_optional_principal),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """Beats liked by the users who liked this one, as of the last neighbours job"""
+    try:
+        result = await session.execute(beat_neighbours_query(beat_id, limit))
+        beat_ids = result.scalars().all()
+        cards = await get_track_cards(session, beat_ids, viewer)
+    except Exception:
+        logger.exception("Error while retrieving also liked tracks")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while retrieving also liked tracks.",
+        )
+    page = {
+        "items": [
+            cards[neighbour_id] for neighbour_id in beat_ids if neighbour_id in cards
+        ],
+        "next_cursor": None,
+    }
+    return json_page(page, track_card_rows)
+
+
+async def _get_audio_key(session: AsyncSession, beat_id: int) -> str:
+    try:
+        cards = await get_track_cards(session, [beat_id])
+    except Exception:
+        logger.exception("Error while retrieving the track")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while retrieving the track.",
+        )
+
+    if beat_id not in cards:
+        raise HTTPException(status_code=404, detail="Beat not found")
+    return cards[beat_id]["audio_file"]
+
+
+async def _stream_file(request: Request, key: str) -> StoredFileResponse:
+    try:
+        stat = await run_in_threadpool(storage.stat, key)
+    except StoredFileNotFound:
+        raise HTTPException(status_code=404, detail="Audio file not found")
+    return StoredFileResponse(storage, key, request, stat)
+
+
+@router.get("/{beat_id}/audio")
+@router.head("/{beat_id}/audio")
+async def stream_track(
+    beat_id: int, request: Request, session: AsyncSession = Depends(get_read_session)
+):
+    return await _stream_file(request, await _get_audio_key(session, beat_id))
+
+
+@router.get("/{beat_id}/preview")
+@router.head("/{beat_id}/preview")
+async def stream_preview(
+    beat_id: int, request: Request, session: AsyncSession = Depends(get_read_session)
+):
+    audio_key = await _get_audio_key(session, beat_id)
+    try:
+        key = await preview_generator.get(beat_id, audio_key)
+    except StoredFileNotFound:
+        raise HTTPException(status_code=404, detail="Audio file not found")
+    except PreviewUnavailable:
+        # Players can still range over the full file
+        logger.info("No preview for beat {}, streaming the full file", beat_id)
+        key = audio_key
+    return await _stream_file(request, key)
+
+
+@router.get("/{beat_id}/waveform")
+@router.head("/{beat_id}/waveform")
+async def get_waveform(
+    beat_id: int,
+    request: Request,
+    peaks: Optional[int] = Query(None, ge=16, le=WAVEFORM_PEAKS),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Min/max peaks of the beat: a 20 byte little endian header (``BBWF``,
+    version, bits per value, sample rate, samples per peak, peak count) and
+    the interleaved min and max of every peak as signed integers.
+    """
+    audio_key = await _get_audio_key(session, beat_id)
+    try:
+        key = await waveform_generator.get(beat_id, audio_key)
+    except StoredFileNotFound:
+        raise HTTPException(status_code=404, detail="Audio file not found")
+    except WaveformUnavailable as error:
+        logger.info("No waveform for beat {}: {}", beat_id, error)
+        raise HTTPException(status_code=404, detail="Waveform unavailable")
+
+    if peaks is None or peaks == WAVEFORM_PEAKS:
+        stat = await run_in_threadpool(storage.stat, key)
+        return StoredFileResponse(
+            storage, key, request, stat, "application/octet-stream", headers=IMMUTABLE
+        )
+
+    def resample() -> bytes:
+        with storage.open(key) as file:
+            return resample_waveform(file, peaks)
+
+    return Response(
+        await run_in_threadpool(resample),
+        media_type="application/octet-stream",
+        headers=IMMUTABLE,
+    )
+
+
+@router.post("/{beat_id}/play", status_code=status.HTTP_202_ACCEPTED)
+async def record_play(beat_id: int):
+    try:
+        play_buffer.record(beat_id)
+    except PlayBufferFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many plays are waiting to be recorded, retry later.",
+            headers={"Retry-After": "1"},
+        )
+    # Trending counts the plays once they are written, only for beats that exist
+    return {"message": "Play recorded"}
@@ -1,6 +1,11 @@
 from datetime import datetime
+from typing import Dict, List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, conlist, validator
+
+from src.config import BATCH_MAX_IDS
+from src.images import variant_urls
+from src.serialization import RowSerializer
 
 
 class TrackCard(BaseModel):
@@ -16,7 +21,54 @@ class TrackCard(BaseModel):
     added_at: datetime
     likes_count: int
     plays_count: int
+    duration_seconds: Optional[float] = None
     username: str
     user_total_likes: int
     user_total_plays: int
     profile_photo: str
+    image_variants: Dict[int, str] = {}
+    profile_photo_variants: Dict[int, str] = {}
+    # Only set for signed in viewers
+    is_liked: Optional[bool] = None
+    in_cart: Optional[bool] = None
+
+    @validator("image_variants", always=True)
+    def add_image_variants(cls, value, values):
+        return value or variant_urls(values.get("image"))
+
+    @validator("profile_photo_variants", always=True)
+    def add_profile_photo_variants(cls, value, values):
+        return value or variant_urls(values.get("profile_photo"))
+
+
+track_card_rows = RowSerializer(TrackCard)
+
+
+class BatchRequest(BaseModel):
+    """Ids to look up at once, results keep their order"""
+
+    ids: conlist(int, min_items=1, max_items=BATCH_MAX_IDS)
+
+
+class TrackCardBatch(BaseModel):
+    items: List[TrackCard]
+    missing: List[int]
+
+
+class FacetBucket(BaseModel):
+    """Number of matching beats between ``min`` and ``max``, None is unbounded"""
+
+    min: Optional[float]
+    max: Optional[float]
+    count: int
+
+
+class SearchFacets(BaseModel):
+    bpm: List[FacetBucket]
+    price: List[FacetBucket]
+
+
+class TrackSearchPage(BaseModel):
+    items: List[TrackCard]
+    next_cursor: Optional[str] = None
+    facets: Optional[SearchFacets] = None
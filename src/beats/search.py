@@ -0,0 +1,100 @@
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import case, func, select, union
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.models import users
+from src.beats.models import beats
+from src.config import SEARCH_BPM_BUCKET_WIDTH, SEARCH_PRICE_BUCKETS
+
+
+class SearchFilters:
+    """
+    WHERE clauses of a beat search, grouped so that each facet can be counted
+    with every filter except its own.
+    """
+
+    def __init__(
+        self,
+        q: Optional[str] = None,
+        bpm_min: Optional[int] = None,
+        bpm_max: Optional[int] = None,
+        price_min: Optional[Decimal] = None,
+        price_max: Optional[Decimal] = None,
+    ):
+        self.text: List[Any] = []
+        self.bpm: List[Any] = []
+        self.price: List[Any] = []
+
+        if q:
+            self.text.append(beats.c.beat_id.in_(text_match_query(q)))
+        if bpm_min is not None:
+            self.bpm.append(beats.c.bpm >= bpm_min)
+        if bpm_max is not None:
+            self.bpm.append(beats.c.bpm <= bpm_max)
+        if price_min is not None:
+            self.price.append(beats.c.price_amount >= price_min)
+        if price_max is not None:
+            self.price.append(beats.c.price_amount <= price_max)
+
+    def all(self) -> List[Any]:
+        return [*self.text, *self.bpm, *self.price]
+
+
+def text_match_query(q: str):
+    """
+    Ids of beats whose title or author name matches ``q``.
+
+    The two matches are separate branches of a UNION so that each of them
+    can use its own GIN index.
+    """
+    tsquery = func.websearch_to_tsquery("simple", q)
+    by_title = select(beats.c.beat_id).where(beats.c.search_vector.op("@@")(tsquery))
+    by_author = (
+        select(beats.c.beat_id)
+        .join(users, users.c.user_id == beats.c.user_id)
+        .where(users.c.search_vector.op("@@")(tsquery))
+    )
+    return union(by_title, by_author)
+
+
+async def bpm_facet(
+    session: AsyncSession, filters: SearchFilters, width: int = SEARCH_BPM_BUCKET_WIDTH
+) -> List[Dict[str, Any]]:
+    bucket = (beats.c.bpm // width * width).label("bucket")
+    query = (
+        select(bucket, func.count().label("count"))
+        .where(*filters.text, *filters.price)
+        .group_by(bucket)
+        .order_by(bucket)
+    )
+    result = await session.execute(query)
+    return [
+        {"min": row.bucket, "max": row.bucket + width - 1, "count": row.count}
+        for row in result
+    ]
+
+
+async def price_facet(
+    session: AsyncSession,
+    filters: SearchFilters,
+    edges: Sequence[float] = SEARCH_PRICE_BUCKETS,
+) -> List[Dict[str, Any]]:
+    bucket = case(
+        *[(beats.c.price_amount < edge, index) for index, edge in enumerate(edges)],
+        else_=len(edges),
+    ).label("bucket")
+    query = (
+        select(bucket, func.count().label("count"))
+        .where(beats.c.price_amount.isnot(None), *filters.text, *filters.bpm)
+        .group_by(bucket)
+        .order_by(bucket)
+    )
+    result = await session.execute(query)
+
+    bounds = [None, *edges, None]
+    return [
+        {"min": bounds[row.bucket], "max": bounds[row.bucket + 1], "count": row.count}
+        for row in result
+    ]
@@ -0,0 +1,231 @@
+import asyncio
+import heapq
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import Float, cast, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.beats.models import beats
+from src.beats.queries import track_cards_query
+from src.config import (
+    TRENDING_HALF_LIFE_HOURS,
+    TRENDING_LIKE_WEIGHT,
+    TRENDING_PLAY_WEIGHT,
+    TRENDING_REFRESH_SECONDS,
+    TRENDING_TOP_K,
+)
+from src.users.models import likes
+
+# Likes older than this many half-lives contribute less than 0.1% of a fresh one
+LIKES_WINDOW_HALF_LIVES = 10
+# Lower bound for the decay exponent, keeps Postgres away from float underflow
+MIN_DECAY_EXPONENT = -60.0
+
+
+def trending_candidates_query(
+    limit: int, half_life_seconds: float, like_weight: float, play_weight: float
+):
+    """Track cards of the best scored beats together with their decayed score"""
+    now = func.timezone("utc", func.now())
+    cutoff = datetime.utcnow() - timedelta(
+        seconds=half_life_seconds * LIKES_WINDOW_HALF_LIVES
+    )
+
+    like_age = cast(func.extract("epoch", now - likes.c.added_at), Float)
+    like_scores = (
+        select(
+            likes.c.beat_id,
+            func.sum(func.power(2.0, -like_age / half_life_seconds)).label(
+                "like_score"
+            ),
+        )
+        .where(likes.c.added_at > cutoff)
+        .group_by(likes.c.beat_id)
+        .subquery()
+    )
+
+    beat_age = cast(func.extract("epoch", now - beats.c.added_at), Float)
+    play_decay = func.power(
+        2.0, func.greatest(-beat_age / half_life_seconds, MIN_DECAY_EXPONENT)
+    )
+    score = (
+        like_weight * func.coalesce(like_scores.c.like_score, 0.0)
+        + play_weight * beats.c.plays_count * play_decay
+    ).label("score")
+
+    return (
+        track_cards_query()
+        .add_columns(score)
+        .outerjoin(like_scores, like_scores.c.beat_id == beats.c.beat_id)
+        .order_by(score.desc(), beats.c.likes_count.desc(), beats.c.beat_id.desc())
+        .limit(limit)
+    )
+
+
+class TrendingRanking:
+    """
+    Materialized top-K of beats ordered by a time-decayed popularity score.
+
+    Scores use forward decay: an event at time ``t`` adds
+    ``weight * 2 ** ((t - epoch) / half_life)``, so already accumulated scores
+    never have to be decayed again and an incoming like or play is an O(1)
+    update. The epoch is moved forward on every refresh from the database,
+    which also keeps the numbers small.
+
+    Only the candidates loaded by the last refresh carry a track card. When a
+    beat outside of them overtakes the top-K the ranking is marked dirty and
+    the next read reloads it.
+    """
+
+    def __init__(
+        self,
+        top_k: int = TRENDING_TOP_K,
+        half_life_seconds: float = TRENDING_HALF_LIFE_HOURS * 3600,
+        like_weight: float = TRENDING_LIKE_WEIGHT,
+        play_weight: float = TRENDING_PLAY_WEIGHT,
+        refresh_interval: float = TRENDING_REFRESH_SECONDS,
+    ):
+        self.top_k = top_k
+        self.half_life_seconds = half_life_seconds
+        self.like_weight = like_weight
+        self.play_weight = play_weight
+        self.refresh_interval = refresh_interval
+
+        self._epoch = time.time()
+        self._scores: Dict[int, float] = {}
+        self._cards: Dict[int, Dict[str, Any]] = {}
+        self._top: List[Dict[str, Any]] = []
+        self._refreshed_at: Optional[float] = None
+        self._dirty = False
+        self._lock = asyncio.Lock()
+        # Changes whenever the served cards or their order may have changed
+        self.version = 0
+
+    def load(self, rows: List[Mapping[str, Any]], now: Optional[float] = None):
+        """Replace the ranking with rows carrying a track card and its ``score``"""
+        now = time.time() if now is None else now
+        self._epoch = now
+        self._scores = {}
+        self._cards = {}
+        for row in rows:
+            card = dict(row)
+            score = card.pop("score")
+            self._scores[card["beat_id"]] = float(score or 0.0)
+            self._cards[card["beat_id"]] = card
+        self._rerank()
+        self._refreshed_at = now
+        self._dirty = False
+
+    def record(self, beat_id: int, weight: float, now: Optional[float] = None):
+        """Add a weighted event for a beat at ``now``"""
+        now = time.time() if now is None else now
+        boost = weight * 2 ** ((now - self._epoch) / self.half_life_seconds)
+        score = self._scores.get(beat_id, 0.0) + boost
+        self._scores[beat_id] = score
+
+        if beat_id in self._cards:
+            self._rerank()
+        elif len(self._top) < self.top_k or score > self._lowest_top_score():
+            self._dirty = True
+
+    def record_like(self, beat_id: int, delta: int = 1, now: Optional[float] = None):
+        card = self._cards.get(beat_id)
+        if card is not None:
+            card["likes_count"] += delta
+            self.version += 1
+        self.record(beat_id, delta * self.like_weight, now)
+
+    def record_play(self, beat_id: int, count: int = 1, now: Optional[float] = None):
+        card = self._cards.get(beat_id)
+        if card is not None:
+            card["plays_count"] += count
+            self.version += 1
+        self.record(beat_id, count * self.play_weight, now)
+
+    def top(self, limit: int) -> List[Dict[str, Any]]:
+        return self._top[:limit]
+
+    def page(
+        self, limit: int, after: Optional[Tuple[float, float, int, int]] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[float, float, int, int]]]:
+        """
+        Slice of the ranking following the ``after`` key of a previous page.
+
+        Keys are ``(epoch, score, likes_count, beat_id)``. A score computed
+        against an older epoch only differs by a constant factor, so keys
+        survive a refresh happening between two pages.
+        """
+        items = self._top
+        if after is not None:
+            epoch, score, likes_count, beat_id = after
+            score *= 2 ** ((epoch - self._epoch) / self.half_life_seconds)
+            items = [
+                card
+                for card in items
+                if self._rank_key(card["beat_id"]) < (score, likes_count, beat_id)
+            ]
+
+        items = items[:limit]
+        next_key = None
+        if items and items[-1] is not self._top[-1]:
+            next_key = (self._epoch, *self._rank_key(items[-1]["beat_id"]))
+        return items, next_key
+
+    def needs_refresh(self, now: Optional[float] = None) -> bool:
+        if self._refreshed_at is None or self._dirty:
+            return True
+        now = time.time() if now is None else now
+        return now - self._refreshed_at >= self.refresh_interval
+
+    async def ensure_fresh(self, session: AsyncSession):
+        """
+        Reload the candidates from the database when the ranking is stale.
+
+        Concurrent callers keep serving the previous ranking while one of
+        them refreshes it, only the very first load makes them wait.
+        """
+        if not self.needs_refresh():
+            return
+        if self._lock.locked() and self._refreshed_at is not None:
+            return
+
+        async with self._lock:
+            if not self.needs_refresh():
+                return
+            try:
+                await self.refresh(session)
+            except Exception:
+                if self._refreshed_at is None:
+                    raise
+                logger.exception("Failed to refresh trending, serving stale ranking")
+                self._refreshed_at = time.time()
+                self._dirty = False
+
+    async def refresh(self, session: AsyncSession):
+        query = trending_candidates_query(
+            # Keep some beats below the cut, they are the likeliest to climb up
+            limit=self.top_k * 2,
+            half_life_seconds=self.half_life_seconds,
+            like_weight=self.like_weight,
+            play_weight=self.play_weight,
+        )
+        now = time.time()
+        result = await session.execute(query)
+        self.load(result.mappings().fetchall(), now)
+
+    def _lowest_top_score(self) -> float:
+        return self._scores[self._top[-1]["beat_id"]]
+
+    def _rank_key(self, beat_id: int) -> Tuple[float, int, int]:
+        return (self._scores[beat_id], self._cards[beat_id]["likes_count"], beat_id)
+
+    def _rerank(self):
+        best = heapq.nlargest(self.top_k, self._cards, key=self._rank_key)
+        self._top = [self._cards[beat_id] for beat_id in best]
+        self.version += 1
+
+
+trending = TrendingRanking()
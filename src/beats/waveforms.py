@@ -0,0 +1,307 @@
+import asyncio
+import io
+import shutil
+import struct
+import subprocess
+import threading
+import wave
+from pathlib import PurePosixPath
+from typing import BinaryIO, Dict, Iterator, Tuple
+
+from loguru import logger
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+
+from src.beats.models import beats
+from src.config import WAVEFORM_BITS, WAVEFORM_PEAKS, WAVEFORM_PREFIX
+from src.database import async_session_maker
+from src.storage import Storage, StoredFileNotFound, storage
+
+try:
+    import numpy as np
+except ImportError:  # No waveforms without it
+    np = None
+
+# magic, format version, bits per value, sample rate, samples per peak, peaks
+HEADER = struct.Struct("<4sBBxxIII")
+MAGIC = b"BBWF"
+VERSION = 1
+# Samples summarized by one min/max pair while decoding, the pairs are
+# merged down to the requested number of peaks at the end
+WINDOW = 256
+BLOCK_FRAMES = 64 * 1024
+# Rate compressed formats are decoded at, plenty for a picture of the track
+DECODE_RATE = 22050
+READ_SIZE = 64 * 1024
+
+
+class WaveformUnavailable(Exception):
+    pass
+
+
+def waveform_key(beat_id: int) -> str:
+    return f"{WAVEFORM_PREFIX}/{beat_id}.bbwf"
+
+
+def _wav_blocks(source: BinaryIO) -> Tuple[int, Iterator["np.ndarray"]]:
+    reader = wave.open(source, "rb")
+    width, channels = reader.getsampwidth(), reader.getnchannels()
+    if width not in (1, 2, 3, 4):
+        raise WaveformUnavailable(f"Unsupported WAV sample width {width}")
+
+    def blocks():
+        with reader:
+            while True:
+                raw = reader.readframes(BLOCK_FRAMES)
+                if not raw:
+                    return
+                if width == 1:
+                    samples = (np.frombuffer(raw, "u1").astype(np.float32) - 128) / 128
+                elif width == 3:
+                    # Sign-extend the 24-bit samples into the top of an int32
+                    padded = np.zeros((len(raw) // 3, 4), "u1")
+                    padded[:, 1:] = np.frombuffer(raw, "u1").reshape(-1, 3)
+                    samples = padded.view("<i4").ravel().astype(np.float32) / 2**31
+                else:
+                    dtype = "<i2" if width == 2 else "<i4"
+                    samples = np.frombuffer(raw, dtype).astype(np.float32)
+                    samples /= 2 ** (8 * width - 1)
+                frames = len(samples) // channels
+                yield samples[: frames * channels].reshape(frames, channels).mean(
+                    axis=1
+                )
+
+    return reader.getframerate(), blocks()
+
+
+def _ffmpeg_blocks(source: BinaryIO) -> Tuple[int, Iterator["np.ndarray"]]:
+    """Mono PCM decoded by ffmpeg, the file is piped through it in chunks"""
+    if shutil.which("ffmpeg") is None:
+        raise WaveformUnavailable("Decoding compressed audio requires ffmpeg")
+
+    process = subprocess.Popen(
+        ["ffmpeg", "-v", "error", "-i", "pipe:0", "-f", "s16le", "-ac", "1"]
+        + ["-ar", str(DECODE_RATE), "pipe:1"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+    )
+
+    def feed():
+        try:
+            while True:
+                chunk = source.read(READ_SIZE)
+                if not chunk:
+                    break
+                process.stdin.write(chunk)
+        except BrokenPipeError:
+            pass
+        finally:
+            process.stdin.close()
+
+    def blocks():
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        try:
+            while True:
+                raw = process.stdout.read(BLOCK_FRAMES * 2)
+                if not raw:
+                    break
+                samples = np.frombuffer(raw[: len(raw) // 2 * 2], "<i2")
+                yield samples.astype(np.float32) / 2**15
+        finally:
+            process.stdout.close()
+            feeder.join()
+            if process.wait() != 0:
+                raise WaveformUnavailable("ffmpeg could not decode the file")
+
+    return DECODE_RATE, blocks()
+
+
+def compute_peaks(
+    blocks: Iterator["np.ndarray"], peaks: int
+) -> Tuple[int, "np.ndarray", "np.ndarray"]:
+    """
+    Min and max of the signal over ``peaks`` equal slices of it.
+
+    Blocks are reduced to one min/max pair per ``WINDOW`` samples as they
+    arrive, so memory holds a few hundredth of the PCM at most. Returns the
+    samples per peak and the two arrays.
+    """
+    window_mins, window_maxs = [], []
+    leftover = np.zeros(0, np.float32)
+    total = 0
+    for block in blocks:
+        total += len(block)
+        samples = np.concatenate([leftover, block]) if len(leftover) else block
+        whole = len(samples) // WINDOW * WINDOW
+        windows = samples[:whole].reshape(-1, WINDOW)
+        window_mins.append(windows.min(axis=1))
+        window_maxs.append(windows.max(axis=1))
+        leftover = samples[whole:]
+    if len(leftover):
+        window_mins.append(leftover.min(keepdims=True))
+        window_maxs.append(leftover.max(keepdims=True))
+    if not total:
+        raise WaveformUnavailable("The audio file is empty")
+
+    mins, maxs = np.concatenate(window_mins), np.concatenate(window_maxs)
+    peaks = min(peaks, len(mins))
+    return -(-total // peaks), *reduce_peaks(mins, maxs, peaks)
+
+
+def reduce_peaks(
+    mins: "np.ndarray", maxs: "np.ndarray", peaks: int
+) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Merge min/max pairs down to ``peaks`` pairs"""
+    if peaks >= len(mins):
+        return mins, maxs
+    edges = np.linspace(0, len(mins), peaks + 1).astype(np.int64)[:-1]
+    return np.minimum.reduceat(mins, edges), np.maximum.reduceat(maxs, edges)
+
+
+def encode_waveform(
+    sample_rate: int,
+    samples_per_peak: int,
+    mins: "np.ndarray",
+    maxs: "np.ndarray",
+    bits: int = WAVEFORM_BITS,
+) -> bytes:
+    """Header followed by interleaved min/max values, little endian"""
+    if bits not in (8, 16):
+        raise ValueError("Waveforms are stored with 8 or 16 bits")
+    scale, dtype = (127, "i1") if bits == 8 else (32767, "<i2")
+    values = np.empty(len(mins) * 2, np.float32)
+    values[0::2], values[1::2] = mins, maxs
+    values = np.clip(np.round(values * scale), -scale, scale).astype(dtype)
+    header = HEADER.pack(MAGIC, VERSION, bits, sample_rate, samples_per_peak, len(mins))
+    return header + values.tobytes()
+
+
+def read_waveform(source: BinaryIO) -> Tuple[Tuple[int, int, int], "np.ndarray"]:
+    """
+    Header fields ``(bits, sample_rate, samples_per_peak)`` and the values of
+    a stored waveform as a ``(peaks, 2)`` array, memory-mapped when the file
+    is on disk.
+    """
+    magic, version, bits, sample_rate, samples_per_peak, peaks = HEADER.unpack(
+        source.read(HEADER.size)
+    )
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a waveform file")
+    dtype = "i1" if bits == 8 else "<i2"
+    try:
+        values = np.memmap(
+            source, dtype, mode="r", offset=HEADER.size, shape=(peaks * 2,)
+        )
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        source.seek(HEADER.size)
+        values = np.frombuffer(source.read(), dtype, count=peaks * 2)
+    return (bits, sample_rate, samples_per_peak), values.reshape(peaks, 2)
+
+
+def resample_waveform(source: BinaryIO, peaks: int) -> bytes:
+    """A stored waveform with fewer peaks, in the same format"""
+    (bits, sample_rate, samples_per_peak), values = read_waveform(source)
+    stored = len(values)
+    mins, maxs = reduce_peaks(values[:, 0], values[:, 1], peaks)
+    scale = 127 if bits == 8 else 32767
+    return encode_waveform(
+        sample_rate,
+        samples_per_peak * -(-stored // min(peaks, stored)),
+        mins.astype(np.float32) / scale,
+        maxs.astype(np.float32) / scale,
+        bits,
+    )
+
+
+def make_waveform(source: BinaryIO, suffix: str, peaks: int = WAVEFORM_PEAKS) -> bytes:
+    if np is None:
+        raise WaveformUnavailable("Waveforms require numpy")
+    try:
+        sample_rate, blocks = (_wav_blocks if suffix == ".wav" else _ffmpeg_blocks)(
+            source
+        )
+        samples_per_peak, mins, maxs = compute_peaks(blocks, peaks)
+    except (wave.Error, EOFError) as error:
+        # Truncated or corrupt WAV files
+        raise WaveformUnavailable(f"Unreadable WAV file: {error}") from error
+    return encode_waveform(sample_rate, samples_per_peak, mins, maxs)
+
+
+def ensure_waveform(storage: Storage, beat_id: int, audio_key: str) -> str:
+    """
+    Key of the waveform of a beat, computing it first when it is missing or
+    older than the audio file. Blocking, run it in a thread.
+    """
+    key = waveform_key(beat_id)
+    source = storage.stat(audio_key)
+    try:
+        if storage.stat(key).mtime >= source.mtime:
+            return key
+    except StoredFileNotFound:
+        pass
+
+    with storage.open(audio_key) as file:
+        data = make_waveform(file, PurePosixPath(audio_key).suffix.lower())
+    storage.save(key, data)
+    return key
+
+
+class WaveformGenerator:
+    """
+    Computes waveforms in the thread pool. Requests arriving for a beat whose
+    waveform is already being computed wait for it instead of decoding the
+    audio again, and the decode goes on when the requests go away.
+    """
+
+    def __init__(self, storage: Storage):
+        self.storage = storage
+        self._pending: Dict[int, "asyncio.Task[str]"] = {}
+
+    async def get(self, beat_id: int, audio_key: str) -> str:
+        task = self._pending.get(beat_id)
+        if task is None:
+            task = asyncio.create_task(
+                run_in_threadpool(ensure_waveform, self.storage, beat_id, audio_key)
+            )
+            self._pending[beat_id] = task
+            task.add_done_callback(lambda done: self._done(beat_id, done))
+        return await asyncio.shield(task)
+
+    def _done(self, beat_id: int, task: "asyncio.Task[str]"):
+        del self._pending[beat_id]
+        if not task.cancelled():
+            # Marks it retrieved, asyncio would log it when every request left
+            task.exception()
+
+
+async def generate_missing_waveforms(batch_size: int = 100):
+    """Compute the waveforms of every beat ahead of the first listing"""
+    last_id = 0
+    generated = failed = 0
+    while True:
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(beats.c.beat_id, beats.c.audio_file)
+                .where(beats.c.beat_id > last_id)
+                .order_by(beats.c.beat_id)
+                .limit(batch_size)
+            )
+            rows = result.fetchall()
+        if not rows:
+            break
+
+        for beat_id, audio_key in rows:
+            try:
+                await run_in_threadpool(ensure_waveform, storage, beat_id, audio_key)
+                generated += 1
+            except (WaveformUnavailable, StoredFileNotFound) as error:
+                failed += 1
+                logger.warning("No waveform for beat {}: {}", beat_id, error)
+        last_id = rows[-1].beat_id
+
+    logger.info("Waveforms ready for {} beats, {} failed", generated, failed)
+
+
+if __name__ == "__main__":
+    asyncio.run(generate_missing_waveforms())
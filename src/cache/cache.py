@@ -0,0 +1,379 @@
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from fastapi.encoders import jsonable_encoder
+
+from src.config import (
+    CACHE_BACKEND,
+    CACHE_MAX_ENTRIES,
+    CACHE_MAX_VERSIONS,
+    CACHE_REDIS_URL,
+    CACHE_TTL_SECONDS,
+    CACHE_VERSION_TTL_SECONDS,
+)
+
+# Set for requests that have to see their own recent writes
+bypass_cache_reads: ContextVar[bool] = ContextVar("bypass_cache_reads", default=False)
+
+
+class CacheStats:
+    """Counters used to tune the cache size against its hit rate"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return dict(vars(self))
+
+
+class CacheBackend(ABC):
+    """
+    Storage for cached responses, entries are grouped by tags for invalidation.
+
+    Backends also keep a version counter per tag, bumped by writes, that
+    conditional requests compare instead of the responses themselves.
+    """
+
+    # Whether every worker sees the same entries and version counters
+    shared = False
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        ...
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        return [await self.get(key) for key in keys]
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()):
+        ...
+
+    @abstractmethod
+    async def invalidate_tags(self, tags: Iterable[str]):
+        ...
+
+    @abstractmethod
+    async def clear(self):
+        ...
+
+    @abstractmethod
+    def size(self) -> int:
+        ...
+
+    @abstractmethod
+    async def incr_versions(self, tags: Iterable[str]):
+        ...
+
+    @abstractmethod
+    async def get_versions(self, tags: List[str]) -> List[str]:
+        ...
+
+
+class LRUCacheBackend(CacheBackend):
+    """In-process cache bounded both by entry count and by time to live"""
+
+    def __init__(
+        self,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        max_versions: int = CACHE_MAX_VERSIONS,
+    ):
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_versions = max_versions
+        self._entries: "OrderedDict[str, Tuple[float, Any, Tuple[str, ...]]]" = (
+            OrderedDict()
+        )
+        self._tags: Dict[str, Set[str]] = {}
+        self._versions: "OrderedDict[str, int]" = OrderedDict()
+        # Bumped when a counter is evicted, a fresh counter starting over
+        # at zero must not match versions handed out before
+        self._generation = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+
+        expires_at, value, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()):
+        if key in self._entries:
+            self._remove(key)
+
+        tags = tuple(tags)
+        self._entries[key] = (time.monotonic() + ttl, value, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats.evictions += 1
+
+    async def invalidate_tags(self, tags: Iterable[str]):
+        for tag in tags:
+            for key in self._tags.pop(tag, ()):
+                self._remove(key)
+                self.stats.invalidations += 1
+
+    async def clear(self):
+        self._entries.clear()
+        self._tags.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+    async def incr_versions(self, tags: Iterable[str]):
+        for tag in tags:
+            self._versions[tag] = self._versions.get(tag, 0) + 1
+            self._versions.move_to_end(tag)
+        while len(self._versions) > self.max_versions:
+            self._versions.popitem(last=False)
+            self._generation += 1
+
+    async def get_versions(self, tags: List[str]) -> List[str]:
+        return [f"{self._generation}.{self._versions.get(tag, 0)}" for tag in tags]
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del self._tags[tag]
+
+
+class SharedCacheBackend(CacheBackend):
+    """
+    Cache shared by all workers, stored in a Redis compatible server.
+
+    ``client`` only needs the ``get``, ``mget``, ``set``, ``delete``, ``sadd``,
+    ``smembers``, ``expire``, ``keys`` and ``incr`` coroutines and the
+    ``pipeline`` of ``redis.asyncio.Redis``.
+    Evictions happen on the server and are not counted here.
+    """
+
+    shared = True
+
+    def __init__(
+        self,
+        client,
+        prefix: str = "beatbay:cache:",
+        version_ttl: int = CACHE_VERSION_TTL_SECONDS,
+    ):
+        super().__init__()
+        self.client = client
+        self.prefix = prefix
+        self.version_ttl = version_ttl
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self.client.get(self.prefix + key)
+        if raw is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return json.loads(raw)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        if not keys:
+            return []
+        raws = await self.client.mget([self.prefix + key for key in keys])
+        hits = sum(raw is not None for raw in raws)
+        self.stats.hits += hits
+        self.stats.misses += len(keys) - hits
+        return [None if raw is None else json.loads(raw) for raw in raws]
+
+    async def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()):
+        ttl = max(int(ttl), 1)
+        payload = json.dumps(jsonable_encoder(value))
+        await self.client.set(self.prefix + key, payload, ex=ttl)
+        for tag in tags:
+            tag_key = self._tag_key(tag)
+            await self.client.sadd(tag_key, self.prefix + key)
+            await self.client.expire(tag_key, ttl)
+
+    async def invalidate_tags(self, tags: Iterable[str]):
+        for tag in tags:
+            tag_key = self._tag_key(tag)
+            keys = await self.client.smembers(tag_key)
+            if keys:
+                await self.client.delete(*keys)
+                self.stats.invalidations += len(keys)
+            await self.client.delete(tag_key)
+
+    async def clear(self):
+        keys = await self.client.keys(self.prefix + "*")
+        if keys:
+            await self.client.delete(*keys)
+
+    def size(self) -> int:
+        return -1
+
+    async def incr_versions(self, tags: Iterable[str]):
+        tags = list(tags)
+        if not tags:
+            return
+        # One round trip for all the tags
+        pipeline = self.client.pipeline(transaction=False)
+        for tag in tags:
+            pipeline.incr(self._version_key(tag))
+            pipeline.expire(self._version_key(tag), self.version_ttl)
+        await pipeline.execute()
+
+    async def get_versions(self, tags: List[str]) -> List[str]:
+        if not tags:
+            return []
+        raws = await self.client.mget([self._version_key(tag) for tag in tags])
+        return [
+            "0" if raw is None else raw.decode() if isinstance(raw, bytes) else str(raw)
+            for raw in raws
+        ]
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.prefix}tag:{tag}"
+
+    def _version_key(self, tag: str) -> str:
+        return f"{self.prefix}version:{tag}"
+
+
+class ResponseCache:
+    """
+    Read-through cache for endpoint responses.
+
+    Every entry is stored with the tags of the entities it was built from, and
+    write paths invalidate exactly those tags. An entry written by a read that
+    raced with a write can survive until its TTL, which is kept short.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float = CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        tags: Callable[[Any], Iterable[str]],
+    ) -> Any:
+        """Return the cached value for ``key`` or store the result of ``loader``"""
+        if not bypass_cache_reads.get():
+            value = await self.backend.get(key)
+            if value is not None:
+                return value
+
+        value = await loader()
+        if value:
+            await self.backend.set(key, value, self.ttl, tags(value))
+        return value
+
+    async def get_or_load_many(
+        self,
+        ids: List[Any],
+        key: Callable[[Any], str],
+        loader: Callable[[List[Any]], Awaitable[Dict[Any, Any]]],
+        tags: Callable[[Any], Iterable[str]],
+    ) -> Dict[Any, Any]:
+        """
+        Batch version of ``get_or_load`` sharing its entries: ``loader`` gets
+        the ids missing from the cache and returns the values found by id.
+        """
+        found = {}
+        if not bypass_cache_reads.get():
+            cached = await self.backend.get_many([key(id_) for id_ in ids])
+            found = {id_: value for id_, value in zip(ids, cached) if value is not None}
+
+        missing = [id_ for id_ in ids if id_ not in found]
+        if missing:
+            loaded = await loader(missing)
+            for id_, value in loaded.items():
+                await self.backend.set(key(id_), value, self.ttl, tags(value))
+            found.update(loaded)
+        return found
+
+    async def invalidate(self, *tags: str):
+        await self.backend.invalidate_tags(tags)
+        await self.backend.incr_versions(tags)
+
+    async def bump_versions(self, *tags: str):
+        """Mark entities as changed for conditional requests, keep cached entries"""
+        await self.backend.incr_versions(tags)
+
+    async def versions(self, tags: List[str]) -> List[str]:
+        return await self.backend.get_versions(tags)
+
+    @property
+    def shared(self) -> bool:
+        return self.backend.shared
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": self.backend.size(),
+            **self.backend.stats.as_dict(),
+        }
+
+
+def rows_to_dicts(rows: Iterable[Mapping[str, Any]]) -> List[Dict[str, Any]]:
+    return [dict(row) for row in rows]
+
+
+def track_tags(rows: Iterable[Mapping[str, Any]]) -> List[str]:
+    """Tags of every beat and user a list of track cards was built from"""
+    tags = set()
+    for row in rows:
+        tags.add(f"beat:{row['beat_id']}")
+        tags.add(f"author:{row['user_id']}")
+    return sorted(tags)
+
+
+def create_cache_backend(name: str = CACHE_BACKEND) -> CacheBackend:
+    if name == "memory":
+        return LRUCacheBackend()
+    if name == "redis":
+        try:
+            from redis import asyncio as redis
+        except ImportError:
+            raise RuntimeError(
+                "CACHE_BACKEND=redis requires the redis package to be installed"
+            )
+        return SharedCacheBackend(redis.from_url(CACHE_REDIS_URL))
+    raise ValueError(f"Unknown cache backend: {name}")
+
+
+response_cache = ResponseCache(create_cache_backend())
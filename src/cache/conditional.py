@@ -0,0 +1,87 @@
+import hashlib
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from fastapi import Request, Response, status
+
+from src.cache.cache import response_cache
+from src.config import (
+    CACHE_TTL_SECONDS,
+    HTTP_CACHE_MAX_AGE_SECONDS,
+    HTTP_CACHE_STALE_WHILE_REVALIDATE_SECONDS,
+)
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    Weak ETag of a representation identified by ``parts``, weak because the
+    same data may be encoded differently by the two JSON encoders.
+    """
+    digest = hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of ``If-None-Match`` against the current ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in if_none_match.split(",")
+    )
+
+
+async def versioned_etag(
+    tags: Iterable[str], *parts: Any, local_versions: Iterable[Any] = ()
+) -> str:
+    """
+    ETag from the version counters of the tags a response is built from.
+
+    Writes bump the counters, and the ETag also changes every cache TTL:
+    counters that are not bumped, like the play counts, and counters kept
+    per process by the in-memory backend are then at most as stale as the
+    cached responses already are.
+
+    ``local_versions`` are counters of this process only, like the version
+    of the trending ranking. They are left out with a shared backend, where
+    another worker can hand out the same numbers for other content and the
+    shared counters of ``tags`` have to cover the change instead.
+    """
+    tags = list(tags)
+    versions = await response_cache.versions(tags)
+    if not response_cache.shared:
+        parts = (*parts, *local_versions)
+    period = int(time.time() // CACHE_TTL_SECONDS)
+    return make_etag(period, *parts, *zip(tags, versions))
+
+
+def cache_headers(etag: str, private: bool = False) -> Dict[str, str]:
+    """
+    Validators and caching policy. Responses personalised for a signed in
+    viewer may only be kept by the browser, and are revalidated every time.
+    """
+    if private:
+        cache_control = "private, no-cache"
+    else:
+        cache_control = (
+            f"public, max-age={HTTP_CACHE_MAX_AGE_SECONDS}, "
+            f"stale-while-revalidate={HTTP_CACHE_STALE_WHILE_REVALIDATE_SECONDS}"
+        )
+    return {"ETag": etag, "Cache-Control": cache_control, "Vary": "Cookie"}
+
+
+def not_modified(request: Request, headers: Dict[str, str]) -> Optional[Response]:
+    """A 304 response when the client already has the current representation"""
+    if not etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return None
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+
+def with_headers(result: Any, response: Response, headers: Dict[str, str]) -> Any:
+    """Add headers to an endpoint result, returned responses skip ``response``"""
+    target = result if isinstance(result, Response) else response
+    target.headers.update(headers)
+    return result
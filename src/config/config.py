@@ -8,6 +8,15 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_SECONDS = 3600
+# Authenticated users are reloaded from the database at most once per TTL
+AUTH_PRINCIPAL_TTL_SECONDS = float(os.getenv("AUTH_PRINCIPAL_TTL_SECONDS", 60))
+AUTH_PRINCIPAL_CACHE_SIZE = int(os.getenv("AUTH_PRINCIPAL_CACHE_SIZE", 10000))
+
+# Stored hashes with other rounds are upgraded on the next successful login
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", 12))
+# "thread" or "process", bcrypt releases the GIL so threads are usually enough
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
 
 # Database data
 DB_USER = os.getenv("DB_USER")
@@ -22,3 +31,137 @@ TEST_DB_HOST = os.getenv("TEST_DB_HOST")
 TEST_DB_PORT = os.getenv("TEST_DB_PORT")
 TEST_DB_NAME = os.getenv("TEST_DB_NAME")
 TEST_DB_PASS = os.getenv("TEST_DB_PASS")
+
+TRENDING_TOP_K = int(os.getenv("TRENDING_TOP_K", 50))
+TRENDING_REFRESH_SECONDS = float(os.getenv("TRENDING_REFRESH_SECONDS", 60))
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", 48))
+TRENDING_LIKE_WEIGHT = float(os.getenv("TRENDING_LIKE_WEIGHT", 1.0))
+TRENDING_PLAY_WEIGHT = float(os.getenv("TRENDING_PLAY_WEIGHT", 0.1))
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 10000))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", 30))
+CACHE_MAX_VERSIONS = int(os.getenv("CACHE_MAX_VERSIONS", 100000))
+# Shared version counters not bumped for this long are dropped, ETags change
+# every CACHE_TTL_SECONDS anyway so a counter starting over cannot match them
+CACHE_VERSION_TTL_SECONDS = int(os.getenv("CACHE_VERSION_TTL_SECONDS", 3600))
+# Browsers and CDNs may reuse public responses this long, and serve them
+# stale while they revalidate in the background
+HTTP_CACHE_MAX_AGE_SECONDS = int(os.getenv("HTTP_CACHE_MAX_AGE_SECONDS", 10))
+HTTP_CACHE_STALE_WHILE_REVALIDATE_SECONDS = int(
+    os.getenv("HTTP_CACHE_STALE_WHILE_REVALIDATE_SECONDS", 60)
+)
+
+PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", 20))
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", 100))
+
+PLAYS_QUEUE_SIZE = int(os.getenv("PLAYS_QUEUE_SIZE", 10000))
+PLAYS_FLUSH_INTERVAL_SECONDS = float(os.getenv("PLAYS_FLUSH_INTERVAL_SECONDS", 1.0))
+PLAYS_FLUSH_THRESHOLD = int(os.getenv("PLAYS_FLUSH_THRESHOLD", 500))
+
+BATCH_MAX_IDS = int(os.getenv("BATCH_MAX_IDS", 100))
+
+SEARCH_BPM_BUCKET_WIDTH = int(os.getenv("SEARCH_BPM_BUCKET_WIDTH", 10))
+SEARCH_PRICE_BUCKETS = [
+    float(edge)
+    for edge in os.getenv("SEARCH_PRICE_BUCKETS", "25,50,100,250").split(",")
+]
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 0))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100))
+
+DB_REPLICA_HOST = os.getenv("DB_REPLICA_HOST")
+DB_REPLICA_PORT = os.getenv("DB_REPLICA_PORT", DB_PORT)
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", 5))
+DB_REPLICA_CHECK_SECONDS = float(os.getenv("DB_REPLICA_CHECK_SECONDS", 5))
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", 10))
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 200))
+
+# Stored paths such as beats.audio_file are relative to this directory
+STORAGE_ROOT = os.getenv("STORAGE_ROOT", ".")
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", 64 * 1024))
+PREVIEW_PREFIX = os.getenv("PREVIEW_PREFIX", "backend/previews")
+PREVIEW_SECONDS = float(os.getenv("PREVIEW_SECONDS", 30))
+WAVEFORM_PREFIX = os.getenv("WAVEFORM_PREFIX", "backend/waveforms")
+# 1024 min/max pairs of 16 bits are 4 KB per beat
+WAVEFORM_PEAKS = int(os.getenv("WAVEFORM_PEAKS", 1024))
+WAVEFORM_BITS = int(os.getenv("WAVEFORM_BITS", 16))
+
+IMAGE_SIZES = [int(size) for size in os.getenv("IMAGE_SIZES", "64,256,1024").split(",")]
+# Only images stored under these prefixes are resized and served
+IMAGE_SOURCE_PREFIXES = os.getenv("IMAGE_SOURCE_PREFIXES", "backend/images").split(",")
+IMAGE_VARIANT_PREFIX = os.getenv("IMAGE_VARIANT_PREFIX", "backend/variants")
+IMAGE_VARIANT_QUALITY = int(os.getenv("IMAGE_VARIANT_QUALITY", 80))
+
+UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR", "backend/uploads")
+UPLOAD_AUDIO_PREFIX = os.getenv("UPLOAD_AUDIO_PREFIX", "backend/beats_src")
+UPLOAD_DEFAULT_IMAGE = os.getenv("UPLOAD_DEFAULT_IMAGE", "backend/images/default.png")
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", 500 * 1024 * 1024))
+UPLOAD_CHUNK_MAX_BYTES = int(os.getenv("UPLOAD_CHUNK_MAX_BYTES", 8 * 1024 * 1024))
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", 2))
+UPLOAD_QUEUE_SIZE = int(os.getenv("UPLOAD_QUEUE_SIZE", 1000))
+UPLOAD_SWEEP_SECONDS = float(os.getenv("UPLOAD_SWEEP_SECONDS", 60))
+# Uploads stuck in processing for longer are assumed lost with their worker
+UPLOAD_PROCESSING_TIMEOUT_SECONDS = float(
+    os.getenv("UPLOAD_PROCESSING_TIMEOUT_SECONDS", 600)
+)
+# Uploads without a chunk for this long are abandoned and their files removed
+UPLOAD_PENDING_TTL_SECONDS = float(os.getenv("UPLOAD_PENDING_TTL_SECONDS", 86400))
+
+AUTHOR_CACHE_TTL_SECONDS = float(os.getenv("AUTHOR_CACHE_TTL_SECONDS", 60))
+AUTHOR_CACHE_MAX_ENTRIES = int(os.getenv("AUTHOR_CACHE_MAX_ENTRIES", 10000))
+COUNTERS_RECONCILE_SECONDS = float(os.getenv("COUNTERS_RECONCILE_SECONDS", 3600))
+# Beats read per transaction when price_amount is synced from the price text
+PRICE_SYNC_BATCH_SIZE = int(os.getenv("PRICE_SYNC_BATCH_SIZE", 5000))
+
+# Dimensions of the random projection of the users who liked a beat
+RECOMMENDATIONS_COLIKE_DIMS = int(os.getenv("RECOMMENDATIONS_COLIKE_DIMS", 48))
+RECOMMENDATIONS_REBUILD_SECONDS = float(
+    os.getenv("RECOMMENDATIONS_REBUILD_SECONDS", 3600)
+)
+RECOMMENDATIONS_MAX = int(os.getenv("RECOMMENDATIONS_MAX", 50))
+
+# Precomputed "liked this also liked" neighbours, see src/recommendations
+NEIGHBOURS_TOP_N = int(os.getenv("NEIGHBOURS_TOP_N", 20))
+# Beats whose co-occurrences are computed and written together, the pairs
+# expanded to count them bound the memory of counting (~40 bytes per pair),
+# on top of the likes the job keeps in memory
+NEIGHBOURS_BLOCK_BEATS = int(os.getenv("NEIGHBOURS_BLOCK_BEATS", 1000))
+NEIGHBOURS_BLOCK_PAIRS = int(os.getenv("NEIGHBOURS_BLOCK_PAIRS", 2_000_000))
+NEIGHBOURS_FETCH_ROWS = int(os.getenv("NEIGHBOURS_FETCH_ROWS", 50000))
+# Likes committed late with an older added_at are still picked up
+NEIGHBOURS_WATERMARK_OVERLAP_SECONDS = int(
+    os.getenv("NEIGHBOURS_WATERMARK_OVERLAP_SECONDS", 300)
+)
+
+# Listings skip per-row model validation and use the fastest JSON encoder
+FAST_JSON_RESPONSES = os.getenv("FAST_JSON_RESPONSES", "true").lower() == "true"
+
+MEMBERSHIP_CACHE_TTL_SECONDS = float(os.getenv("MEMBERSHIP_CACHE_TTL_SECONDS", 300))
+MEMBERSHIP_CACHE_MAX_USERS = int(os.getenv("MEMBERSHIP_CACHE_MAX_USERS", 10000))
+
+# Purchase options of a beat as multipliers of its price, "tier:multiplier"
+LICENSE_TIERS = {
+    tier: multiplier
+    for tier, _, multiplier in (
+        option.partition(":")
+        for option in os.getenv("LICENSE_TIERS", "mp3:1,wav:2,stems:5").split(",")
+    )
+}
+DEFAULT_LICENSE = os.getenv("DEFAULT_LICENSE", "mp3")
+# Latency of the local payment provider standing in for the real one
+PAYMENT_FAKE_LATENCY_SECONDS = float(os.getenv("PAYMENT_FAKE_LATENCY_SECONDS", 0))
+
+# Live like/play counters pushed to clients, coalesced per tick
+LIVE_TICK_SECONDS = float(os.getenv("LIVE_TICK_SECONDS", 1))
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", 8))
+LIVE_MAX_CONNECTIONS = int(os.getenv("LIVE_MAX_CONNECTIONS", 1000))
+# Comment lines keep idle streams open through proxies
+LIVE_KEEPALIVE_SECONDS = float(os.getenv("LIVE_KEEPALIVE_SECONDS", 15))
@@ -1,19 +1,99 @@
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator, Dict
 
-from sqlalchemy import MetaData
+from fastapi import Depends, Request
+from sqlalchemy import MetaData, event
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
-from src.config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER
+from src.cache import bypass_cache_reads
+from src.config import (
+    DB_HOST,
+    DB_MAX_OVERFLOW,
+    DB_NAME,
+    DB_PASS,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_PORT,
+    DB_REPLICA_HOST,
+    DB_REPLICA_PORT,
+    DB_STATEMENT_CACHE_SIZE,
+    DB_STATEMENT_TIMEOUT_MS,
+    DB_USER,
+)
+from src.database.pool import InstrumentedAsyncPool
+from src.database.replica import ReplicaMonitor, wrote_recently
 
 DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+DATABASE_REPLICA_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_REPLICA_HOST}:{DB_REPLICA_PORT}/{DB_NAME}"
 Base = declarative_base()
 metadata = MetaData()
 
-engine = create_async_engine(DATABASE_URL)
+
+def engine_connect_args() -> Dict[str, Any]:
+    """asyncpg connection arguments, a statement cache size of 0 suits pgbouncer"""
+    server_settings = {}
+    if DB_STATEMENT_TIMEOUT_MS:
+        server_settings["statement_timeout"] = str(DB_STATEMENT_TIMEOUT_MS)
+    return {
+        # Cache of SQLAlchemy's asyncpg adapter, and asyncpg's own one
+        "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        "server_settings": server_settings,
+    }
+
+
+def create_engine(url: str):
+    return create_async_engine(
+        url,
+        poolclass=InstrumentedAsyncPool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args=engine_connect_args(),
+    )
+
+
+engine = create_engine(DATABASE_URL)
 async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+replica_engine = create_engine(DATABASE_REPLICA_URL) if DB_REPLICA_HOST else None
+replica_session_maker = None
+replica_monitor = None
+if replica_engine is not None:
+    replica_session_maker = sessionmaker(
+        replica_engine, class_=AsyncSession, expire_on_commit=False
+    )
+    replica_monitor = ReplicaMonitor(replica_engine)
+
+    @event.listens_for(replica_engine.sync_engine, "handle_error")
+    def _on_replica_error(context):
+        if context.is_disconnect:
+            replica_monitor.mark_unhealthy()
+
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
         yield session
+
+
+async def get_read_session(
+    request: Request, session: AsyncSession = Depends(get_async_session)
+) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Session for read-only endpoints: a replica while it is reachable and
+    caught up, otherwise the primary. Clients that wrote in the last
+    READ_YOUR_WRITES_SECONDS read from the primary and skip cached responses,
+    so they always see their own writes.
+    """
+    if wrote_recently(request):
+        bypass_cache_reads.set(True)
+        yield session
+    elif replica_monitor is not None and replica_monitor.usable():
+        async with replica_session_maker() as replica_session:
+            yield replica_session
+    else:
+        yield session
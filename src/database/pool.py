@@ -0,0 +1,66 @@
+import time
+from typing import Any, Dict
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+class PoolStats:
+    def __init__(self):
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.checkout_seconds_total = 0.0
+        self.checkout_seconds_max = 0.0
+        self.connections_created = 0
+        self.overflow_events = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that records how long a checkout takes and how often the pool
+    has to go over ``pool_size``. A growing checkout time together with
+    timeouts means the pool is starved for the current worker count.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.stats.checkout_timeouts += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stats.checkouts += 1
+            self.stats.checkout_seconds_total += elapsed
+            self.stats.checkout_seconds_max = max(
+                self.stats.checkout_seconds_max, elapsed
+            )
+
+    def _create_connection(self):
+        self.stats.connections_created += 1
+        # The overflow counter is already incremented for this connection
+        if self._overflow > 0:
+            self.stats.overflow_events += 1
+        return super()._create_connection()
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "size": self.size(),
+            "checked_in": self.checkedin(),
+            "checked_out": self.checkedout(),
+            "overflow": max(self.overflow(), 0),
+            **self.stats.as_dict(),
+        }
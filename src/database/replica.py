@@ -0,0 +1,131 @@
+import asyncio
+import hashlib
+import hmac
+import time
+from typing import Any, Dict, Optional
+
+from fastapi import Request, Response
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.config import (
+    DB_REPLICA_CHECK_SECONDS,
+    DB_REPLICA_MAX_LAG_SECONDS,
+    READ_YOUR_WRITES_SECONDS,
+    SECRET_KEY,
+)
+
+PRIMARY_COOKIE = "beats_primary"
+
+# Zero when everything received is replayed, an idle primary is not lag
+REPLICA_LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+    """
+)
+
+
+class ReplicaMonitor:
+    """
+    Periodically measures the replication lag of a read replica.
+
+    The replica is only used while the last check succeeded and the lag is
+    below ``max_lag``. A dropped connection marks it unusable right away.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        max_lag: float = DB_REPLICA_MAX_LAG_SECONDS,
+        interval: float = DB_REPLICA_CHECK_SECONDS,
+    ):
+        self.engine = engine
+        self.max_lag = max_lag
+        self.interval = interval
+        self.healthy = False
+        self.lag: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def usable(self) -> bool:
+        return self.healthy and self.lag is not None and self.lag <= self.max_lag
+
+    def mark_unhealthy(self):
+        self.healthy = False
+
+    async def check(self):
+        try:
+            async with self.engine.connect() as connection:
+                result = await connection.execute(REPLICA_LAG_QUERY)
+                self.lag = float(result.scalar())
+            self.healthy = True
+        except Exception:
+            if self.healthy:
+                logger.exception("Read replica is unavailable, reading from primary")
+            self.healthy = False
+        self.checked_at = time.time()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "usable": self.usable(),
+            "healthy": self.healthy,
+            "lag_seconds": self.lag,
+            "checked_at": self.checked_at,
+        }
+
+    async def _run(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(self.interval)
+
+
+def _sign(expires: str) -> str:
+    key = f"{PRIMARY_COOKIE}:{SECRET_KEY or ''}".encode()
+    return hmac.new(key, expires.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def stick_to_primary(response: Response):
+    """Send the client's reads to the primary until its write has replicated"""
+    expires = str(int(time.time()) + READ_YOUR_WRITES_SECONDS)
+    response.set_cookie(
+        PRIMARY_COOKIE,
+        f"{expires}.{_sign(expires)}",
+        max_age=READ_YOUR_WRITES_SECONDS,
+        httponly=True,
+    )
+
+
+def wrote_recently(request: Request) -> bool:
+    """
+    Whether the client holds a cookie set by ``stick_to_primary`` that has
+    not expired. Cookies are signed, and an expiry further away than a
+    cookie issued now is ignored, so clients cannot skip the replica and
+    the response cache for longer than their own writes do.
+    """
+    expires, _, signature = request.cookies.get(PRIMARY_COOKIE, "").partition(".")
+    if not hmac.compare_digest(signature, _sign(expires)):
+        return False
+    try:
+        remaining = int(expires) - time.time()
+    except ValueError:
+        return False
+    return 0 < remaining <= READ_YOUR_WRITES_SECONDS
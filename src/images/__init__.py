@@ -0,0 +1 @@
+from .images import *
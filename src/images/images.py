@@ -0,0 +1,138 @@
+import asyncio
+import io
+from pathlib import PurePosixPath
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import quote
+
+from starlette.concurrency import run_in_threadpool
+
+from src.config import (
+    IMAGE_SIZES,
+    IMAGE_SOURCE_PREFIXES,
+    IMAGE_VARIANT_PREFIX,
+    IMAGE_VARIANT_QUALITY,
+)
+from src.storage import Storage, StoredFileNotFound
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Variants are unavailable without it
+    Image = None
+
+IMAGE_URL_PREFIX = "/image"
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif")
+
+
+class ImageVariantsUnavailable(Exception):
+    pass
+
+
+def is_image_key(key: str, prefixes: Iterable[str] = IMAGE_SOURCE_PREFIXES) -> bool:
+    """Whether ``key`` names a cover or profile picture, nothing else is served"""
+    path = PurePosixPath(key)
+    if path.is_absolute() or ".." in path.parts:
+        return False
+    if path.suffix.lower() not in IMAGE_EXTENSIONS:
+        return False
+    for prefix in prefixes:
+        parts = PurePosixPath(prefix).parts
+        if len(path.parts) > len(parts) and path.parts[: len(parts)] == parts:
+            return True
+    return False
+
+
+def variant_key(key: str, size: int) -> str:
+    # The source suffix stays, "cover.png" and "cover.jpg" are two images
+    return f"{IMAGE_VARIANT_PREFIX}/{size}/{key}.webp"
+
+
+def variant_urls(key: Optional[str]) -> Dict[int, str]:
+    """URLs of the resized copies of a stored image, by their bounding size"""
+    if not key:
+        return {}
+    path = quote(key.lstrip("/"))
+    return {size: f"{IMAGE_URL_PREFIX}/{size}/{path}" for size in IMAGE_SIZES}
+
+
+def resize_image(data: bytes, size: int, quality: int = IMAGE_VARIANT_QUALITY) -> bytes:
+    """WebP copy of an image fitting in a ``size`` square, never upscaled"""
+    if Image is None:
+        raise ImageVariantsUnavailable("Resizing images requires Pillow")
+
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size), Image.LANCZOS)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        output = io.BytesIO()
+        image.save(output, format="WEBP", quality=quality, method=4)
+    return output.getvalue()
+
+
+def ensure_variant(storage: Storage, key: str, size: int) -> str:
+    """
+    Key of a resized copy of an image, made first when it is missing or
+    older than the image. Blocking, run it in a thread.
+    """
+    target = variant_key(key, size)
+    source = storage.stat(key)
+    try:
+        if storage.stat(target).mtime >= source.mtime:
+            return target
+    except StoredFileNotFound:
+        pass
+
+    with storage.open(key) as file:
+        data = file.read()
+    storage.save(target, resize_image(data, size))
+    return target
+
+
+def generate_variants(storage: Storage, key: str) -> List[str]:
+    """Every variant of a freshly uploaded image, decoding it only once"""
+    if Image is None:
+        raise ImageVariantsUnavailable("Resizing images requires Pillow")
+
+    with storage.open(key) as file:
+        data = file.read()
+    targets = []
+    for size in IMAGE_SIZES:
+        target = variant_key(key, size)
+        storage.save(target, resize_image(data, size))
+        targets.append(target)
+    return targets
+
+
+class VariantGenerator:
+    """
+    Makes variants in the thread pool. Requests arriving for a variant that
+    is already being made wait for it instead of resizing the image again.
+    """
+
+    def __init__(self, storage: Storage):
+        self.storage = storage
+        self._pending: Dict[str, "asyncio.Future[str]"] = {}
+
+    async def get(self, key: str, size: int) -> str:
+        target = variant_key(key, size)
+        pending = self._pending.get(target)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[target] = future
+        try:
+            result = await run_in_threadpool(ensure_variant, self.storage, key, size)
+        except Exception as error:
+            future.set_exception(error)
+            # Marks it retrieved, asyncio would log it when nobody else waited
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._pending[target]
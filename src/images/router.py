@@ -0,0 +1,48 @@
+from fastapi import APIRouter, HTTPException, Request, status
+from loguru import logger
+from starlette.concurrency import run_in_threadpool
+
+from src.config import IMAGE_SIZES
+from src.images.images import (
+    IMAGE_URL_PREFIX,
+    ImageVariantsUnavailable,
+    VariantGenerator,
+    is_image_key,
+)
+from src.storage import StoredFileNotFound, StoredFileResponse, storage
+
+router = APIRouter(prefix=IMAGE_URL_PREFIX, tags=["Image"])
+
+variant_generator = VariantGenerator(storage)
+
+# Image keys are never overwritten, a new upload gets a new key
+IMMUTABLE = {"cache-control": "public, max-age=31536000, immutable"}
+
+
+@router.get("/{size}/{key:path}")
+@router.head("/{size}/{key:path}")
+async def get_image_variant(size: int, key: str, request: Request):
+    if size not in IMAGE_SIZES:
+        raise HTTPException(status_code=404, detail="Unknown image size")
+    if not is_image_key(key):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    try:
+        variant = await variant_generator.get(key, size)
+    except StoredFileNotFound:
+        raise HTTPException(status_code=404, detail="Image not found")
+    except ImageVariantsUnavailable:
+        logger.warning("Image variants are unavailable, install Pillow")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Image variants are unavailable.",
+        )
+    except Exception:
+        logger.exception("Error while resizing image {}", key)
+        raise HTTPException(status_code=422, detail="Image could not be resized")
+
+    try:
+        stat = await run_in_threadpool(storage.stat, variant)
+    except StoredFileNotFound:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return StoredFileResponse(storage, variant, request, stat, headers=IMMUTABLE)
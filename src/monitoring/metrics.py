@@ -0,0 +1,213 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.config import SLOW_QUERY_MS
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Prometheus style cumulative histogram, one series per label set"""
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._series: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(sorted(labels.items()))
+        series = self._series.get(key)
+        if series is None:
+            # One slot per bucket, then +Inf, sum and count
+            series = self._series[key] = [0.0] * (len(self.buckets) + 3)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def expose(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0.0
+            for bound, count in zip([*self.buckets, "+Inf"], series):
+                cumulative += count
+                bucket_labels = _format_labels((*labels, ("le", str(bound))))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative:g}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {series[-2]:g}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {series[-1]:g}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(sorted(labels.items()))
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def expose(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(labels)} {value:g}")
+        return lines
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    labels = list(labels)
+    if not labels:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def gauges(prefix: str, values: Dict[str, Any], documentation: str) -> List[str]:
+    """Expose the numeric values of a stats dict as gauges named ``prefix_key``"""
+    lines = []
+    for key, value in values.items():
+        if not isinstance(value, (int, float)):
+            continue
+        lines.append(f"# HELP {prefix}_{key} {documentation}")
+        lines.append(f"# TYPE {prefix}_{key} gauge")
+        lines.append(f"{prefix}_{key} {float(value):g}")
+    return lines
+
+
+request_latency = Histogram(
+    "http_request_duration_seconds", "Request latency by route", LATENCY_BUCKETS
+)
+request_db_time = Histogram(
+    "http_request_db_seconds", "Time spent in SQL per request", LATENCY_BUCKETS
+)
+request_statements = Histogram(
+    "http_request_sql_statements", "SQL statements per request", STATEMENT_BUCKETS
+)
+slow_queries = Counter("sql_slow_queries_total", "Statements slower than SLOW_QUERY_MS")
+
+
+class RequestStats:
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar(
+    "request_stats", default=None
+)
+
+
+def parameters_shape(parameters: Any) -> Any:
+    """Types of the bound parameters, their values never reach the logs"""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return f"{len(parameters)} x {parameters_shape(parameters[0])}"
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_seconds += elapsed
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        slow_queries.inc()
+        logger.warning(
+            "Slow query took {:.1f} ms: {} parameters={}",
+            elapsed * 1000,
+            " ".join(statement.split()),
+            parameters_shape(parameters),
+        )
+
+
+class MetricsMiddleware:
+    """
+    Records latency, statement count and SQL time of every HTTP request,
+    labelled by the route template so that ids do not create new series.
+    """
+
+    def __init__(self, app: ASGIApp, routes: Callable[[], Iterable[Any]]):
+        self.app = app
+        self.routes = routes
+        self._paths: Optional[Dict[Any, str]] = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            labels = {
+                "method": scope["method"],
+                "route": self._route_path(scope),
+                "status": str(status_code),
+            }
+            request_latency.observe(time.perf_counter() - started, **labels)
+            request_db_time.observe(stats.db_seconds, route=labels["route"])
+            request_statements.observe(stats.statements, route=labels["route"])
+
+    def _route_path(self, scope: Scope) -> str:
+        if self._paths is None:
+            self._paths = {
+                route.endpoint: route.path
+                for route in self.routes()
+                if hasattr(route, "endpoint")
+            }
+        return self._paths.get(scope.get("endpoint"), "<unmatched>")
+
+
+def expose_metrics(extra: Iterable[str] = ()) -> str:
+    lines = [
+        *request_latency.expose(),
+        *request_db_time.expose(),
+        *request_statements.expose(),
+        *slow_queries.expose(),
+        *extra,
+    ]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,123 @@
+from typing import Any, Dict
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from src.auth.passwords import password_helper
+from src.auth.principal import principal_cache
+from src.beats.live import live_counters
+from src.beats.plays import play_buffer
+from src.cache import response_cache
+from src.database import engine, replica_engine, replica_monitor
+from src.monitoring.metrics import expose_metrics, gauges
+from src.orders.payments import payment_provider
+from src.recommendations import recommendation_index
+from src.uploads.worker import upload_worker
+from src.users.authors import author_summaries
+from src.users.membership import membership_index
+from src.users.reconcile import counter_reconciler
+
+router = APIRouter(prefix="/monitoring", tags=["Monitoring"])
+# Scrapers expect the exposition at the root
+metrics_router = APIRouter(tags=["Monitoring"])
+
+
+@router.get("/cache")
+async def get_cache_stats() -> Dict[str, Any]:
+    return response_cache.stats()
+
+
+@router.get("/auth")
+async def get_principal_cache_stats() -> Dict[str, Any]:
+    return {"entries": principal_cache.size(), **principal_cache.stats.as_dict()}
+
+
+@router.get("/passwords")
+async def get_password_hash_stats() -> Dict[str, Any]:
+    return password_helper.describe()
+
+
+@router.get("/authors")
+async def get_author_cache_stats() -> Dict[str, Any]:
+    return {
+        **author_summaries.stats(),
+        "reconciler": counter_reconciler.describe(),
+    }
+
+
+@router.get("/membership")
+async def get_membership_index_stats() -> Dict[str, Any]:
+    return membership_index.stats()
+
+
+@router.get("/recommendations")
+async def get_recommendation_index_stats() -> Dict[str, Any]:
+    return recommendation_index.stats()
+
+
+@router.get("/payments")
+async def get_payment_stats() -> Dict[str, Any]:
+    return payment_provider.stats()
+
+
+@router.get("/plays")
+async def get_play_buffer_stats() -> Dict[str, Any]:
+    return play_buffer.stats()
+
+
+@router.get("/live")
+async def get_live_counter_stats() -> Dict[str, Any]:
+    return live_counters.stats()
+
+
+@router.get("/uploads")
+async def get_upload_worker_stats() -> Dict[str, Any]:
+    return upload_worker.stats()
+
+
+@router.get("/pool")
+async def get_pool_stats() -> Dict[str, Any]:
+    return engine.pool.describe()
+
+
+@router.get("/replica")
+async def get_replica_stats() -> Dict[str, Any]:
+    if replica_monitor is None:
+        return {"configured": False}
+    return {
+        "configured": True,
+        **replica_monitor.describe(),
+        "pool": replica_engine.pool.describe(),
+    }
+
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics() -> str:
+    extra = [
+        *gauges("cache", response_cache.stats(), "Response cache statistics"),
+        *gauges(
+            "auth_principal_cache",
+            {"entries": principal_cache.size(), **principal_cache.stats.as_dict()},
+            "Cached logins statistics",
+        ),
+        *gauges(
+            "password_hash",
+            password_helper.describe(),
+            "Password hashing pool statistics",
+        ),
+        *gauges("author_cache", author_summaries.stats(), "Author summary cache"),
+        *gauges("counter_reconciler", counter_reconciler.describe(), "Counter repairs"),
+        *gauges("membership_index", membership_index.stats(), "Liked and cart sets"),
+        *gauges("recommendations", recommendation_index.stats(), "Similar beats index"),
+        *gauges("payments", payment_provider.stats(), "Checkout payments"),
+        *gauges("play_buffer", play_buffer.stats(), "Play buffer statistics"),
+        *gauges("live_counters", live_counters.stats(), "Live counter streams"),
+        *gauges("upload_worker", upload_worker.stats(), "Upload processing statistics"),
+        *gauges("db_pool", engine.pool.describe(), "Primary pool statistics"),
+    ]
+    if replica_monitor is not None:
+        extra += gauges("replica", replica_monitor.describe(), "Replica statistics")
+        extra += gauges(
+            "replica_pool", replica_engine.pool.describe(), "Replica pool statistics"
+        )
+    return expose_metrics(extra)
@@ -0,0 +1,144 @@
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.orders.models import PAID, PENDING, orders
+from src.orders.payments import (
+    FakePaymentProvider,
+    PaymentConflict,
+    PaymentDeclined,
+    payment_provider,
+)
+from src.orders.pricing import price_lines
+from src.orders.queries import (
+    cart_items_query,
+    create_order_statement,
+    discard_order_statement,
+    order_lines_query,
+    order_query,
+    pay_order_statement,
+)
+
+
+class EmptyCart(Exception):
+    pass
+
+
+class CartChanged(Exception):
+    """The idempotency key was already used for a different cart"""
+
+
+async def find_order(
+    session: AsyncSession,
+    user_id: int,
+    order_id: Optional[int] = None,
+    idempotency_key: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    query = order_query(user_id)
+    if order_id is not None:
+        query = query.where(orders.c.order_id == order_id)
+    if idempotency_key is not None:
+        query = query.where(orders.c.idempotency_key == idempotency_key)
+    order = (await session.execute(query)).mappings().first()
+    if order is None:
+        return None
+    lines = await session.execute(order_lines_query(order["order_id"]))
+    return {**order, "lines": [dict(line) for line in lines.mappings()]}
+
+
+async def checkout(
+    session: AsyncSession,
+    user_id: int,
+    idempotency_key: str,
+    licenses: Mapping[int, str],
+    beat_ids: Optional[List[int]] = None,
+    provider: FakePaymentProvider = payment_provider,
+) -> Tuple[Dict[str, Any], bool]:
+    """
+    Buy the cart, or the ``beat_ids`` of it, returns the order and whether
+    this call paid it.
+
+    The cart is loaded and priced with one query and written as a pending
+    order with its lines before anything is charged, so every charge has its
+    order. The provider is given a key derived from the idempotency key: a
+    retry after a failure pays the pending order of the first attempt, with
+    the same lines and amount even if the cart changed since, and gets the
+    first payment back instead of a second charge. Paying the order and the
+    cleanup of the cart are then written by one statement, and a declined
+    payment discards the pending order.
+    """
+    order = await find_order(session, user_id, idempotency_key=idempotency_key)
+    if order is not None and order["status"] == PAID:
+        return order, False
+
+    if order is None:
+        order = await _create_order(
+            session, user_id, idempotency_key, licenses, beat_ids
+        )
+        if order["status"] == PAID:
+            return order, False
+    # Give the connection back to the pool while the payment is processed
+    await session.commit()
+
+    try:
+        payment = await provider.charge(
+            f"checkout:{user_id}:{idempotency_key}", order["total_amount"]
+        )
+    except PaymentConflict:
+        # The key was charged for another amount by a checkout that wrote no
+        # pending order, nothing was charged for this one
+        await _discard_order(session, order["order_id"])
+        raise CartChanged()
+    except PaymentDeclined:
+        await _discard_order(session, order["order_id"])
+        raise
+
+    result = await session.execute(
+        pay_order_statement(user_id, order["order_id"], payment.payment_id)
+    )
+    paid = result.first()
+    await session.commit()
+    if paid is None:
+        # A concurrent retry with the same key paid it first
+        return (
+            await find_order(session, user_id, order_id=order["order_id"]),
+            False,
+        )
+    return {**order, "status": PAID, "payment_id": payment.payment_id}, True
+
+
+async def _create_order(
+    session: AsyncSession,
+    user_id: int,
+    idempotency_key: str,
+    licenses: Mapping[int, str],
+    beat_ids: Optional[List[int]],
+) -> Dict[str, Any]:
+    items = (await session.execute(cart_items_query(user_id, beat_ids))).mappings()
+    lines, total = price_lines(items.all(), licenses)
+    if not lines:
+        raise EmptyCart()
+
+    result = await session.execute(
+        create_order_statement(user_id, idempotency_key, total, lines)
+    )
+    created = result.mappings().first()
+    await session.commit()
+    if created is None:
+        # A concurrent request with the same key wrote its order first
+        return await find_order(session, user_id, idempotency_key=idempotency_key)
+    return {
+        "order_id": created["order_id"],
+        "user_id": user_id,
+        "idempotency_key": idempotency_key,
+        "status": PENDING,
+        "payment_id": None,
+        "total_amount": total,
+        "created_at": created["created_at"],
+        "lines": lines,
+    }
+
+
+async def _discard_order(session: AsyncSession, order_id: int):
+    await session.execute(discard_order_statement(order_id))
+    await session.commit()
@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from sqlalchemy import (
+    TIMESTAMP,
+    Column,
+    ForeignKey,
+    Index,
+    Integer,
+    Numeric,
+    String,
+    Table,
+    UniqueConstraint,
+)
+
+from src.auth.models import users
+from src.beats.models import beats
+from src.database import metadata
+
+# Order statuses, an order is written pending before its payment is made
+PENDING = "pending"
+PAID = "paid"
+
+orders = Table(
+    "orders",
+    metadata,
+    Column("order_id", Integer, primary_key=True),
+    Column("user_id", Integer, ForeignKey(users.c.user_id), nullable=False),
+    # Chosen by the client, a retried checkout finds its order instead of
+    # paying again
+    Column("idempotency_key", String(64), nullable=False),
+    Column("status", String, nullable=False, default=PENDING),
+    # Set once the payment went through
+    Column("payment_id", String),
+    Column("total_amount", Numeric(10, 2), nullable=False),
+    Column("created_at", TIMESTAMP, nullable=False, default=datetime.utcnow),
+    UniqueConstraint(
+        "user_id", "idempotency_key", name="uq_orders_user_id_idempotency_key"
+    ),
+    Index("ix_orders_user_id_created_at", "user_id", "created_at"),
+)
+
+order_lines = Table(
+    "order_lines",
+    metadata,
+    Column("order_id", Integer, ForeignKey(orders.c.order_id), primary_key=True),
+    Column("beat_id", Integer, ForeignKey(beats.c.beat_id), primary_key=True),
+    # The author of the beat when it was bought
+    Column("seller_id", Integer, ForeignKey(users.c.user_id), nullable=False),
+    Column("license", String, nullable=False),
+    Column("price_amount", Numeric(10, 2), nullable=False),
+)
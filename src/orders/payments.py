@@ -0,0 +1,80 @@
+import asyncio
+import uuid
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, Dict, Optional
+
+from src.config import PAYMENT_FAKE_LATENCY_SECONDS
+
+# Payments remembered for idempotent retries by the fake provider
+FAKE_MAX_PAYMENTS = 100_000
+
+
+class PaymentDeclined(Exception):
+    pass
+
+
+class PaymentConflict(Exception):
+    """The idempotency key was already used to charge another amount"""
+
+
+class Payment:
+    __slots__ = ("payment_id", "amount")
+
+    def __init__(self, payment_id: str, amount: Decimal):
+        self.payment_id = payment_id
+        self.amount = amount
+
+
+class FakePaymentProvider:
+    """
+    Local stand-in for the card processor, so checkout runs offline.
+
+    Like real providers, a charge retried with the same idempotency key
+    returns the first payment instead of charging again, and fails when the
+    amount differs. Amounts above ``decline_above`` are declined.
+    """
+
+    def __init__(
+        self,
+        latency: float = PAYMENT_FAKE_LATENCY_SECONDS,
+        decline_above: Optional[Decimal] = None,
+    ):
+        self.latency = latency
+        self.decline_above = decline_above
+        self._payments: "OrderedDict[str, Payment]" = OrderedDict()
+        self.charged = 0
+        self.replayed = 0
+        self.declined = 0
+
+    async def charge(self, idempotency_key: str, amount: Decimal) -> Payment:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        payment = self._payments.get(idempotency_key)
+        if payment is not None:
+            if payment.amount != amount:
+                raise PaymentConflict()
+            self.replayed += 1
+            return payment
+
+        if self.decline_above is not None and amount > self.decline_above:
+            self.declined += 1
+            raise PaymentDeclined("The payment was declined")
+
+        payment = Payment(f"fake_{uuid.uuid4().hex}", amount)
+        self._payments[idempotency_key] = payment
+        if len(self._payments) > FAKE_MAX_PAYMENTS:
+            self._payments.popitem(last=False)
+        self.charged += 1
+        return payment
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "charged": self.charged,
+            "replayed": self.replayed,
+            "declined": self.declined,
+        }
+
+
+payment_provider = FakePaymentProvider()
@@ -0,0 +1,55 @@
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, Dict, Iterable, List, Mapping, Tuple
+
+from src.beats.prices import parse_price
+from src.config import DEFAULT_LICENSE, LICENSE_TIERS
+
+CENT = Decimal("0.01")
+MULTIPLIERS = {tier: Decimal(multiplier) for tier, multiplier in LICENSE_TIERS.items()}
+
+
+class UnpricedBeat(Exception):
+    """The price of a beat in the cart cannot be read as an amount"""
+
+    def __init__(self, beat_id: int):
+        super().__init__(f"Beat {beat_id} has no valid price")
+        self.beat_id = beat_id
+
+
+class UnsellableBeat(Exception):
+    """A beat in the cart has no author left to be paid for it"""
+
+    def __init__(self, beat_id: int):
+        super().__init__(f"Beat {beat_id} has no seller and cannot be bought")
+        self.beat_id = beat_id
+
+
+def base_price(item: Mapping[str, Any]) -> Decimal:
+    """The numeric price of a beat, parsed from the text one on older rows"""
+    if item["price_amount"] is not None:
+        return Decimal(item["price_amount"])
+    amount = parse_price(item["price"])
+    if amount is None:
+        raise UnpricedBeat(item["beat_id"])
+    return amount
+
+
+def price_lines(
+    items: Iterable[Mapping[str, Any]], licenses: Mapping[int, str]
+) -> Tuple[List[Dict[str, Any]], Decimal]:
+    """Order lines of cart items with the chosen license tiers, and their total"""
+    lines = []
+    for item in items:
+        if item["user_id"] is None:
+            raise UnsellableBeat(item["beat_id"])
+        license = licenses.get(item["beat_id"], DEFAULT_LICENSE)
+        amount = base_price(item) * MULTIPLIERS[license]
+        lines.append(
+            {
+                "beat_id": item["beat_id"],
+                "seller_id": item["user_id"],
+                "license": license,
+                "price_amount": amount.quantize(CENT, rounding=ROUND_HALF_UP),
+            }
+        )
+    return lines, sum((line["price_amount"] for line in lines), Decimal("0.00"))
@@ -0,0 +1,165 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import (
+    Integer,
+    Numeric,
+    String,
+    column,
+    delete,
+    func,
+    select,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert
+
+from src.beats.models import beats
+from src.orders.models import PAID, PENDING, order_lines, orders
+from src.users.models import carts
+
+
+def cart_items_query(user_id: int, beat_ids: Optional[List[int]] = None):
+    """The priced beats of a cart, all of them or only ``beat_ids``"""
+    query = (
+        select(carts.c.beat_id, beats.c.user_id, beats.c.price, beats.c.price_amount)
+        .join(beats, beats.c.beat_id == carts.c.beat_id)
+        .where(carts.c.user_id == user_id)
+        .order_by(carts.c.added_at, carts.c.beat_id)
+    )
+    if beat_ids is not None:
+        query = query.where(carts.c.beat_id.in_(beat_ids))
+    return query
+
+
+def create_order_statement(
+    user_id: int,
+    idempotency_key: str,
+    total_amount: Decimal,
+    lines: List[Dict[str, Any]],
+):
+    """
+    Insert a pending order and its lines, in one statement.
+
+    Returns the new order id and creation time, or no row when an order with
+    this idempotency key already exists; nothing is written then.
+    """
+    new_order = (
+        insert(orders)
+        .values(
+            user_id=user_id,
+            idempotency_key=idempotency_key,
+            status=PENDING,
+            total_amount=total_amount,
+            created_at=datetime.utcnow(),
+        )
+        .on_conflict_do_nothing(
+            index_elements=[orders.c.user_id, orders.c.idempotency_key]
+        )
+        .returning(orders.c.order_id, orders.c.created_at)
+        .cte("new_order")
+    )
+    priced = values(
+        column("beat_id", Integer),
+        column("seller_id", Integer),
+        column("license", String),
+        column("price_amount", Numeric(10, 2)),
+        name="priced",
+    ).data(
+        [
+            (line["beat_id"], line["seller_id"], line["license"], line["price_amount"])
+            for line in lines
+        ]
+    )
+    new_lines = (
+        insert(order_lines)
+        .from_select(
+            ["order_id", "beat_id", "seller_id", "license", "price_amount"],
+            select(
+                new_order.c.order_id,
+                priced.c.beat_id,
+                priced.c.seller_id,
+                priced.c.license,
+                priced.c.price_amount,
+            ),
+        )
+        .returning(order_lines.c.beat_id)
+        .cte("new_lines")
+    )
+    return select(
+        new_order.c.order_id,
+        new_order.c.created_at,
+        select(func.count()).select_from(new_lines).scalar_subquery().label("lines"),
+    )
+
+
+def pay_order_statement(user_id: int, order_id: int, payment_id: str):
+    """
+    Mark a pending order paid and take its beats out of the cart, in one
+    statement. Returns no row when the order was not pending anymore.
+    """
+    paid = (
+        update(orders)
+        .where(orders.c.order_id == order_id, orders.c.status == PENDING)
+        .values(status=PAID, payment_id=payment_id)
+        .returning(orders.c.order_id)
+        .cte("paid")
+    )
+    cleared = (
+        delete(carts)
+        .where(
+            carts.c.user_id == user_id,
+            carts.c.beat_id.in_(
+                select(order_lines.c.beat_id).where(
+                    order_lines.c.order_id.in_(select(paid.c.order_id))
+                )
+            ),
+        )
+        .returning(carts.c.beat_id)
+        .cte("cleared")
+    )
+    return select(
+        paid.c.order_id,
+        select(func.count()).select_from(cleared).scalar_subquery().label("cleared"),
+    )
+
+
+def discard_order_statement(order_id: int):
+    """Delete a pending order and its lines, its payment did not go through"""
+    discarded = (
+        delete(orders)
+        .where(orders.c.order_id == order_id, orders.c.status == PENDING)
+        .returning(orders.c.order_id)
+        .cte("discarded")
+    )
+    discarded_lines = (
+        delete(order_lines)
+        .where(order_lines.c.order_id.in_(select(discarded.c.order_id)))
+        .returning(order_lines.c.beat_id)
+        .cte("discarded_lines")
+    )
+    return select(
+        discarded.c.order_id,
+        select(func.count())
+        .select_from(discarded_lines)
+        .scalar_subquery()
+        .label("lines"),
+    )
+
+
+def order_query(user_id: int):
+    return select(orders).where(orders.c.user_id == user_id)
+
+
+def order_lines_query(order_id: int):
+    return (
+        select(
+            order_lines.c.beat_id,
+            order_lines.c.seller_id,
+            order_lines.c.license,
+            order_lines.c.price_amount,
+        )
+        .where(order_lines.c.order_id == order_id)
+        .order_by(order_lines.c.beat_id)
+    )
@@ -0,0 +1,88 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.base_config import get_current_principal
+from src.auth.principal import Principal
+from src.cache import response_cache
+from src.database import get_async_session
+from src.database.replica import stick_to_primary
+from src.orders.checkout import CartChanged, EmptyCart, checkout, find_order
+from src.orders.payments import PaymentDeclined
+from src.orders.pricing import UnpricedBeat, UnsellableBeat
+from src.orders.schemas import CheckoutRequest, OrderRead
+from src.users.membership import membership_index
+
+router = APIRouter(prefix="/order", tags=["Order"])
+
+
+@router.post("/checkout", response_model=OrderRead, status_code=status.HTTP_201_CREATED)
+async def checkout_cart(
+    checkout_request: CheckoutRequest,
+    response: Response,
+    idempotency_key: str = Header(..., min_length=1, max_length=64),
+    current_user: Principal = Depends(get_current_principal),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Buy the beats of the cart. Retrying with the same ``Idempotency-Key``
+    returns the order of the first attempt and never charges twice.
+    """
+    try:
+        order, created = await checkout(
+            session,
+            current_user.id,
+            idempotency_key,
+            checkout_request.licenses,
+            checkout_request.beat_ids,
+        )
+    except EmptyCart:
+        raise HTTPException(status_code=400, detail="Nothing to buy in the cart")
+    except CartChanged:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The cart changed since the first request with this key",
+        )
+    except PaymentDeclined as error:
+        raise HTTPException(
+            status_code=status.HTTP_402_PAYMENT_REQUIRED, detail=str(error)
+        )
+    except (UnpricedBeat, UnsellableBeat) as error:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(error)
+        )
+    except Exception:
+        logger.exception("Error while checking out")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while checking out.",
+        )
+
+    if created:
+        for line in order["lines"]:
+            membership_index.remove_from_cart(current_user.id, line["beat_id"])
+        await response_cache.invalidate(f"cart:{current_user.id}")
+    else:
+        response.status_code = status.HTTP_200_OK
+        response.headers["Idempotent-Replayed"] = "true"
+    stick_to_primary(response)
+    return order
+
+
+@router.get("/{order_id}", response_model=OrderRead)
+async def get_order(
+    order_id: int,
+    current_user: Principal = Depends(get_current_principal),
+    session: AsyncSession = Depends(get_async_session),
+):
+    try:
+        order = await find_order(session, current_user.id, order_id=order_id)
+    except Exception:
+        logger.exception("Error while retrieving the order")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while retrieving the order.",
+        )
+    if order is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return order
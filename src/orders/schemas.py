@@ -0,0 +1,43 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, conlist, validator
+
+from src.config import BATCH_MAX_IDS, LICENSE_TIERS
+
+
+class CheckoutRequest(BaseModel):
+    """Beats of the cart to buy, all of them by default, and their license tiers"""
+
+    beat_ids: Optional[conlist(int, min_items=1, max_items=BATCH_MAX_IDS)] = None
+    licenses: Dict[int, str] = {}
+
+    @validator("licenses")
+    def check_licenses(cls, value):
+        unknown = set(value.values()) - set(LICENSE_TIERS)
+        if unknown:
+            raise ValueError(
+                f"Unknown licenses {sorted(unknown)}, "
+                f"expected one of {sorted(LICENSE_TIERS)}"
+            )
+        return value
+
+
+class OrderLine(BaseModel):
+    beat_id: int
+    seller_id: int
+    license: str
+    price_amount: Decimal
+
+
+class OrderRead(BaseModel):
+    order_id: int
+    user_id: int
+    # Pending until the payment went through, a retry with the same
+    # idempotency key pays it
+    status: str
+    payment_id: Optional[str]
+    total_amount: Decimal
+    created_at: datetime
+    lines: List[OrderLine]
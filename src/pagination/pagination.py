@@ -0,0 +1,85 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+from fastapi import HTTPException, status
+from pydantic.generics import GenericModel
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+ItemT = TypeVar("ItemT")
+
+
+class Page(GenericModel, Generic[ItemT]):
+    """One page of a listing, ``next_cursor`` is None on the last page"""
+
+    items: List[ItemT]
+    next_cursor: Optional[str] = None
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Opaque cursor for the sort key of the last item of a page"""
+    payload = [
+        value.isoformat() if isinstance(value, datetime) else value for value in values
+    ]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(
+    cursor: Optional[str], parsers: Sequence[Callable[[Any], Any]]
+) -> Optional[Tuple[Any, ...]]:
+    """Decode a cursor made by ``encode_cursor``, raise 400 if it is malformed"""
+    if cursor is None:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if len(values) != len(parsers):
+            raise ValueError("Cursor length mismatch")
+        return tuple(parse(value) for parse, value in zip(parsers, values))
+    except (binascii.Error, TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+
+
+async def fetch_page(
+    session: AsyncSession,
+    query,
+    order_by: Sequence[Tuple[Any, str]],
+    limit: int,
+    after: Optional[Tuple[Any, ...]] = None,
+) -> Dict[str, Any]:
+    """
+    Fetch one page of ``query`` in descending keyset order.
+
+    ``order_by`` pairs every sort column with the key it has in the result
+    rows, the last pair has to be unique. One extra row is requested to find
+    out whether there is a next page.
+    """
+    columns = [column for column, _ in order_by]
+    if after is not None:
+        query = query.where(tuple_(*columns) < tuple_(*after))
+    query = query.order_by(*[column.desc() for column in columns]).limit(limit + 1)
+
+    result = await session.execute(query)
+    rows = result.mappings().fetchall()
+
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor([items[-1][key] for _, key in order_by])
+    return {"items": items, "next_cursor": next_cursor}
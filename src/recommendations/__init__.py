@@ -0,0 +1,3 @@
+from .features import *
+from .index import *
+from .models import *
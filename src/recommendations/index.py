@@ -0,0 +1,171 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from src.beats.models import beats
+from src.config import RECOMMENDATIONS_REBUILD_SECONDS
+from src.database import async_session_maker
+from src.recommendations.features import FeatureMatrix, np
+from src.users.models import likes
+
+# Rows fetched at a time while loading, bounds the memory of a rebuild
+LOAD_BATCH_SIZE = 50_000
+
+
+class RecommendationsUnavailable(Exception):
+    pass
+
+
+def _add_rows(add: Callable[..., None], rows: List[Tuple]):
+    add(*zip(*rows))
+
+
+async def load_features(session: AsyncSession, **options) -> FeatureMatrix:
+    """
+    Build the feature matrix of every beat and like, streamed in batches.
+
+    Only the reads run on the event loop, the vectors of every batch are
+    computed in a worker thread so a rebuild does not stall the requests.
+    The matrix is not shared until it is returned, nothing else touches it.
+    """
+    features = await run_in_threadpool(FeatureMatrix, **options)
+    result = await session.stream(
+        select(
+            beats.c.beat_id, beats.c.bpm, beats.c.price_amount, beats.c.duration_seconds
+        ).order_by(beats.c.beat_id)
+    )
+    async for rows in result.partitions(LOAD_BATCH_SIZE):
+        await run_in_threadpool(_add_rows, features.add_beats, rows)
+
+    result = await session.stream(select(likes.c.user_id, likes.c.beat_id))
+    async for rows in result.partitions(LOAD_BATCH_SIZE):
+        await run_in_threadpool(_add_rows, features.add_likes, rows)
+    return features
+
+
+async def load_with_new_session() -> FeatureMatrix:
+    async with async_session_maker() as session:
+        return await load_features(session)
+
+
+class RecommendationIndex:
+    """
+    In-memory index answering similar beats and recommendations.
+
+    It is built from the database at startup and rebuilt periodically, while
+    likes and new beats are applied to it as they happen. A like written
+    during a rebuild may be missing from the new index until the next one.
+    """
+
+    def __init__(
+        self,
+        load: Callable[[], Awaitable[FeatureMatrix]] = load_with_new_session,
+        interval: float = RECOMMENDATIONS_REBUILD_SECONDS,
+    ):
+        self._load = load
+        self.interval = interval
+        self.features: Optional[FeatureMatrix] = None
+        self.builds = 0
+        self.errors = 0
+        self.queries = 0
+        self.likes_applied = 0
+        self.last_build_seconds: Optional[float] = None
+        self.built_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def available(self) -> bool:
+        return np is not None
+
+    async def rebuild(self):
+        started = time.perf_counter()
+        try:
+            features = await self._load()
+        except Exception:
+            self.errors += 1
+            logger.exception("Failed to build the recommendation index")
+            return
+        self.features = features
+        self.builds += 1
+        self.built_at = time.time()
+        self.last_build_seconds = time.perf_counter() - started
+
+    def record_like(self, user_id: int, beat_id: int, delta: int = 1):
+        if self.features is not None:
+            self.features.add_likes([user_id], [beat_id], delta)
+            self.likes_applied += 1
+
+    def add_beat(
+        self,
+        beat_id: int,
+        bpm: Optional[float],
+        price: Optional[float],
+        duration: Optional[float],
+    ):
+        if self.features is not None:
+            self.features.add_beats([beat_id], [bpm], [price], [duration])
+
+    def similar(self, beat_id: int, limit: int) -> Optional[List[Tuple[int, float]]]:
+        """Closest beats with their scores, None for a beat not indexed yet"""
+        features = self._ready()
+        if beat_id not in features:
+            return None
+        return features.similar([beat_id], limit)[0]
+
+    def recommend(
+        self, liked: Iterable[int], limit: int, exclude: Iterable[int] = ()
+    ) -> List[Tuple[int, float]]:
+        """
+        Beats closest to the direction of the ``liked`` ones, empty when
+        none of them is known yet.
+        """
+        features = self._ready()
+        liked = list(liked)
+        profile = features.profile(liked)
+        if profile is None:
+            return []
+        return features.top_k(profile, limit, [set(liked) | set(exclude)])[0]
+
+    def start(self):
+        if self.available and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "beats": self.features.size if self.features is not None else 0,
+            "builds": self.builds,
+            "errors": self.errors,
+            "queries": self.queries,
+            "likes_applied": self.likes_applied,
+            "last_build_seconds": self.last_build_seconds,
+            "built_at": self.built_at,
+        }
+
+    def _ready(self) -> FeatureMatrix:
+        if self.features is None:
+            raise RecommendationsUnavailable()
+        self.queries += 1
+        return self.features
+
+    async def _run(self):
+        while True:
+            await self.rebuild()
+            await asyncio.sleep(self.interval)
+
+
+recommendation_index = RecommendationIndex()
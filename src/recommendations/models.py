@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from sqlalchemy import TIMESTAMP, Column, Float, ForeignKey, Integer, String, Table
+
+from src.beats.models import beats
+from src.database import metadata
+
+# Written by the neighbours job, read by beat id in rank order
+beat_neighbours = Table(
+    "beat_neighbours",
+    metadata,
+    Column("beat_id", Integer, ForeignKey(beats.c.beat_id), primary_key=True),
+    Column("rank", Integer, primary_key=True),
+    Column("neighbour_id", Integer, ForeignKey(beats.c.beat_id), nullable=False),
+    Column("score", Float, nullable=False),
+    # Number of users who liked both beats
+    Column("common_likes", Integer, nullable=False),
+    Column("computed_at", TIMESTAMP, nullable=False, default=datetime.utcnow),
+)
+
+# Where incremental batch jobs resume, by job name
+job_watermarks = Table(
+    "job_watermarks",
+    metadata,
+    Column("name", String, primary_key=True),
+    Column("watermark", TIMESTAMP, nullable=False),
+    Column("updated_at", TIMESTAMP, nullable=False, default=datetime.utcnow),
+)
@@ -0,0 +1,351 @@
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import delete, insert, select
+from sqlalchemy.dialects.postgresql import insert as upsert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import (
+    NEIGHBOURS_BLOCK_BEATS,
+    NEIGHBOURS_BLOCK_PAIRS,
+    NEIGHBOURS_FETCH_ROWS,
+    NEIGHBOURS_TOP_N,
+    NEIGHBOURS_WATERMARK_OVERLAP_SECONDS,
+)
+from src.database import async_session_maker
+from src.recommendations.features import np
+from src.recommendations.models import beat_neighbours, job_watermarks
+from src.users.models import likes
+
+try:
+    from scipy import sparse
+except ImportError:  # Co-occurrences are counted with numpy alone
+    sparse = None
+
+JOB_NAME = "beat_neighbours"
+
+
+def beat_neighbours_query(beat_id: int, limit: int):
+    """Neighbour ids of a beat, best first, read from the primary key"""
+    return (
+        select(beat_neighbours.c.neighbour_id)
+        .where(beat_neighbours.c.beat_id == beat_id)
+        .order_by(beat_neighbours.c.rank)
+        .limit(limit)
+    )
+
+
+def _ranges(starts: "np.ndarray", lengths: "np.ndarray") -> "np.ndarray":
+    """Concatenation of ``arange(start, start + length)`` for every pair"""
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+
+
+def _compress(
+    rows: "np.ndarray", columns: "np.ndarray", count: int
+) -> Tuple["np.ndarray", "np.ndarray"]:
+    order = np.argsort(rows, kind="stable")
+    indptr = np.zeros(count + 1, np.int64)
+    np.cumsum(np.bincount(rows, minlength=count), out=indptr[1:])
+    return indptr, columns[order].astype(np.int32)
+
+
+class LikeMatrix:
+    """
+    Likes as a binary user x beat matrix over dense indices, compressed by
+    rows both ways: the beats of a user and the users of a beat. It takes
+    eight bytes per like once built.
+    """
+
+    def __init__(self, user_ids: "np.ndarray", beat_ids: "np.ndarray"):
+        self.user_ids, users = np.unique(user_ids, return_inverse=True)
+        self.beat_ids, beats = np.unique(beat_ids, return_inverse=True)
+        self.user_indptr, self.user_beats = _compress(users, beats, len(self.user_ids))
+        self.beat_indptr, self.beat_users = _compress(beats, users, len(self.beat_ids))
+        self.beat_likes = np.diff(self.beat_indptr)
+        # Pairs expanded to count the co-occurrences of each beat: the
+        # number of likes of every user who liked it
+        user_likes = np.diff(self.user_indptr)
+        self.beat_pairs = (
+            np.add.reduceat(user_likes[self.beat_users], self.beat_indptr[:-1])
+            if self.likes
+            else np.zeros(0, np.int64)
+        )
+        self._sparse = None
+
+    @property
+    def likes(self) -> int:
+        return len(self.user_beats)
+
+    def beats_liked_by(self, user_ids: "np.ndarray") -> "np.ndarray":
+        """Indices of the beats liked by any of the users"""
+        users = np.flatnonzero(np.isin(self.user_ids, user_ids))
+        starts = self.user_indptr[users]
+        return np.unique(
+            self.user_beats[_ranges(starts, self.user_indptr[users + 1] - starts)]
+        )
+
+    def blocks(
+        self, beats: "np.ndarray", max_pairs: int, max_beats: int
+    ) -> List["np.ndarray"]:
+        """
+        Split beat indices into blocks of at most ``max_beats``, expanding
+        about ``max_pairs`` pairs: a few popular beats cost as much as
+        thousands of rarely liked ones. A beat past the budget on its own
+        makes a block by itself.
+        """
+        if not len(beats):
+            return []
+        cost = np.cumsum(self.beat_pairs[beats]) // max_pairs
+        blocks = []
+        for part in np.split(beats, np.flatnonzero(np.diff(cost)) + 1):
+            blocks.extend(np.split(part, range(max_beats, len(part), max_beats)))
+        return blocks
+
+    def cooccurrences(
+        self, block: "np.ndarray"
+    ) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+        """
+        Number of users in common between the beats of ``block`` and every
+        beat, as (position in block, beat index, count) without zeros,
+        ordered by position and beat.
+        """
+        if sparse is not None:
+            by_beat, by_user = self._sparse_matrices()
+            product = by_beat[block] @ by_user
+            product.sort_indices()
+            product = product.tocoo()
+            return product.row, product.col, product.data
+
+        lengths = self.beat_indptr[block + 1] - self.beat_indptr[block]
+        users = self.beat_users[_ranges(self.beat_indptr[block], lengths)]
+        starts = self.user_indptr[users]
+        user_lengths = self.user_indptr[users + 1] - starts
+        columns = self.user_beats[_ranges(starts, user_lengths)]
+        positions = np.repeat(np.repeat(np.arange(len(block)), lengths), user_lengths)
+        width = len(self.beat_ids)
+        keys, counts = np.unique(positions * width + columns, return_counts=True)
+        return keys // width, keys % width, counts
+
+    def top_neighbours(self, block: "np.ndarray", top_n: int) -> List[Dict[str, Any]]:
+        """Rows of ``beat_neighbours`` for the beats of ``block``"""
+        positions, columns, counts = self.cooccurrences(block)
+        keep = columns != block[positions]
+        positions, columns, counts = positions[keep], columns[keep], counts[keep]
+        scores = counts / np.sqrt(
+            self.beat_likes[block[positions]] * self.beat_likes[columns]
+        )
+
+        # By position then best score, a stable sort keeps ties by beat
+        order = np.argsort(positions * 2.0 + (1.0 - scores), kind="stable")
+        positions, columns = positions[order], columns[order]
+        counts, scores = counts[order], scores[order]
+        ranks = np.arange(len(positions)) - np.searchsorted(positions, positions)
+        keep = ranks < top_n
+
+        return [
+            {
+                "beat_id": int(self.beat_ids[block[position]]),
+                "rank": int(rank),
+                "neighbour_id": int(self.beat_ids[column]),
+                "score": float(score),
+                "common_likes": int(count),
+            }
+            for position, rank, column, score, count in zip(
+                positions[keep], ranks[keep], columns[keep], scores[keep], counts[keep]
+            )
+        ]
+
+    def _sparse_matrices(self):
+        if self._sparse is None:
+            shape = (len(self.user_ids), len(self.beat_ids))
+            ones = np.ones(self.likes, np.int32)
+            self._sparse = (
+                sparse.csr_matrix(
+                    (ones, self.beat_users, self.beat_indptr), shape=shape[::-1]
+                ),
+                sparse.csr_matrix(
+                    (ones, self.user_beats, self.user_indptr), shape=shape
+                ),
+            )
+        return self._sparse
+
+
+async def read_watermark(
+    session: AsyncSession, name: str = JOB_NAME
+) -> Optional[datetime]:
+    result = await session.execute(
+        select(job_watermarks.c.watermark).where(job_watermarks.c.name == name)
+    )
+    return result.scalar()
+
+
+async def save_watermark(
+    session: AsyncSession, watermark: datetime, name: str = JOB_NAME
+):
+    statement = upsert(job_watermarks).values(
+        name=name, watermark=watermark, updated_at=datetime.utcnow()
+    )
+    await session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[job_watermarks.c.name],
+            set_={
+                "watermark": statement.excluded.watermark,
+                "updated_at": statement.excluded.updated_at,
+            },
+        )
+    )
+    await session.commit()
+
+
+async def load_likes(
+    session: AsyncSession, since: Optional[datetime]
+) -> Tuple[LikeMatrix, Optional["np.ndarray"], Optional[datetime]]:
+    """
+    Stream every like into a ``LikeMatrix``. Also returns the users who
+    liked something after ``since`` (None without it), and the latest like.
+
+    The fetched ids are kept until the matrix is built, which peaks at
+    about 70 bytes per like, the matrix keeps about 11.
+    """
+    user_chunks, beat_chunks, recent_chunks = [], [], []
+    latest = None
+    result = await session.stream(
+        select(likes.c.user_id, likes.c.beat_id, likes.c.added_at).execution_options(
+            yield_per=NEIGHBOURS_FETCH_ROWS
+        )
+    )
+    async for rows in result.partitions(NEIGHBOURS_FETCH_ROWS):
+        user_ids, beat_ids, added_at = zip(*rows)
+        user_chunks.append(np.array(user_ids, np.int64))
+        beat_chunks.append(np.array(beat_ids, np.int64))
+        known = [moment for moment in added_at if moment is not None]
+        if known:
+            latest = max(latest or known[0], max(known))
+        if since is not None:
+            recent_chunks.append(
+                np.array(
+                    [
+                        user_id
+                        for user_id, moment in zip(user_ids, added_at)
+                        if moment is not None and moment > since
+                    ],
+                    np.int64,
+                )
+            )
+    await session.commit()
+
+    empty = np.zeros(0, np.int64)
+    user_ids = np.concatenate(user_chunks or [empty])
+    user_chunks.clear()
+    beat_ids = np.concatenate(beat_chunks or [empty])
+    beat_chunks.clear()
+    matrix = LikeMatrix(user_ids, beat_ids)
+    recent = (
+        np.unique(np.concatenate(recent_chunks or [empty]))
+        if since is not None
+        else None
+    )
+    return matrix, recent, latest
+
+
+async def write_neighbours(
+    session: AsyncSession,
+    matrix: LikeMatrix,
+    beats: "np.ndarray",
+    top_n: int = NEIGHBOURS_TOP_N,
+    max_pairs: int = NEIGHBOURS_BLOCK_PAIRS,
+    max_beats: int = NEIGHBOURS_BLOCK_BEATS,
+) -> int:
+    """
+    Replace the neighbours of the beats at the ``beats`` indices, one
+    transaction per block so a failure only loses the block. Returns the
+    number of rows written.
+    """
+    written = 0
+    for block in matrix.blocks(beats, max_pairs, max_beats):
+        rows = matrix.top_neighbours(block, top_n)
+        beat_ids = [int(beat_id) for beat_id in matrix.beat_ids[block]]
+        await session.execute(
+            delete(beat_neighbours).where(beat_neighbours.c.beat_id.in_(beat_ids))
+        )
+        if rows:
+            await session.execute(insert(beat_neighbours), rows)
+        await session.commit()
+        written += len(rows)
+    return written
+
+
+async def compute_neighbours(
+    session: AsyncSession, full: bool = False
+) -> Dict[str, Any]:
+    """
+    Precompute "people who liked this also liked" into ``beat_neighbours``.
+
+    The likes are streamed through a server-side cursor, co-occurrences are
+    counted a block of beats at a time, and the neighbours of a beat are
+    ranked by the cosine of their sets of likers.
+
+    Memory is O(likes): the whole table is held while the job runs, see
+    ``load_likes``. Splitting it by beat would not help, counting the
+    neighbours of a beat needs every like of everyone who liked it.
+
+    Only the beats liked by users who liked something since the previous
+    watermark are recomputed. Removed likes are only reflected by a full
+    run, which also drops the beats nobody likes anymore.
+    """
+    if np is None:
+        raise RuntimeError("Computing neighbours requires numpy")
+    started_at = datetime.utcnow()
+    started = time.perf_counter()
+    watermark = None if full else await read_watermark(session)
+    since = watermark and watermark - timedelta(
+        seconds=NEIGHBOURS_WATERMARK_OVERLAP_SECONDS
+    )
+
+    matrix, recent_users, latest = await load_likes(session, since)
+    if recent_users is None:
+        beats = np.arange(len(matrix.beat_ids))
+    else:
+        beats = matrix.beats_liked_by(recent_users)
+    written = await write_neighbours(session, matrix, beats)
+
+    if since is None:
+        # Beats without likes anymore were not recomputed
+        await session.execute(
+            delete(beat_neighbours).where(beat_neighbours.c.computed_at < started_at)
+        )
+        await session.commit()
+    if latest is not None and (watermark is None or latest > watermark):
+        await save_watermark(session, latest)
+
+    return {
+        "full": since is None,
+        "likes": matrix.likes,
+        "beats": len(beats),
+        "rows": written,
+        "watermark": latest,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+async def run_neighbours_job(full: bool = False) -> Dict[str, Any]:
+    async with async_session_maker() as session:
+        return await compute_neighbours(session, full)
+
+
+if __name__ == "__main__":
+    # Run it periodically, and with --full from time to time:
+    # python -m src.recommendations.neighbours [--full]
+    parser = argparse.ArgumentParser(description="Precompute beat neighbours")
+    parser.add_argument(
+        "--full", action="store_true", help="recompute every beat, ignore the watermark"
+    )
+    args = parser.parse_args()
+    logger.info(
+        "Computed beat neighbours: {}", asyncio.run(run_neighbours_job(args.full))
+    )
@@ -0,0 +1 @@
+from .serialization import *
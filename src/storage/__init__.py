@@ -0,0 +1,2 @@
+from .responses import *
+from .storage import *
@@ -0,0 +1,200 @@
+import mimetypes
+from email.utils import formatdate, parsedate_to_datetime
+from typing import List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from src.config import STREAM_CHUNK_SIZE
+from src.storage.storage import FileStat, Storage
+
+ZEROCOPY = "http.response.zerocopy"
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive ``(start, end)`` of a ``bytes=`` range header.
+
+    Returns None for headers that should be ignored, which includes requests
+    for several ranges: answering them with the whole file is allowed.
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+
+    start, sep, end = ranges.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not start:
+            # Suffix range: the last ``end`` bytes
+            length = int(end)
+            if length <= 0 or size == 0:
+                raise RangeNotSatisfiable()
+            return max(size - length, 0), size - 1
+        start = int(start)
+        end = int(end) if end else size - 1
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    tags: List[str] = [tag.strip() for tag in header.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+def _not_modified_since(header: str, stat: FileStat) -> bool:
+    try:
+        since = parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+    # HTTP dates have a one second resolution
+    return int(stat.mtime) <= since
+
+
+class StoredFileResponse(Response):
+    """
+    Response streaming a file from a storage, for audio players and downloads.
+
+    Supports single byte ranges (206/416), ETag and Last-Modified validators
+    with ``If-None-Match``, ``If-Modified-Since`` and ``If-Range``, and HEAD.
+    The body is sent with the ASGI zero-copy extension when the server offers
+    it, otherwise in chunks read off the event loop.
+    """
+
+    def __init__(
+        self,
+        storage: Storage,
+        key: str,
+        request: Request,
+        stat: FileStat,
+        media_type: Optional[str] = None,
+        chunk_size: int = STREAM_CHUNK_SIZE,
+        headers: Optional[dict] = None,
+    ):
+        self.storage = storage
+        self.key = key
+        self.chunk_size = chunk_size
+        self.media_type = media_type or mimetypes.guess_type(key)[0]
+        self.background = None
+        self.body = b""
+
+        etag = f'"{stat.size:x}-{stat.mtime_ns:x}"'
+        response_headers = {
+            "accept-ranges": "bytes",
+            "etag": etag,
+            "last-modified": formatdate(stat.mtime, usegmt=True),
+            **(headers or {}),
+        }
+
+        self.status_code = 200
+        self.offset, self.length = 0, stat.size
+        if self._not_modified(request, etag, stat):
+            self.status_code = 304
+            self.length = 0
+            self.media_type = None
+        elif self._use_range(request, etag, stat):
+            try:
+                byte_range = parse_range(request.headers["range"], stat.size)
+            except RangeNotSatisfiable:
+                self.status_code = 416
+                self.length = 0
+                response_headers["content-range"] = f"bytes */{stat.size}"
+            else:
+                if byte_range is not None:
+                    start, end = byte_range
+                    self.status_code = 206
+                    self.offset, self.length = start, end - start + 1
+                    response_headers[
+                        "content-range"
+                    ] = f"bytes {start}-{end}/{stat.size}"
+
+        if self.status_code != 304:
+            response_headers["content-length"] = str(self.length)
+        self.init_headers(response_headers)
+
+    @staticmethod
+    def _not_modified(request: Request, etag: str, stat: FileStat) -> bool:
+        if request.method not in ("GET", "HEAD"):
+            return False
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            return _etag_matches(if_none_match, etag)
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since is not None:
+            return _not_modified_since(if_modified_since, stat)
+        return False
+
+    @staticmethod
+    def _use_range(request: Request, etag: str, stat: FileStat) -> bool:
+        if request.method != "GET" or "range" not in request.headers:
+            return False
+        if_range = request.headers.get("if-range")
+        if if_range is None:
+            return True
+        # A range of a file that changed since the client got its first part
+        # would corrupt it, send the whole file instead
+        if if_range.startswith('"') or if_range.startswith("W/"):
+            return if_range == etag
+        return _not_modified_since(if_range, stat)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        if scope["method"] == "HEAD" or self.length == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        file = await run_in_threadpool(self.storage.open, self.key)
+        try:
+            if ZEROCOPY in scope.get("extensions", {}) and hasattr(file, "fileno"):
+                await send(
+                    {
+                        "type": ZEROCOPY,
+                        "file": file,
+                        "offset": self.offset,
+                        "count": self.length,
+                    }
+                )
+                return
+
+            await run_in_threadpool(file.seek, self.offset)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await run_in_threadpool(
+                    file.read, min(self.chunk_size, remaining)
+                )
+                if not chunk:
+                    # The file shrank under us, the client will see a short body
+                    break
+                remaining -= len(chunk)
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": remaining > 0,
+                    }
+                )
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            await run_in_threadpool(file.close)
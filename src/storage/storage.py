@@ -0,0 +1,102 @@
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import BinaryIO, Union
+
+from src.config import STORAGE_ROOT
+
+
+class StoredFileNotFound(Exception):
+    pass
+
+
+class FileStat:
+    def __init__(self, size: int, mtime: float, mtime_ns: int):
+        self.size = size
+        self.mtime = mtime
+        self.mtime_ns = mtime_ns
+
+
+class Storage(ABC):
+    """Where beats, images and their derived files are kept, addressed by key"""
+
+    @abstractmethod
+    def stat(self, key: str) -> FileStat:
+        ...
+
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        ...
+
+    @abstractmethod
+    def save(self, key: str, data: Union[bytes, BinaryIO]):
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.stat(key)
+        except StoredFileNotFound:
+            return False
+        return True
+
+
+class LocalStorage(Storage):
+    """
+    Storage in a directory of the local filesystem.
+
+    Keys are relative paths, anything resolving outside of the root directory
+    is reported as missing. Writes go through a temporary file and a rename,
+    so readers never see a partially written file.
+    """
+
+    def __init__(self, root: Union[str, Path] = STORAGE_ROOT):
+        self.root = Path(root).resolve()
+
+    def path(self, key: str) -> Path:
+        path = (self.root / key.lstrip("/")).resolve()
+        if path != self.root and self.root not in path.parents:
+            raise StoredFileNotFound(key)
+        return path
+
+    def stat(self, key: str) -> FileStat:
+        try:
+            result = self.path(key).stat()
+        except (FileNotFoundError, NotADirectoryError):
+            raise StoredFileNotFound(key)
+        return FileStat(result.st_size, result.st_mtime, result.st_mtime_ns)
+
+    def open(self, key: str) -> BinaryIO:
+        try:
+            return open(self.path(key), "rb")
+        except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+            raise StoredFileNotFound(key)
+
+    def save(self, key: str, data: Union[bytes, BinaryIO]):
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                if isinstance(data, bytes):
+                    file.write(data)
+                else:
+                    while chunk := data.read(1024 * 1024):
+                        file.write(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def delete(self, key: str):
+        try:
+            self.path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+
+storage = LocalStorage()
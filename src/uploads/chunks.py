@@ -0,0 +1,77 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import AsyncIterator, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from src.config import UPLOAD_TMP_DIR
+
+READ_SIZE = 1024 * 1024
+
+
+class ChunkTooLarge(Exception):
+    pass
+
+
+def partial_path(upload_id: str) -> Path:
+    return Path(UPLOAD_TMP_DIR) / f"{upload_id}.part"
+
+
+def create_partial(upload_id: str):
+    path = partial_path(upload_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+
+
+def remove_partial(upload_id: str):
+    try:
+        partial_path(upload_id).unlink()
+    except FileNotFoundError:
+        pass
+
+
+async def write_chunk(
+    upload_id: str, offset: int, stream: AsyncIterator[bytes], limit: int
+) -> Tuple[int, str]:
+    """
+    Write a request body at ``offset`` of the partial file as it arrives.
+
+    Only the piece being received is held in memory. Raises ``ChunkTooLarge``
+    past ``limit`` bytes; what was written beyond the committed offset is
+    simply overwritten by the next attempt. Returns the size and the hex
+    SHA-256 of the chunk.
+    """
+    digest = hashlib.sha256()
+    written = 0
+    file = await run_in_threadpool(open, partial_path(upload_id), "r+b")
+    try:
+        await run_in_threadpool(file.seek, offset)
+        async for piece in stream:
+            written += len(piece)
+            if written > limit:
+                raise ChunkTooLarge()
+            digest.update(piece)
+            await run_in_threadpool(file.write, piece)
+        await run_in_threadpool(file.flush)
+        await run_in_threadpool(os.fsync, file.fileno())
+    finally:
+        await run_in_threadpool(file.close)
+    return written, digest.hexdigest()
+
+
+def file_sha256(path: Path, size: Optional[int] = None) -> str:
+    """Hex SHA-256 of the first ``size`` bytes of a file, read in blocks"""
+    digest = hashlib.sha256()
+    remaining = size
+    with open(path, "rb") as file:
+        while remaining is None or remaining > 0:
+            block = file.read(
+                READ_SIZE if remaining is None else min(READ_SIZE, remaining)
+            )
+            if not block:
+                break
+            digest.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return digest.hexdigest()
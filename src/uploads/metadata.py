@@ -0,0 +1,116 @@
+import shutil
+import subprocess
+import wave
+from pathlib import Path
+from typing import Optional, Union
+
+try:
+    import numpy as np
+except ImportError:  # Tempo is not detected without it
+    np = None
+
+# Frames per energy sample of the onset envelope
+HOP_SIZE = 512
+# Enough music to find the beat, bounds the work for long tracks
+MAX_ANALYSED_SECONDS = 120
+MIN_BPM, MAX_BPM = 60, 200
+PROBE_TIMEOUT_SECONDS = 30
+
+_SAMPLE_TYPES = {1: "u1", 2: "<i2", 4: "<i4"}
+
+
+class AudioInfo:
+    def __init__(self, duration_seconds: Optional[float], bpm: Optional[int]):
+        self.duration_seconds = duration_seconds
+        self.bpm = bpm
+
+
+def read_audio_info(path: Union[str, Path], suffix: Optional[str] = None) -> AudioInfo:
+    """
+    Duration and estimated tempo of an audio file, None when unknown.
+    ``suffix`` is the format of the file when its name does not tell.
+    """
+    path = Path(path)
+    if (suffix or path.suffix).lower() == ".wav":
+        with wave.open(str(path), "rb") as reader:
+            duration = reader.getnframes() / reader.getframerate()
+            return AudioInfo(duration, estimate_wav_bpm(reader))
+    return AudioInfo(probe_duration(path), None)
+
+
+def probe_duration(path: Path) -> Optional[float]:
+    """Duration read by ffprobe from the headers, the audio is not decoded"""
+    if shutil.which("ffprobe") is None:
+        return None
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration"]
+            + ["-of", "default=noprint_wrappers=1:nokey=1", str(path)],
+            capture_output=True,
+            text=True,
+            timeout=PROBE_TIMEOUT_SECONDS,
+            check=True,
+        )
+        return float(result.stdout.strip())
+    except (subprocess.SubprocessError, ValueError):
+        return None
+
+
+def estimate_wav_bpm(reader: wave.Wave_read) -> Optional[int]:
+    """
+    Tempo from the autocorrelation of the onset envelope.
+
+    The file is read block by block and only one energy value per
+    ``HOP_SIZE`` frames is kept, so memory does not grow with the file.
+    """
+    dtype = _SAMPLE_TYPES.get(reader.getsampwidth())
+    if np is None or dtype is None:
+        return None
+
+    rate, channels = reader.getframerate(), reader.getnchannels()
+    max_hops = int(MAX_ANALYSED_SECONDS * rate / HOP_SIZE)
+    energies = []
+    while len(energies) < max_hops:
+        block = reader.readframes(HOP_SIZE * 256)
+        if not block:
+            break
+        samples = np.frombuffer(block, dtype=dtype).astype(np.float64)
+        if dtype == "u1":
+            samples -= 128
+        frames = samples[: len(samples) // channels * channels]
+        mono = frames.reshape(-1, channels).mean(axis=1)
+        hops = len(mono) // HOP_SIZE
+        if hops:
+            blocks = mono[: hops * HOP_SIZE].reshape(hops, HOP_SIZE)
+            energies.extend(np.sqrt((blocks**2).mean(axis=1)))
+
+    envelope = np.diff(np.asarray(energies[:max_hops]))
+    envelope = np.maximum(envelope, 0)
+    hops_per_minute = 60 * rate / HOP_SIZE
+    min_lag = int(hops_per_minute / MAX_BPM)
+    max_lag = int(hops_per_minute / MIN_BPM) + 1
+    if len(envelope) <= max_lag * 2 or not envelope.any():
+        return None
+
+    envelope -= envelope.mean()
+    lags = np.arange(min_lag, max_lag)
+    correlations = np.array([np.dot(envelope[:-lag], envelope[lag:]) for lag in lags])
+    best = int(np.argmax(correlations))
+
+    # A beat also correlates with itself two beats later, prefer the faster
+    # tempo when its lag is nearly as good
+    half = (lags[best] / 2) - min_lag
+    if half >= 0:
+        candidates = [i for i in (int(half), int(half) + 1) if i < len(lags)]
+        faster = max(candidates, key=lambda i: correlations[i])
+        if correlations[faster] >= 0.5 * correlations[best]:
+            best = faster
+
+    lag = float(lags[best])
+    if 0 < best < len(lags) - 1:
+        # Parabolic interpolation, lags are whole hops and tempos are not
+        left, center, right = correlations[best - 1 : best + 2]
+        denominator = left - 2 * center + right
+        if denominator < 0:
+            lag += 0.5 * (left - right) / denominator
+    return round(hops_per_minute / lag)
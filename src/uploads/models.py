@@ -0,0 +1,45 @@
+from datetime import datetime
+
+from sqlalchemy import (
+    TIMESTAMP,
+    BigInteger,
+    Column,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Table,
+)
+
+from src.auth.models import users
+from src.beats.models import beats
+from src.database import metadata
+
+# Upload statuses, in the order an upload goes through them
+PENDING = "pending"
+UPLOADED = "uploaded"
+PROCESSING = "processing"
+DONE = "done"
+FAILED = "failed"
+
+beat_uploads = Table(
+    "beat_uploads",
+    metadata,
+    Column("upload_id", String(32), primary_key=True),
+    Column("user_id", Integer, ForeignKey(users.c.user_id), nullable=False),
+    Column("filename", String, nullable=False),
+    Column("size", BigInteger, nullable=False),
+    Column("received_size", BigInteger, nullable=False, default=0),
+    # Hex SHA-256 of the whole file, announced by the client
+    Column("sha256", String(64), nullable=False),
+    Column("title", String, nullable=False),
+    Column("price", String, nullable=False),
+    Column("bpm", Integer),
+    Column("status", String, nullable=False, default=PENDING),
+    Column("error", String),
+    Column("beat_id", Integer, ForeignKey(beats.c.beat_id)),
+    Column("created_at", TIMESTAMP, default=datetime.utcnow),
+    Column("updated_at", TIMESTAMP, default=datetime.utcnow),
+    # Uploads waiting for a worker
+    Index("ix_beat_uploads_status_updated_at", "status", "updated_at"),
+)
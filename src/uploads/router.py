@@ -0,0 +1,218 @@
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from loguru import logger
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from src.auth.base_config import get_current_principal
+from src.auth.principal import Principal
+from src.config import UPLOAD_CHUNK_MAX_BYTES
+from src.database import get_async_session
+from src.database.replica import stick_to_primary
+from src.uploads.chunks import (
+    ChunkTooLarge,
+    create_partial,
+    file_sha256,
+    partial_path,
+    remove_partial,
+    write_chunk,
+)
+from src.uploads.models import FAILED, PENDING, UPLOADED, beat_uploads
+from src.uploads.schemas import UploadCreate, UploadStatus
+from src.uploads.worker import upload_worker
+
+router = APIRouter(prefix="/upload", tags=["Upload"])
+
+
+async def _get_upload(
+    session: AsyncSession, upload_id: str, user_id: int
+) -> Dict[str, Any]:
+    result = await session.execute(
+        select(beat_uploads).where(
+            beat_uploads.c.upload_id == upload_id, beat_uploads.c.user_id == user_id
+        )
+    )
+    upload = result.mappings().first()
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return dict(upload)
+
+
+def _offset_conflict(upload: Dict[str, Any]) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Upload offset does not match, resume from the received size",
+        headers={"Upload-Offset": str(upload["received_size"])},
+    )
+
+
+@router.post("", response_model=UploadStatus, status_code=status.HTTP_201_CREATED)
+async def create_upload(
+    upload: UploadCreate,
+    current_user: Principal = Depends(get_current_principal),
+    session: AsyncSession = Depends(get_async_session),
+):
+    upload_id = uuid.uuid4().hex
+    try:
+        await run_in_threadpool(create_partial, upload_id)
+        result = await session.execute(
+            insert(beat_uploads)
+            .values(
+                upload_id=upload_id,
+                user_id=current_user.id,
+                filename=upload.filename,
+                size=upload.size,
+                received_size=0,
+                sha256=upload.sha256,
+                title=upload.title,
+                price=str(upload.price),
+                bpm=upload.bpm,
+                status=PENDING,
+                created_at=datetime.utcnow(),
+                updated_at=datetime.utcnow(),
+            )
+            .returning(*beat_uploads.c)
+        )
+        created = result.mappings().first()
+        await session.commit()
+    except Exception:
+        logger.exception("Error while creating the upload")
+        await run_in_threadpool(remove_partial, upload_id)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while creating the upload.",
+        )
+    return created
+
+
+@router.get("/{upload_id}", response_model=UploadStatus)
+async def get_upload(
+    upload_id: str,
+    current_user: Principal = Depends(get_current_principal),
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await _get_upload(session, upload_id, current_user.id)
+
+
+@router.put("/{upload_id}", response_model=UploadStatus)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    response: Response,
+    upload_offset: int = Header(..., ge=0),
+    upload_checksum: Optional[str] = Header(None),
+    current_user: Principal = Depends(get_current_principal),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Append the request body to an upload. ``Upload-Offset`` must be the size
+    received so far, and ``Upload-Checksum: sha256 <hex>`` optionally
+    protects the chunk: a chunk that does not match is not kept.
+    """
+    upload = await _get_upload(session, upload_id, current_user.id)
+    if upload["status"] != PENDING:
+        raise HTTPException(status_code=409, detail="Upload is already complete")
+    if upload_offset != upload["received_size"]:
+        raise _offset_conflict(upload)
+    # Give the connection back to the pool while the body streams in
+    await session.commit()
+
+    limit = min(UPLOAD_CHUNK_MAX_BYTES, upload["size"] - upload_offset)
+    try:
+        written, chunk_sha256 = await write_chunk(
+            upload_id, upload_offset, request.stream(), limit
+        )
+    except ChunkTooLarge:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Chunks are limited to {limit} bytes here",
+        )
+
+    if upload_checksum is not None:
+        algorithm, _, expected = upload_checksum.partition(" ")
+        if algorithm.lower() != "sha256":
+            raise HTTPException(status_code=400, detail="Only sha256 is supported")
+        if expected.strip().lower() != chunk_sha256:
+            # 460 is the checksum mismatch status of the tus protocol
+            raise HTTPException(status_code=460, detail="Chunk checksum mismatch")
+
+    received_size = upload_offset + written
+    complete = received_size == upload["size"]
+    try:
+        result = await session.execute(
+            update(beat_uploads)
+            .where(
+                beat_uploads.c.upload_id == upload_id,
+                beat_uploads.c.status == PENDING,
+                # Another request may have stored this chunk meanwhile
+                beat_uploads.c.received_size == upload_offset,
+            )
+            .values(received_size=received_size, updated_at=datetime.utcnow())
+            .returning(*beat_uploads.c)
+        )
+        updated = result.mappings().first()
+        await session.commit()
+    except Exception:
+        logger.exception("Error while storing the chunk")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while storing the chunk.",
+        )
+    if updated is None:
+        raise _offset_conflict(await _get_upload(session, upload_id, current_user.id))
+    if not complete:
+        response.headers["Upload-Offset"] = str(received_size)
+        return updated
+
+    file_hash = await run_in_threadpool(
+        file_sha256, partial_path(upload_id), upload["size"]
+    )
+    verified = file_hash == upload["sha256"]
+    result = await session.execute(
+        update(beat_uploads)
+        .where(beat_uploads.c.upload_id == upload_id)
+        .values(
+            status=UPLOADED if verified else FAILED,
+            error=None if verified else "File checksum mismatch",
+            updated_at=datetime.utcnow(),
+        )
+        .returning(*beat_uploads.c)
+    )
+    updated = result.mappings().first()
+    await session.commit()
+
+    if not verified:
+        await run_in_threadpool(remove_partial, upload_id)
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="File checksum mismatch, start a new upload",
+        )
+
+    upload_worker.enqueue(upload_id)
+    stick_to_primary(response)
+    response.status_code = status.HTTP_202_ACCEPTED
+    return updated
+
+
+@router.delete("/{upload_id}")
+async def cancel_upload(
+    upload_id: str,
+    current_user: Principal = Depends(get_current_principal),
+    session: AsyncSession = Depends(get_async_session),
+):
+    upload = await _get_upload(session, upload_id, current_user.id)
+    if upload["status"] != PENDING:
+        raise HTTPException(status_code=409, detail="Upload is already complete")
+
+    await session.execute(
+        update(beat_uploads)
+        .where(beat_uploads.c.upload_id == upload_id)
+        .values(status=FAILED, error="Cancelled", updated_at=datetime.utcnow())
+    )
+    await session.commit()
+    await run_in_threadpool(remove_partial, upload_id)
+    return {"message": "Upload cancelled"}
@@ -0,0 +1,48 @@
+from decimal import Decimal
+from typing import Optional
+
+from pydantic import BaseModel, conint, constr, validator
+
+from src.config import UPLOAD_CHUNK_MAX_BYTES, UPLOAD_MAX_BYTES
+
+AUDIO_EXTENSIONS = (".wav", ".mp3")
+
+Sha256Hex = constr(regex=r"^[0-9a-fA-F]{64}$")
+
+
+class UploadCreate(BaseModel):
+    """Announces a beat upload, the file itself is sent in chunks afterwards"""
+
+    filename: constr(min_length=1, max_length=255)
+    size: conint(gt=0, le=UPLOAD_MAX_BYTES)
+    sha256: Sha256Hex
+    title: constr(min_length=1, max_length=200)
+    price: Decimal
+    # Detected from the audio when it is left out
+    bpm: Optional[conint(gt=0, lt=1000)] = None
+
+    @validator("filename")
+    def check_extension(cls, value):
+        if not value.lower().endswith(AUDIO_EXTENSIONS):
+            raise ValueError(f"Only {', '.join(AUDIO_EXTENSIONS)} files are accepted")
+        return value
+
+    @validator("price")
+    def check_price(cls, value):
+        if value < 0:
+            raise ValueError("Price cannot be negative")
+        return value
+
+    @validator("sha256")
+    def lower_sha256(cls, value):
+        return value.lower()
+
+
+class UploadStatus(BaseModel):
+    upload_id: str
+    status: str
+    size: int
+    received_size: int
+    max_chunk_size: int = UPLOAD_CHUNK_MAX_BYTES
+    error: Optional[str] = None
+    beat_id: Optional[int] = None
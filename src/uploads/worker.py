@@ -0,0 +1,338 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from pathlib import PurePosixPath
+from typing import Any, Dict, List, Optional, Set
+
+from loguru import logger
+from sqlalchemy import insert, or_, select, update
+from starlette.concurrency import run_in_threadpool
+
+from src.beats.models import beats
+from src.beats.previews import PreviewUnavailable, ensure_preview
+from src.beats.prices import parse_price
+from src.beats.waveforms import WaveformUnavailable, ensure_waveform
+from src.cache import response_cache
+from src.config import (
+    UPLOAD_AUDIO_PREFIX,
+    UPLOAD_DEFAULT_IMAGE,
+    UPLOAD_PENDING_TTL_SECONDS,
+    UPLOAD_PROCESSING_TIMEOUT_SECONDS,
+    UPLOAD_QUEUE_SIZE,
+    UPLOAD_SWEEP_SECONDS,
+    UPLOAD_WORKERS,
+)
+from src.database import async_session_maker
+from src.recommendations import recommendation_index
+from src.storage import Storage, storage
+from src.uploads.chunks import partial_path, remove_partial
+from src.uploads.metadata import read_audio_info
+from src.uploads.models import DONE, FAILED, PENDING, PROCESSING, UPLOADED, beat_uploads
+
+
+class UploadRejected(Exception):
+    """The file cannot become a beat, retrying will not help"""
+
+
+def audio_key(upload: Dict[str, Any]) -> str:
+    suffix = PurePosixPath(upload["filename"]).suffix.lower()
+    # Keys are never reused, so stored files can be cached forever
+    return f"{UPLOAD_AUDIO_PREFIX}/{upload['user_id']}/{upload['upload_id']}{suffix}"
+
+
+def _store(storage: Storage, upload_id: str, key: str):
+    with open(partial_path(upload_id), "rb") as file:
+        storage.save(key, file)
+
+
+async def claim_upload(upload_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Move an upload to processing, unless another worker already has it. An
+    upload left in processing longer than the timeout is claimed again.
+    """
+    stale = datetime.utcnow() - timedelta(seconds=UPLOAD_PROCESSING_TIMEOUT_SECONDS)
+    async with async_session_maker() as session:
+        result = await session.execute(
+            update(beat_uploads)
+            .where(
+                beat_uploads.c.upload_id == upload_id,
+                or_(
+                    beat_uploads.c.status == UPLOADED,
+                    (beat_uploads.c.status == PROCESSING)
+                    & (beat_uploads.c.updated_at < stale),
+                ),
+            )
+            .values(status=PROCESSING, updated_at=datetime.utcnow())
+            .returning(*beat_uploads.c)
+        )
+        upload = result.mappings().first()
+        await session.commit()
+    return dict(upload) if upload is not None else None
+
+
+async def process_upload(upload: Dict[str, Any], storage: Storage = storage) -> int:
+    """Turn a complete upload into a beat, returns the new beat id"""
+    upload_id = upload["upload_id"]
+    try:
+        info = await run_in_threadpool(
+            read_audio_info,
+            partial_path(upload_id),
+            PurePosixPath(upload["filename"]).suffix,
+        )
+    except Exception as error:
+        raise UploadRejected(f"Unreadable audio file: {error}")
+
+    bpm = upload["bpm"] or info.bpm
+    if bpm is None:
+        raise UploadRejected("The tempo could not be detected, set the bpm")
+
+    key = audio_key(upload)
+    amount = parse_price(upload["price"])
+    await run_in_threadpool(_store, storage, upload_id, key)
+
+    async with async_session_maker() as session:
+        result = await session.execute(
+            insert(beats)
+            .values(
+                user_id=upload["user_id"],
+                title=upload["title"],
+                price=upload["price"],
+                price_amount=amount,
+                bpm=bpm,
+                image=UPLOAD_DEFAULT_IMAGE,
+                audio_file=key,
+                duration_seconds=info.duration_seconds,
+                added_at=datetime.utcnow(),
+                likes_count=0,
+                plays_count=0,
+            )
+            .returning(beats.c.beat_id)
+        )
+        beat_id = result.scalar_one()
+        await session.execute(
+            update(beat_uploads)
+            .where(beat_uploads.c.upload_id == upload_id)
+            .values(status=DONE, beat_id=beat_id, updated_at=datetime.utcnow())
+        )
+        await session.commit()
+
+    # The beat is done from here on, failures below are logged and must not
+    # leave the upload to be processed again
+    try:
+        await response_cache.invalidate(f"author:{upload['user_id']}")
+        await run_in_threadpool(remove_partial, upload_id)
+        recommendation_index.add_beat(
+            beat_id,
+            bpm,
+            None if amount is None else float(amount),
+            info.duration_seconds,
+        )
+    except Exception:
+        logger.exception("Failed to finish upload {} of beat {}", upload_id, beat_id)
+    try:
+        await run_in_threadpool(ensure_preview, storage, beat_id, key)
+    except PreviewUnavailable as error:
+        logger.info("No preview for beat {}: {}", beat_id, error)
+    except Exception:
+        logger.exception("Failed to make the preview of beat {}", beat_id)
+    try:
+        await run_in_threadpool(ensure_waveform, storage, beat_id, key)
+    except WaveformUnavailable as error:
+        logger.info("No waveform for beat {}: {}", beat_id, error)
+    except Exception:
+        logger.exception("Failed to make the waveform of beat {}", beat_id)
+    return beat_id
+
+
+async def fail_upload(upload_id: str, error: str):
+    async with async_session_maker() as session:
+        await session.execute(
+            update(beat_uploads)
+            .where(beat_uploads.c.upload_id == upload_id)
+            .values(status=FAILED, error=error, updated_at=datetime.utcnow())
+        )
+        await session.commit()
+    await run_in_threadpool(remove_partial, upload_id)
+
+
+async def claimable_uploads(limit: int):
+    stale = datetime.utcnow() - timedelta(seconds=UPLOAD_PROCESSING_TIMEOUT_SECONDS)
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(beat_uploads.c.upload_id)
+            .where(
+                or_(
+                    beat_uploads.c.status == UPLOADED,
+                    (beat_uploads.c.status == PROCESSING)
+                    & (beat_uploads.c.updated_at < stale),
+                )
+            )
+            .order_by(beat_uploads.c.updated_at)
+            .limit(limit)
+        )
+        return result.scalars().all()
+
+
+async def expire_uploads(limit: int) -> List[str]:
+    """
+    Fail uploads that received nothing for ``UPLOAD_PENDING_TTL_SECONDS``
+    and remove their partial files, returns their ids.
+    """
+    stale = datetime.utcnow() - timedelta(seconds=UPLOAD_PENDING_TTL_SECONDS)
+    abandoned = (
+        select(beat_uploads.c.upload_id)
+        .where(beat_uploads.c.status == PENDING, beat_uploads.c.updated_at < stale)
+        .order_by(beat_uploads.c.updated_at)
+        .limit(limit)
+    )
+    async with async_session_maker() as session:
+        result = await session.execute(
+            update(beat_uploads)
+            .where(
+                beat_uploads.c.upload_id.in_(abandoned.scalar_subquery()),
+                # A chunk may have arrived since it was selected
+                beat_uploads.c.status == PENDING,
+                beat_uploads.c.updated_at < stale,
+            )
+            .values(status=FAILED, error="Expired", updated_at=datetime.utcnow())
+            .returning(beat_uploads.c.upload_id)
+        )
+        upload_ids = result.scalars().all()
+        await session.commit()
+    for upload_id in upload_ids:
+        await run_in_threadpool(remove_partial, upload_id)
+    return upload_ids
+
+
+class UploadWorker:
+    """
+    Background processing of complete uploads.
+
+    Ids are queued by the upload endpoint and consumed by ``workers`` tasks.
+    Every upload is claimed in the database before it is processed, so an id
+    queued twice, or by several app processes, is only processed once. A
+    periodic sweep picks up what a full queue or a restart left behind, and
+    expires the uploads clients abandoned before completing them.
+    """
+
+    def __init__(
+        self,
+        claim=claim_upload,
+        process=process_upload,
+        fail=fail_upload,
+        sweep=claimable_uploads,
+        expire=expire_uploads,
+        workers: int = UPLOAD_WORKERS,
+        max_queue: int = UPLOAD_QUEUE_SIZE,
+        sweep_interval: float = UPLOAD_SWEEP_SECONDS,
+    ):
+        self._claim = claim
+        self._process = process
+        self._fail = fail
+        self._sweep = sweep
+        self._expire = expire
+        self.workers = workers
+        self.sweep_interval = sweep_interval
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._queued: Set[str] = set()
+        self._tasks = []
+
+        self.processed = 0
+        self.failed = 0
+        self.errors = 0
+        self.dropped = 0
+        self.expired = 0
+        self.max_processing_seconds = 0.0
+        self.total_processing_seconds = 0.0
+
+    def enqueue(self, upload_id: str):
+        if upload_id in self._queued:
+            return
+        try:
+            self._queue.put_nowait(upload_id)
+        except asyncio.QueueFull:
+            # Still marked uploaded in the database, the sweep will find it
+            self.dropped += 1
+            return
+        self._queued.add(upload_id)
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._consume()) for _ in range(self.workers)
+            ]
+            self._tasks.append(asyncio.create_task(self._sweep_periodically()))
+
+    async def stop(self):
+        """Stop the workers, interrupted uploads are claimed again later"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def join(self):
+        await self._queue.join()
+
+    async def handle(self, upload_id: str):
+        upload = await self._claim(upload_id)
+        if upload is None:
+            return
+
+        started = time.perf_counter()
+        try:
+            await self._process(upload)
+            self.processed += 1
+        except UploadRejected as error:
+            self.failed += 1
+            await self._fail(upload_id, str(error))
+        except Exception:
+            # Left in processing, the sweep retries after the timeout
+            self.errors += 1
+            logger.exception("Failed to process upload {}", upload_id)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.max_processing_seconds = max(self.max_processing_seconds, elapsed)
+            self.total_processing_seconds += elapsed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "processed": self.processed,
+            "failed": self.failed,
+            "errors": self.errors,
+            "dropped": self.dropped,
+            "expired": self.expired,
+            "max_processing_seconds": self.max_processing_seconds,
+            "total_processing_seconds": self.total_processing_seconds,
+        }
+
+    async def _consume(self):
+        while True:
+            upload_id = await self._queue.get()
+            self._queued.discard(upload_id)
+            try:
+                await self.handle(upload_id)
+            except Exception:
+                # Claiming or failing it can hit the database too, the sweep
+                # finds the upload again and this worker keeps going
+                self.errors += 1
+                logger.exception("Failed to handle upload {}", upload_id)
+            finally:
+                self._queue.task_done()
+
+    async def _sweep_periodically(self):
+        while True:
+            try:
+                for upload_id in await self._sweep(self._queue.maxsize):
+                    self.enqueue(upload_id)
+            except Exception:
+                logger.exception("Failed to look for uploads to process")
+            try:
+                self.expired += len(await self._expire(self._queue.maxsize))
+            except Exception:
+                logger.exception("Failed to expire abandoned uploads")
+            await asyncio.sleep(self.sweep_interval)
+
+
+upload_worker = UploadWorker()
@@ -0,0 +1,128 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from sqlalchemy import Integer, any_, bindparam, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.models import users
+from src.config import AUTHOR_CACHE_MAX_ENTRIES, AUTHOR_CACHE_TTL_SECONDS
+
+
+def author_summaries_query(user_ids: List[int]):
+    """The author fields of a ``TrackCard``, by user id"""
+    return select(
+        users.c.user_id,
+        users.c.username,
+        users.c.total_likes.label("user_total_likes"),
+        users.c.total_plays.label("user_total_plays"),
+        users.c.profile_photo,
+    ).where(users.c.user_id == any_(bindparam("user_ids", user_ids, ARRAY(Integer))))
+
+
+class AuthorSummaryCache:
+    """
+    In-process map of the author fields shown on track cards.
+
+    Like and play writes shift the cached counters by the same deltas they
+    apply to ``users``, so the map stays current in the process that made the
+    write; other processes catch up when their entries expire.
+    """
+
+    def __init__(
+        self,
+        ttl: float = AUTHOR_CACHE_TTL_SECONDS,
+        max_entries: int = AUTHOR_CACHE_MAX_ENTRIES,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    async def get_many(
+        self, session: AsyncSession, user_ids: Iterable[int]
+    ) -> Dict[int, Dict[str, Any]]:
+        """Summaries of the given authors, loading the missing ones at once"""
+        now = time.monotonic()
+        found, missing = {}, []
+        for user_id in dict.fromkeys(user_ids):
+            summary = self._get(user_id, now)
+            if summary is None:
+                missing.append(user_id)
+            else:
+                found[user_id] = summary
+        self.hits += len(found)
+        self.misses += len(missing)
+
+        if missing:
+            self.loads += 1
+            result = await session.execute(author_summaries_query(missing))
+            for row in result.mappings():
+                summary = dict(row)
+                del summary["user_id"]
+                self._set(row["user_id"], summary, now)
+                found[row["user_id"]] = summary
+        return found
+
+    def add_counts(self, user_id: int, likes: int = 0, plays: int = 0):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return
+        summary = entry[1]
+        summary["user_total_likes"] = max((summary["user_total_likes"] or 0) + likes, 0)
+        summary["user_total_plays"] = max((summary["user_total_plays"] or 0) + plays, 0)
+
+    def invalidate(self, *user_ids: int):
+        for user_id in user_ids:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+        }
+
+    def _get(self, user_id: int, now: float) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return entry[1]
+
+    def _set(self, user_id: int, summary: Dict[str, Any], now: float):
+        self._entries[user_id] = (now + self.ttl, summary)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+author_summaries = AuthorSummaryCache()
+
+
+async def attach_authors(
+    session: AsyncSession, rows: Iterable[Mapping[str, Any]]
+) -> List[Dict[str, Any]]:
+    """
+    Track cards from beat rows and the cached summaries of their authors.
+    Rows whose author does not exist are dropped, as the join used to do.
+    """
+    rows = list(rows)
+    summaries = await author_summaries.get_many(
+        session, [row["user_id"] for row in rows]
+    )
+    return [
+        {**row, **summaries[row["user_id"]]}
+        for row in rows
+        if row["user_id"] in summaries
+    ]
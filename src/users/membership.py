@@ -0,0 +1,150 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from sqlalchemy import literal, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.principal import Principal
+from src.config import MEMBERSHIP_CACHE_MAX_USERS, MEMBERSHIP_CACHE_TTL_SECONDS
+from src.users.models import carts, likes
+
+LIKED, CART = "liked", "cart"
+
+
+def memberships_query(user_id: int):
+    """Every liked and carted beat id of a user, tagged with its list"""
+    return union_all(
+        select(literal(LIKED).label("list"), likes.c.beat_id).where(
+            likes.c.user_id == user_id
+        ),
+        select(literal(CART).label("list"), carts.c.beat_id).where(
+            carts.c.user_id == user_id
+        ),
+    )
+
+
+class Membership:
+    """The beat ids a user liked and carted"""
+
+    __slots__ = ("liked", "cart")
+
+    def __init__(self, liked: Iterable[int] = (), cart: Iterable[int] = ()):
+        self.liked = set(liked)
+        self.cart = set(cart)
+
+
+class MembershipIndex:
+    """
+    In-process map from users to the beats they liked or carted, so listings
+    can flag every card with a set lookup.
+
+    A user's sets are loaded with one query on first use. Likes and cart
+    changes made in this process update loaded sets in place; changes made
+    by other processes show up when the entry expires.
+    """
+
+    def __init__(
+        self,
+        ttl: float = MEMBERSHIP_CACHE_TTL_SECONDS,
+        max_users: int = MEMBERSHIP_CACHE_MAX_USERS,
+    ):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._entries: "OrderedDict[int, Tuple[float, Membership]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, session: AsyncSession, user_id: int) -> Membership:
+        now = time.monotonic()
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > now:
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        result = await session.execute(memberships_query(user_id))
+        membership = Membership()
+        for list_name, beat_id in result:
+            (membership.liked if list_name == LIKED else membership.cart).add(beat_id)
+
+        self._entries[user_id] = (now + self.ttl, membership)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_users:
+            self._entries.popitem(last=False)
+        return membership
+
+    def add_like(self, user_id: int, beat_id: int):
+        membership = self._loaded(user_id)
+        if membership is not None:
+            membership.liked.add(beat_id)
+
+    def remove_like(self, user_id: int, beat_id: int):
+        membership = self._loaded(user_id)
+        if membership is not None:
+            membership.liked.discard(beat_id)
+
+    def add_to_cart(self, user_id: int, beat_id: int):
+        membership = self._loaded(user_id)
+        if membership is not None:
+            membership.cart.add(beat_id)
+
+    def remove_from_cart(self, user_id: int, beat_id: int):
+        membership = self._loaded(user_id)
+        if membership is not None:
+            membership.cart.discard(beat_id)
+
+    def invalidate(self, *user_ids: int):
+        for user_id in user_ids:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "users": len(self._entries),
+            "beat_ids": sum(
+                len(membership.liked) + len(membership.cart)
+                for _, membership in self._entries.values()
+            ),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _loaded(self, user_id: int) -> Optional[Membership]:
+        entry = self._entries.get(user_id)
+        return entry[1] if entry is not None else None
+
+
+membership_index = MembershipIndex()
+
+
+def membership_tags(viewer: Optional[Principal]) -> List[str]:
+    """Cache tags of the lists the viewer's flags are computed from"""
+    if viewer is None:
+        return []
+    return [f"likes:{viewer.id}", f"cart:{viewer.id}"]
+
+
+async def add_membership_flags(
+    session: AsyncSession,
+    viewer: Optional[Principal],
+    cards: Iterable[Mapping[str, Any]],
+) -> List[Dict[str, Any]]:
+    """
+    Track cards with ``is_liked`` and ``in_cart`` set for the viewer. Without
+    a viewer the cards are returned as they are and the flags stay unset.
+    """
+    if viewer is None:
+        return list(cards)
+    membership = await membership_index.get(session, viewer.id)
+    return [
+        {
+            **card,
+            "is_liked": card["beat_id"] in membership.liked,
+            "in_cart": card["beat_id"] in membership.cart,
+        }
+        for card in cards
+    ]
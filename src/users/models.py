@@ -1,6 +1,14 @@
 from datetime import datetime
 
-from sqlalchemy import TIMESTAMP, Column, ForeignKey, Integer, Table
+from sqlalchemy import (
+    TIMESTAMP,
+    Column,
+    ForeignKey,
+    Index,
+    Integer,
+    Table,
+    UniqueConstraint,
+)
 
 from src.auth.models import users
 from src.beats.models import beats
@@ -12,6 +20,11 @@ likes = Table(
     Column("user_id", Integer, ForeignKey(users.c.user_id)),
     Column("beat_id", Integer, ForeignKey(beats.c.beat_id)),
     Column("added_at", TIMESTAMP, default=datetime.utcnow),
+    UniqueConstraint("user_id", "beat_id", name="uq_likes_user_id_beat_id"),
+    # Recent likes window scanned by the trending refresh
+    Index("ix_likes_added_at", "added_at"),
+    # Keyset pagination of the liked tracks
+    Index("ix_likes_user_id_added_at", "user_id", "added_at", "beat_id"),
 )
 
 
@@ -21,4 +34,7 @@ carts = Table(
     Column("user_id", Integer, ForeignKey(users.c.user_id)),
     Column("beat_id", Integer, ForeignKey(beats.c.beat_id)),
     Column("added_at", TIMESTAMP, default=datetime.utcnow),
+    UniqueConstraint("user_id", "beat_id", name="uq_carts_user_id_beat_id"),
+    # Keyset pagination of the cart
+    Index("ix_carts_user_id_added_at", "user_id", "added_at", "beat_id"),
 )
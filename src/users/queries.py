@@ -0,0 +1,101 @@
+from typing import List
+
+from sqlalchemy import Integer, any_, bindparam, delete, func, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+
+from src.auth.models import users
+from src.beats.models import beats
+from src.users.models import carts, likes
+
+
+def user_profiles_query():
+    return select(
+        users.c.user_id,
+        users.c.email,
+        users.c.username,
+        users.c.profile_photo,
+        users.c.registered_at,
+        users.c.role_id,
+        users.c.total_likes,
+        users.c.total_plays,
+    )
+
+
+def user_profiles_by_ids_query(user_ids: List[int]):
+    return user_profiles_query().where(
+        users.c.user_id == any_(bindparam("user_ids", user_ids, ARRAY(Integer)))
+    )
+
+
+def _adjust_like_counters(changed, delta: int, name: str):
+    """
+    Shift ``beats.likes_count`` and the author's ``users.total_likes`` by
+    ``delta`` for the beats returned by the ``changed`` CTE.
+    """
+    changed_beat = (
+        update(beats)
+        .where(beats.c.beat_id.in_(select(changed.c.beat_id)))
+        .values(likes_count=func.greatest(beats.c.likes_count + delta, 0))
+        .returning(beats.c.beat_id, beats.c.user_id, beats.c.likes_count)
+        .cte(name)
+    )
+    changed_author = (
+        update(users)
+        .where(users.c.user_id == changed_beat.c.user_id)
+        .values(
+            total_likes=func.greatest(func.coalesce(users.c.total_likes, 0) + delta, 0)
+        )
+        .cte(f"{name}_author")
+    )
+    # Rows come from the beat, a beat without an author still answers
+    return select(
+        changed_beat.c.beat_id,
+        changed_beat.c.user_id.label("author_id"),
+        changed_beat.c.likes_count,
+    ).add_cte(changed_author)
+
+
+def like_statement(user_id: int, beat_id: int):
+    """
+    Insert a like and bump its counters in one statement.
+
+    Returns a row only if the like is new. A missing beat fails the foreign
+    key with an ``IntegrityError``.
+    """
+    inserted = (
+        insert(likes)
+        .values(user_id=user_id, beat_id=beat_id)
+        .on_conflict_do_nothing(index_elements=[likes.c.user_id, likes.c.beat_id])
+        .returning(likes.c.beat_id)
+        .cte("inserted_like")
+    )
+    return _adjust_like_counters(inserted, 1, "liked_beat")
+
+
+def unlike_statement(user_id: int, beat_id: int):
+    """Delete a like and decrement its counters, returns no row if there was none"""
+    deleted = (
+        delete(likes)
+        .where(likes.c.user_id == user_id, likes.c.beat_id == beat_id)
+        .returning(likes.c.beat_id)
+        .cte("deleted_like")
+    )
+    return _adjust_like_counters(deleted, -1, "unliked_beat")
+
+
+def add_to_cart_statement(user_id: int, beat_id: int):
+    """Returns a row only if the beat was not in the cart yet"""
+    return (
+        insert(carts)
+        .values(user_id=user_id, beat_id=beat_id)
+        .on_conflict_do_nothing(index_elements=[carts.c.user_id, carts.c.beat_id])
+        .returning(carts.c.beat_id)
+    )
+
+
+def remove_from_cart_statement(user_id: int, beat_id: int):
+    return (
+        delete(carts)
+        .where(carts.c.user_id == user_id, carts.c.beat_id == beat_id)
+        .returning(carts.c.beat_id)
+    )
@@ -0,0 +1,200 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.models import users
+from src.beats.models import beats
+from src.beats.prices import sync_prices_with_new_session
+from src.cache import response_cache
+from src.config import COUNTERS_RECONCILE_SECONDS
+from src.database import async_session_maker
+from src.users.authors import author_summaries
+from src.users.models import likes
+
+# Any constant works, it only has to be the same in every process
+RECONCILE_LOCK_KEY = 0x6265617473
+
+
+def repair_beat_likes_statement():
+    """Set ``beats.likes_count`` to the number of likes where it drifted"""
+    counted = (
+        select(beats.c.beat_id, func.count(likes.c.beat_id).label("likes"))
+        .select_from(beats.outerjoin(likes, likes.c.beat_id == beats.c.beat_id))
+        .group_by(beats.c.beat_id)
+        .subquery("counted")
+    )
+    return (
+        update(beats)
+        .where(
+            beats.c.beat_id == counted.c.beat_id,
+            beats.c.likes_count.is_distinct_from(counted.c.likes),
+        )
+        .values(likes_count=counted.c.likes)
+        .returning(beats.c.beat_id)
+    )
+
+
+def repair_author_totals_statement():
+    """Set the authors' totals to the sums over their beats where they drifted"""
+    totals = (
+        select(
+            users.c.user_id,
+            func.coalesce(func.sum(beats.c.likes_count), 0).label("likes"),
+            func.coalesce(func.sum(beats.c.plays_count), 0).label("plays"),
+        )
+        .select_from(users.outerjoin(beats, beats.c.user_id == users.c.user_id))
+        .group_by(users.c.user_id)
+        .subquery("totals")
+    )
+    return (
+        update(users)
+        .where(
+            users.c.user_id == totals.c.user_id,
+            users.c.total_likes.is_distinct_from(totals.c.likes)
+            | users.c.total_plays.is_distinct_from(totals.c.plays),
+        )
+        .values(total_likes=totals.c.likes, total_plays=totals.c.plays)
+        .returning(users.c.user_id)
+    )
+
+
+async def reconcile_counters(session: AsyncSession) -> Optional[Tuple[List, List]]:
+    """
+    Repair counter drift, returns the repaired beat and user ids, or None
+    when another process is already reconciling.
+
+    Runs in a repeatable read transaction: a like or a flush of plays
+    committed meanwhile makes it fail instead of being overwritten with a
+    stale count, and the next run repairs what is left.
+    """
+    await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    locked = await session.execute(
+        select(func.pg_try_advisory_xact_lock(RECONCILE_LOCK_KEY))
+    )
+    if not locked.scalar():
+        await session.rollback()
+        return None
+
+    beat_ids = (await session.execute(repair_beat_likes_statement())).scalars().all()
+    user_ids = (await session.execute(repair_author_totals_statement())).scalars().all()
+    await session.commit()
+    return beat_ids, user_ids
+
+
+async def reconcile_with_new_session() -> Optional[Tuple[List, List]]:
+    async with async_session_maker() as session:
+        return await reconcile_counters(session)
+
+
+class CounterReconciler:
+    """
+    Periodically repairs the like and play counters kept on beats and users,
+    and the numeric prices of beats when ``sync_prices`` is given.
+    """
+
+    def __init__(
+        self,
+        reconcile: Callable[
+            [], Awaitable[Optional[Tuple[List, List]]]
+        ] = reconcile_with_new_session,
+        interval: float = COUNTERS_RECONCILE_SECONDS,
+        sync_prices: Optional[Callable[[], Awaitable[Dict[str, Any]]]] = None,
+    ):
+        self._reconcile = reconcile
+        self._sync_prices = sync_prices
+        self.interval = interval
+        self.runs = 0
+        self.skipped = 0
+        self.errors = 0
+        self.repaired_beats = 0
+        self.repaired_users = 0
+        self.repaired_prices = 0
+        self.price_errors = 0
+        self.last_run_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self):
+        await self._run_price_sync()
+        try:
+            repaired = await self._reconcile()
+        except Exception:
+            self.errors += 1
+            logger.exception("Failed to reconcile counters")
+            return
+        self.last_run_at = time.time()
+        if repaired is None:
+            self.skipped += 1
+            return
+
+        beat_ids, user_ids = repaired
+        self.runs += 1
+        self.repaired_beats += len(beat_ids)
+        self.repaired_users += len(user_ids)
+        if beat_ids or user_ids:
+            logger.warning(
+                "Repaired counters of {} beats and {} users",
+                len(beat_ids),
+                len(user_ids),
+            )
+            author_summaries.invalidate(*user_ids)
+            await response_cache.invalidate(
+                *(f"beat:{beat_id}" for beat_id in beat_ids),
+                *(f"author:{user_id}" for user_id in user_ids),
+            )
+
+    async def _run_price_sync(self):
+        if self._sync_prices is None:
+            return
+        try:
+            synced = await self._sync_prices()
+        except Exception:
+            self.price_errors += 1
+            logger.exception("Failed to sync beat prices")
+            return
+        self.repaired_prices += synced["updated"]
+        if synced["updated"]:
+            logger.warning("Synced the numeric price of {} beats", synced["updated"])
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "repaired_beats": self.repaired_beats,
+            "repaired_users": self.repaired_users,
+            "repaired_prices": self.repaired_prices,
+            "price_errors": self.price_errors,
+            "last_run_at": self.last_run_at,
+        }
+
+    async def _run(self):
+        # Beats written before price_amount existed are backfilled right away
+        await self._run_price_sync()
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run_once()
+
+
+counter_reconciler = CounterReconciler(sync_prices=sync_prices_with_new_session)
+
+
+if __name__ == "__main__":
+    asyncio.run(counter_reconciler.run_once())
@@ -1,91 +1,205 @@
-from typing import List
+from datetime import datetime
+from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import and_, insert, select
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.auth.base_config import get_current_user
-from src.auth.models import User, users
+from src.auth.base_config import get_current_principal, get_optional_principal
+from src.auth.models import users
+from src.auth.principal import Principal
+from src.beats.cards import get_track_cards
+from src.beats.live import live_counters
 from src.beats.models import beats
-from src.beats.schemas import TrackCard
-from src.database import get_async_session
+from src.beats.queries import track_cards_query
+from src.beats.schemas import BatchRequest, TrackCard, track_card_rows
+from src.beats.trending import trending
+from src.cache import (
+    cache_headers,
+    not_modified,
+    response_cache,
+    track_tags,
+    versioned_etag,
+    with_headers,
+)
+from src.config import PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX, RECOMMENDATIONS_MAX
+from src.database import get_async_session, get_read_session
+from src.database.replica import stick_to_primary
+from src.pagination import Page, decode_cursor, fetch_page
+from src.recommendations import RecommendationsUnavailable, recommendation_index
+from src.serialization import json_page
+from src.users.authors import attach_authors, author_summaries
+from src.users.membership import add_membership_flags, membership_index, membership_tags
 from src.users.models import carts, likes
-from src.users.schemas import TrackCardForCart, TrackCardForLiked, UserGet
+from src.users.queries import (
+    add_to_cart_statement,
+    like_statement,
+    remove_from_cart_statement,
+    unlike_statement,
+    user_profiles_by_ids_query,
+    user_profiles_query,
+)
+from src.users.schemas import (
+    TrackCardForCart,
+    TrackCardForLiked,
+    UserGet,
+    UserGetBatch,
+    cart_card_rows,
+    liked_card_rows,
+)
 
 router = APIRouter(prefix="/user", tags=["User"])
 
 
+async def _fetch_one(session: AsyncSession, query) -> Optional[Dict[str, Any]]:
+    result = await session.execute(query)
+    row = result.mappings().first()
+    return dict(row) if row is not None else None
+
+
+async def _fetch_profiles(
+    session: AsyncSession, user_ids: List[int]
+) -> Dict[int, Dict[str, Any]]:
+    result = await session.execute(user_profiles_by_ids_query(user_ids))
+    return {row["user_id"]: dict(row) for row in result.mappings()}
+
+
 @router.get("/{user_id}", response_model=UserGet)
 async def get_user_profile(
-    user_id: int, session: AsyncSession = Depends(get_async_session)
+    user_id: int,
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_read_session),
 ) -> UserGet:
     try:
-        query = select(
-            users.c.user_id,
-            users.c.email,
-            users.c.username,
-            users.c.profile_photo,
-            users.c.registered_at,
-            users.c.role_id,
-            users.c.total_likes,
-            users.c.total_plays,
-        ).where(users.c.user_id == user_id)
-
-        result = await session.execute(query)
-        user_info = result.mappings().first()
+        headers = cache_headers(
+            await versioned_etag([f"author:{user_id}"], "profile", user_id)
+        )
+        unchanged = not_modified(request, headers)
+        if unchanged is not None:
+            return unchanged
+
+        query = user_profiles_query().where(users.c.user_id == user_id)
+
+        user_info = await response_cache.get_or_load(
+            f"user:{user_id}:profile",
+            lambda: _fetch_one(session, query),
+            tags=lambda _: [f"author:{user_id}"],
+        )
 
         if user_info is not None:
-            return user_info
+            return with_headers(user_info, response, headers)
         else:
             raise HTTPException(status_code=404, detail="User not found")
-    except:
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Error while retrieving user")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An error occurred while retrieving user.",
         )
 
 
-@router.get("/{user_id}/tracks", response_model=List[TrackCard])
+@router.post("/batch", response_model=UserGetBatch)
+async def get_users_batch(
+    batch: BatchRequest, session: AsyncSession = Depends(get_read_session)
+):
+    user_ids = list(dict.fromkeys(batch.ids))
+    try:
+        profiles = await response_cache.get_or_load_many(
+            user_ids,
+            key=lambda user_id: f"user:{user_id}:profile",
+            loader=lambda missing: _fetch_profiles(session, missing),
+            tags=lambda profile: [f"author:{profile['user_id']}"],
+        )
+    except Exception:
+        logger.exception("Error while retrieving users")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while retrieving users.",
+        )
+
+    return {
+        "items": [profiles[user_id] for user_id in user_ids if user_id in profiles],
+        "missing": [user_id for user_id in user_ids if user_id not in profiles],
+    }
+
+
+@router.get("/{user_id}/tracks", response_model=Page[TrackCard])
 async def get_user_tracks(
-    user_id: int, session: AsyncSession = Depends(get_async_session)
+    user_id: int,
+    request: Request,
+    response: Response,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    viewer: Optional[Principal] = Depends(get_optional_principal),
+    session: AsyncSession = Depends(get_read_session),
 ):
+    after = decode_cursor(cursor, (datetime.fromisoformat, int))
     try:
-        query = (
-            select(
-                beats,
-                users.c.username,
-                users.c.total_likes.label("user_total_likes"),
-                users.c.total_plays.label("user_total_plays"),
-                users.c.profile_photo,
-            )
-            .join(users, users.c.user_id == beats.c.user_id)
-            .filter(beats.c.user_id == user_id)
+        etag = await versioned_etag(
+            [f"author:{user_id}", *membership_tags(viewer)],
+            "tracks",
+            user_id,
+            limit,
+            cursor,
+            viewer and viewer.id,
         )
+        headers = cache_headers(etag, private=viewer is not None)
+        unchanged = not_modified(request, headers)
+        if unchanged is not None:
+            return unchanged
+
+        query = track_cards_query().filter(beats.c.user_id == user_id)
 
-        result = await session.execute(query)
-        user_tracks = result.mappings().fetchall()
+        user_tracks = await response_cache.get_or_load(
+            f"user:{user_id}:tracks:{limit}:{cursor}",
+            lambda: fetch_page(
+                session,
+                query,
+                order_by=[(beats.c.added_at, "added_at"), (beats.c.beat_id, "beat_id")],
+                limit=limit,
+                after=after,
+            ),
+            tags=lambda page: [f"author:{user_id}", *track_tags(page["items"])],
+        )
 
-        if not user_tracks:
+        if cursor is None and not user_tracks["items"]:
             raise HTTPException(
                 status_code=404, detail="User not found or no tracks available"
             )
-        return user_tracks
-    except:
+        items = await add_membership_flags(
+            session, viewer, await attach_authors(session, user_tracks["items"])
+        )
+        page = json_page({**user_tracks, "items": items}, track_card_rows)
+        return with_headers(page, response, headers)
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Error while retrieving tracks")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An error occurred while retrieving tracks.",
         )
 
 
-@router.get("/{user_id}/cart", response_model=List[TrackCardForCart])
+@router.get("/{user_id}/cart", response_model=Page[TrackCardForCart])
 async def get_user_cart(
-    user_id: int, session: AsyncSession = Depends(get_async_session)
+    user_id: int,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    viewer: Optional[Principal] = Depends(get_optional_principal),
+    session: AsyncSession = Depends(get_read_session),
 ):
+    after = decode_cursor(cursor, (datetime.fromisoformat, int))
     try:
         query = (
             select(
                 carts.c.beat_id,
-                carts.c.user_id,
+                beats.c.user_id,
                 carts.c.added_at.label("added_to_cart_at"),
                 beats.c.title,
                 beats.c.price,
@@ -95,40 +209,59 @@ async def get_user_cart(
                 beats.c.added_at,
                 beats.c.likes_count,
                 beats.c.plays_count,
-                users.c.username,
-                users.c.total_likes.label("user_total_likes"),
-                users.c.total_plays.label("user_total_plays"),
-                users.c.profile_photo,
+                beats.c.duration_seconds,
             )
-            .join(users, users.c.user_id == carts.c.user_id)
             .join(beats, beats.c.beat_id == carts.c.beat_id)
             .filter(carts.c.user_id == user_id)
         )
 
-        result = await session.execute(query)
-        user_cart_tracks = result.mappings().fetchall()
+        user_cart_tracks = await response_cache.get_or_load(
+            f"user:{user_id}:cart:{limit}:{cursor}",
+            lambda: fetch_page(
+                session,
+                query,
+                order_by=[
+                    (carts.c.added_at, "added_to_cart_at"),
+                    (carts.c.beat_id, "beat_id"),
+                ],
+                limit=limit,
+                after=after,
+            ),
+            tags=lambda page: [f"cart:{user_id}", *track_tags(page["items"])],
+        )
 
-        if not user_cart_tracks:
+        if cursor is None and not user_cart_tracks["items"]:
             raise HTTPException(
                 status_code=404, detail="User not found or no tracks available"
             )
-        return user_cart_tracks
-    except:
+        items = await add_membership_flags(
+            session, viewer, await attach_authors(session, user_cart_tracks["items"])
+        )
+        return json_page({**user_cart_tracks, "items": items}, cart_card_rows)
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Error while retrieving cart")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An error occurred while retrieving cart.",
         )
 
 
-@router.get("/{user_id}/liked", response_model=List[TrackCardForLiked])
+@router.get("/{user_id}/liked", response_model=Page[TrackCardForLiked])
 async def get_user_liked(
-    user_id: int, session: AsyncSession = Depends(get_async_session)
+    user_id: int,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    viewer: Optional[Principal] = Depends(get_optional_principal),
+    session: AsyncSession = Depends(get_read_session),
 ):
+    after = decode_cursor(cursor, (datetime.fromisoformat, int))
     try:
         query = (
             select(
                 likes.c.beat_id,
-                likes.c.user_id,
+                beats.c.user_id,
                 likes.c.added_at.label("added_to_likes_at"),
                 beats.c.title,
                 beats.c.price,
@@ -138,36 +271,84 @@ async def get_user_liked(
                 beats.c.added_at,
                 beats.c.likes_count,
                 beats.c.plays_count,
-                users.c.username,
-                users.c.total_likes.label("user_total_likes"),
-                users.c.total_plays.label("user_total_plays"),
-                users.c.profile_photo,
+                beats.c.duration_seconds,
             )
-            .join(users, users.c.user_id == likes.c.user_id)
             .join(beats, beats.c.beat_id == likes.c.beat_id)
             .filter(likes.c.user_id == user_id)
         )
 
-        result = await session.execute(query)
-        user_liked_tracks = result.mappings().fetchall()
+        user_liked_tracks = await response_cache.get_or_load(
+            f"user:{user_id}:liked:{limit}:{cursor}",
+            lambda: fetch_page(
+                session,
+                query,
+                order_by=[
+                    (likes.c.added_at, "added_to_likes_at"),
+                    (likes.c.beat_id, "beat_id"),
+                ],
+                limit=limit,
+                after=after,
+            ),
+            tags=lambda page: [f"likes:{user_id}", *track_tags(page["items"])],
+        )
 
-        if not user_liked_tracks:
+        if cursor is None and not user_liked_tracks["items"]:
             raise HTTPException(
                 status_code=404, detail="User not found or no tracks available"
             )
-        return user_liked_tracks
-    except:
+        items = await add_membership_flags(
+            session, viewer, await attach_authors(session, user_liked_tracks["items"])
+        )
+        return json_page({**user_liked_tracks, "items": items}, liked_card_rows)
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Error while retrieving liked tracks")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An error occurred while retrieving liked tracks.",
         )
 
 
+@router.get("/{user_id}/recommended", response_model=Page[TrackCard])
+async def get_user_recommended(
+    user_id: int,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=RECOMMENDATIONS_MAX),
+    viewer: Optional[Principal] = Depends(get_optional_principal),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """Beats closest to the ones the user liked, leaving out liked and carted ones"""
+    try:
+        membership = await membership_index.get(session, user_id)
+        recommended = recommendation_index.recommend(
+            membership.liked, limit, exclude=membership.cart
+        )
+        beat_ids = [beat_id for beat_id, _ in recommended]
+        cards = await get_track_cards(session, beat_ids, viewer)
+    except RecommendationsUnavailable:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Recommendations are not available yet",
+        )
+    except Exception:
+        logger.exception("Error while retrieving recommended tracks")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while retrieving recommended tracks.",
+        )
+    page = {
+        "items": [cards[beat_id] for beat_id in beat_ids if beat_id in cards],
+        "next_cursor": None,
+    }
+    return json_page(page, track_card_rows)
+
+
 @router.post("/{user_id}/like/{beat_id}")
 async def like_beat(
     user_id: int,
     beat_id: int,
-    current_user: User = Depends(get_current_user),  # Get current user
+    response: Response,
+    current_user: Principal = Depends(get_current_principal),
     session: AsyncSession = Depends(get_async_session),
 ):
     if current_user.id != user_id:
@@ -176,40 +357,81 @@ async def like_beat(
         )
 
     try:
-        # Check if the beat exists
-        beat_exists = await session.execute(
-            select(beats).where(beats.c.beat_id == beat_id)
+        result = await session.execute(like_statement(user_id, beat_id))
+        liked = result.mappings().first()
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(status_code=404, detail="Beat not found")
+    except Exception:
+        logger.exception("Error while liking the beat")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while liking the beat.",
         )
-        if not beat_exists.scalar_one_or_none():
-            raise HTTPException(status_code=404, detail="Beat not found")
 
-        # Check if the user already liked the beat
-        like_exists = await session.execute(
-            select(likes).where(
-                and_(likes.c.user_id == user_id, likes.c.beat_id == beat_id)
-            )
+    if liked is None:
+        raise HTTPException(status_code=400, detail="Already liked this beat")
+
+    trending.record_like(beat_id)
+    author_summaries.add_counts(liked["author_id"], likes=1)
+    membership_index.add_like(user_id, beat_id)
+    recommendation_index.record_like(user_id, beat_id)
+    live_counters.publish(beat_id, likes=liked["likes_count"])
+    stick_to_primary(response)
+    await response_cache.invalidate(
+        f"beat:{beat_id}", f"author:{liked['author_id']}", f"likes:{user_id}"
+    )
+    await response_cache.bump_versions("trending")
+    return {"message": "Beat liked successfully"}
+
+
+@router.delete("/{user_id}/like/{beat_id}")
+async def unlike_beat(
+    user_id: int,
+    beat_id: int,
+    response: Response,
+    current_user: Principal = Depends(get_current_principal),
+    session: AsyncSession = Depends(get_async_session),
+):
+    if current_user.id != user_id:
+        raise HTTPException(
+            status_code=403, detail="Not authorized to perform action for this user"
         )
-        if like_exists.scalar_one_or_none():
-            raise HTTPException(status_code=400, detail="Already liked this beat")
 
-        # Add like
-        new_like = insert(likes).values(user_id=user_id, beat_id=beat_id)
-        await session.execute(new_like)
+    try:
+        result = await session.execute(unlike_statement(user_id, beat_id))
+        unliked = result.mappings().first()
         await session.commit()
-
-        return {"message": "Beat liked successfully"}
-    except:
+    except Exception:
+        logger.exception("Error while unliking the beat")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="An error occurred while liking the beat.",
+            detail="An error occurred while unliking the beat.",
         )
 
+    if unliked is None:
+        raise HTTPException(status_code=404, detail="Beat is not liked")
+
+    trending.record_like(beat_id, delta=-1)
+    author_summaries.add_counts(unliked["author_id"], likes=-1)
+    membership_index.remove_like(user_id, beat_id)
+    recommendation_index.record_like(user_id, beat_id, delta=-1)
+    live_counters.publish(beat_id, likes=unliked["likes_count"])
+    stick_to_primary(response)
+    await response_cache.invalidate(
+        f"beat:{beat_id}", f"author:{unliked['author_id']}", f"likes:{user_id}"
+    )
+    await response_cache.bump_versions("trending")
+    return {"message": "Beat unliked successfully"}
+
 
 @router.post("/{user_id}/add_to_cart/{beat_id}")
 async def add_beat_to_cart(
     user_id: int,
     beat_id: int,
-    current_user: User = Depends(get_current_user),  # Get current user
+    response: Response,
+    current_user: Principal = Depends(get_current_principal),
     session: AsyncSession = Depends(get_async_session),
 ):
     if current_user.id != user_id:
@@ -218,32 +440,56 @@ async def add_beat_to_cart(
         )
 
     try:
-        # Check if the beat exists
-        beat_exists = await session.execute(
-            select(beats).where(beats.c.beat_id == beat_id)
+        result = await session.execute(add_to_cart_statement(user_id, beat_id))
+        added = result.first()
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(status_code=404, detail="Beat not found")
+    except Exception:
+        logger.exception("Error while adding the beat to cart")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while adding the beat to cart.",
         )
-        if not beat_exists.scalar_one_or_none():
-            raise HTTPException(status_code=404, detail="Beat not found")
 
-        # Check if the user already have the beat in his cart
-        beat_in_cart = await session.execute(
-            select(carts).where(
-                and_(carts.c.user_id == user_id, carts.c.beat_id == beat_id)
-            )
+    if added is None:
+        raise HTTPException(status_code=400, detail="Already added this beat to cart")
+
+    membership_index.add_to_cart(user_id, beat_id)
+    stick_to_primary(response)
+    await response_cache.invalidate(f"cart:{user_id}")
+    return {"message": "Beat added to cart successfully"}
+
+
+@router.delete("/{user_id}/cart/{beat_id}")
+async def remove_beat_from_cart(
+    user_id: int,
+    beat_id: int,
+    response: Response,
+    current_user: Principal = Depends(get_current_principal),
+    session: AsyncSession = Depends(get_async_session),
+):
+    if current_user.id != user_id:
+        raise HTTPException(
+            status_code=403, detail="Not authorized to perform action for this user"
         )
-        if beat_in_cart.scalar_one_or_none():
-            raise HTTPException(
-                status_code=400, detail="Already added this beat to cart"
-            )
 
-        # Add beat to cart
-        new_beat_in_cart = insert(carts).values(user_id=user_id, beat_id=beat_id)
-        await session.execute(new_beat_in_cart)
+    try:
+        result = await session.execute(remove_from_cart_statement(user_id, beat_id))
+        removed = result.first()
         await session.commit()
-
-        return {"message": "Beat added to cart successfully"}
-    except:
+    except Exception:
+        logger.exception("Error while removing the beat from cart")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="An error occurred while adding the beat to cart.",
+            detail="An error occurred while removing the beat from cart.",
         )
+
+    if removed is None:
+        raise HTTPException(status_code=404, detail="Beat is not in cart")
+
+    membership_index.remove_from_cart(user_id, beat_id)
+    stick_to_primary(response)
+    await response_cache.invalidate(f"cart:{user_id}")
+    return {"message": "Beat removed from cart successfully"}
@@ -1,8 +1,11 @@
 from datetime import datetime
+from typing import Dict, List
 
-from pydantic import BaseModel
+from pydantic import BaseModel, validator
 
 from src.beats.schemas import TrackCard
+from src.images import variant_urls
+from src.serialization import RowSerializer
 
 
 class UserGet(BaseModel):
@@ -14,6 +17,16 @@ class UserGet(BaseModel):
     role_id: int
     total_likes: int
     total_plays: int
+    profile_photo_variants: Dict[int, str] = {}
+
+    @validator("profile_photo_variants", always=True)
+    def add_profile_photo_variants(cls, value, values):
+        return value or variant_urls(values.get("profile_photo"))
+
+
+class UserGetBatch(BaseModel):
+    items: List[UserGet]
+    missing: List[int]
 
 
 class TrackCardForLiked(TrackCard):
@@ -22,3 +35,7 @@ class TrackCardForLiked(TrackCard):
 
 class TrackCardForCart(TrackCard):
     added_to_cart_at: datetime
+
+
+liked_card_rows = RowSerializer(TrackCardForLiked)
+cart_card_rows = RowSerializer(TrackCardForCart)
@@ -0,0 +1,150 @@
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from src.users.authors import AuthorSummaryCache, attach_authors, author_summaries
+from src.users.reconcile import (
+    CounterReconciler,
+    repair_author_totals_statement,
+    repair_beat_likes_statement,
+)
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def mappings(self):
+        return iter(self._rows)
+
+
+class FakeSession:
+    """Answers author summary queries from a dict of users"""
+
+    def __init__(self, authors):
+        self.authors = authors
+        self.queries = []
+
+    async def execute(self, statement):
+        user_ids = statement.compile().params["user_ids"]
+        self.queries.append(list(user_ids))
+        return FakeResult(
+            [
+                {
+                    "user_id": user_id,
+                    "username": self.authors[user_id],
+                    "user_total_likes": 10,
+                    "user_total_plays": 100,
+                    "profile_photo": None,
+                }
+                for user_id in user_ids
+                if user_id in self.authors
+            ]
+        )
+
+
+@pytest.mark.asyncio
+class TestAuthorSummaryCache:
+    async def test_loads_missing_authors_in_one_query(self):
+        cache = AuthorSummaryCache(ttl=60)
+        session = FakeSession({1: "a", 2: "b"})
+
+        found = await cache.get_many(session, [1, 2, 1])
+        assert found[1]["username"] == "a" and found[2]["username"] == "b"
+        await cache.get_many(session, [2, 1])
+
+        assert session.queries == [[1, 2]]
+        assert cache.stats()["hits"] == 2
+
+    async def test_add_counts_shifts_cached_totals(self):
+        cache = AuthorSummaryCache(ttl=60)
+        session = FakeSession({1: "a"})
+        await cache.get_many(session, [1])
+
+        cache.add_counts(1, likes=1, plays=5)
+        cache.add_counts(2, likes=1)
+
+        summary = (await cache.get_many(session, [1]))[1]
+        assert summary["user_total_likes"] == 11
+        assert summary["user_total_plays"] == 105
+        assert len(session.queries) == 1
+
+    async def test_expired_and_invalidated_entries_are_reloaded(self):
+        cache = AuthorSummaryCache(ttl=0)
+        session = FakeSession({1: "a"})
+        await cache.get_many(session, [1])
+        await cache.get_many(session, [1])
+        assert len(session.queries) == 2
+
+        cache = AuthorSummaryCache(ttl=60)
+        await cache.get_many(session, [1])
+        cache.invalidate(1)
+        await cache.get_many(session, [1])
+        assert session.queries[-2:] == [[1], [1]]
+
+    async def test_least_recently_used_entries_are_evicted(self):
+        cache = AuthorSummaryCache(ttl=60, max_entries=2)
+        session = FakeSession({1: "a", 2: "b", 3: "c"})
+        await cache.get_many(session, [1, 2])
+        await cache.get_many(session, [1])
+        await cache.get_many(session, [3])
+
+        assert cache.stats()["entries"] == 2
+        await cache.get_many(session, [1])
+        assert session.queries[-1] == [3]
+
+
+@pytest.mark.asyncio
+async def test_attach_authors_drops_beats_without_author():
+    author_summaries.clear()
+    session = FakeSession({1: "a"})
+    rows = [{"beat_id": 10, "user_id": 1}, {"beat_id": 11, "user_id": 2}]
+
+    cards = await attach_authors(session, rows)
+
+    assert cards == [
+        {
+            "beat_id": 10,
+            "user_id": 1,
+            "username": "a",
+            "user_total_likes": 10,
+            "user_total_plays": 100,
+            "profile_photo": None,
+        }
+    ]
+    author_summaries.clear()
+
+
+@pytest.mark.asyncio
+class TestCounterReconciler:
+    async def test_counts_repairs_and_skips(self):
+        results = [([1, 2], [7]), None, ([], [])]
+
+        async def reconcile():
+            return results.pop(0)
+
+        reconciler = CounterReconciler(reconcile, interval=60)
+        for _ in range(3):
+            await reconciler.run_once()
+
+        stats = reconciler.describe()
+        assert stats["runs"] == 2
+        assert stats["skipped"] == 1
+        assert stats["repaired_beats"] == 2
+        assert stats["repaired_users"] == 1
+
+    async def test_failures_are_counted(self):
+        async def reconcile():
+            raise ConnectionError("database is down")
+
+        reconciler = CounterReconciler(reconcile, interval=60)
+        await reconciler.run_once()
+        assert reconciler.describe()["errors"] == 1
+
+
+def test_repair_statements_only_touch_drifted_rows():
+    dialect = postgresql.dialect()
+    beats_sql = str(repair_beat_likes_statement().compile(dialect=dialect))
+    users_sql = str(repair_author_totals_statement().compile(dialect=dialect))
+
+    assert "IS DISTINCT FROM" in beats_sql and "RETURNING" in beats_sql
+    assert "IS DISTINCT FROM" in users_sql and "sum(beats.plays_count)" in users_sql
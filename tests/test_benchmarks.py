@@ -0,0 +1,65 @@
+from benchmarks.api import Catalog, Recorder, compare_with_baseline, summarize
+from benchmarks.seed import CatalogSize, generate_catalog
+
+
+def test_catalog_is_deterministic_and_consistent():
+    size = CatalogSize(users=50, producers=5, beats=100, likes=400, carts=30)
+    rows = generate_catalog(size, seed=1)
+
+    assert len(rows["users"]) == 50 and len(rows["beats"]) == 100
+    assert len(rows["likes"]) == 400 and len(rows["carts"]) == 30
+    assert {row["user_id"] for row in rows["beats"]} <= set(range(1, 6))
+    pairs = {(row["user_id"], row["beat_id"]) for row in rows["likes"]}
+    assert len(pairs) == 400
+    assert all(1 <= beat_id <= 100 for _, beat_id in pairs)
+
+    again = generate_catalog(size, seed=1)
+    assert [row["title"] for row in again["beats"]] == [
+        row["title"] for row in rows["beats"]
+    ]
+    assert again["likes"][0]["beat_id"] == rows["likes"][0]["beat_id"]
+
+    catalog = Catalog(rows)
+    assert len(catalog.popular_beat_ids) == 5
+    assert sum(len(liked) for liked in catalog.likes.values()) == 400
+
+
+def test_summarize_reports_percentiles_per_endpoint():
+    recorder = Recorder()
+    recorder.record("GET /a", 1.0, True)
+    recorder.recording = True
+    for ms in range(1, 101):
+        recorder.record("GET /a", ms / 1000, ms != 100)
+    recorder.record("GET /b", 0.005, True)
+
+    summary = summarize(recorder, duration=10)
+
+    assert summary["GET /a"]["requests"] == 100
+    assert summary["GET /a"]["rps"] == 10
+    assert summary["GET /a"]["errors"] == 1
+    assert round(summary["GET /a"]["p50_ms"]) == 50
+    assert round(summary["GET /a"]["p99_ms"]) == 99
+    assert summary["all"]["requests"] == 101
+    assert summary["GET /b"]["p95_ms"] == 5
+
+
+def test_baseline_comparison_ignores_noise():
+    baseline = {
+        "GET /a": {"rps": 100, "errors": 0, "p50_ms": 1, "p95_ms": 10, "p99_ms": 20}
+    }
+    noisy = {
+        "GET /a": {"rps": 90, "errors": 0, "p50_ms": 2.5, "p95_ms": 12, "p99_ms": 24}
+    }
+    slower = {
+        "GET /a": {"rps": 60, "errors": 2, "p50_ms": 1, "p95_ms": 20, "p99_ms": 20}
+    }
+
+    assert compare_with_baseline(noisy, baseline, tolerance=0.25) == []
+    assert compare_with_baseline(slower, baseline, tolerance=0.25) == [
+        "GET /a: p95_ms 20.0 > 10.0",
+        "GET /a: rps 60.0 < 100.0",
+        "GET /a: errors 2 > 0",
+    ]
+    assert compare_with_baseline({}, baseline, tolerance=0.25) == [
+        "GET /a: no requests measured"
+    ]
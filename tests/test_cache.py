@@ -0,0 +1,227 @@
+import fnmatch
+from datetime import datetime
+
+import pytest
+
+from src.cache import LRUCacheBackend, ResponseCache, SharedCacheBackend, track_tags
+
+
+class FakeRedis:
+    """Local stand-in for the subset of redis.asyncio used by the shared cache"""
+
+    def __init__(self):
+        self.values = {}
+        self.sets = {}
+        self.ttls = {}
+        self.round_trips = 0
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    async def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+            self.sets.pop(key, None)
+
+    async def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(members)
+
+    async def smembers(self, key):
+        return set(self.sets.get(key, ()))
+
+    async def expire(self, key, seconds):
+        self.ttls[key] = seconds
+        return True
+
+    async def incr(self, key):
+        self.values[key] = int(self.values.get(key, 0)) + 1
+        return self.values[key]
+
+    async def keys(self, pattern):
+        return [
+            key for key in [*self.values, *self.sets] if fnmatch.fnmatch(key, pattern)
+        ]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Queues commands and runs them against ``redis`` in one round trip"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((getattr(self.redis, name), args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self):
+        self.redis.round_trips += 1
+        return [
+            await command(*args, **kwargs) for command, args, kwargs in self.commands
+        ]
+
+
+@pytest.mark.asyncio
+class TestLRUCacheBackend:
+    async def test_hit_and_miss(self):
+        backend = LRUCacheBackend(max_entries=10)
+        assert await backend.get("a") is None
+
+        await backend.set("a", [1], ttl=60)
+        assert await backend.get("a") == [1]
+        assert backend.stats.hits == 1
+        assert backend.stats.misses == 1
+
+    async def test_evicts_least_recently_used(self):
+        backend = LRUCacheBackend(max_entries=2)
+        await backend.set("a", 1, ttl=60)
+        await backend.set("b", 2, ttl=60)
+        await backend.get("a")
+        await backend.set("c", 3, ttl=60)
+
+        assert await backend.get("b") is None
+        assert await backend.get("a") == 1
+        assert backend.stats.evictions == 1
+        assert backend.size() == 2
+
+    async def test_expired_entry_is_a_miss(self):
+        backend = LRUCacheBackend(max_entries=10)
+        await backend.set("a", 1, ttl=0)
+
+        assert await backend.get("a") is None
+        assert backend.stats.expirations == 1
+        assert backend.size() == 0
+
+    async def test_invalidate_tags(self):
+        backend = LRUCacheBackend(max_entries=10)
+        await backend.set("liked", 1, ttl=60, tags=["beat:1", "likes:5"])
+        await backend.set("tracks", 2, ttl=60, tags=["beat:2"])
+
+        await backend.invalidate_tags(["beat:1"])
+
+        assert await backend.get("liked") is None
+        assert await backend.get("tracks") == 2
+        assert backend.stats.invalidations == 1
+
+
+@pytest.mark.asyncio
+class TestSharedCacheBackend:
+    async def test_roundtrip_and_invalidation(self):
+        backend = SharedCacheBackend(FakeRedis())
+        added_at = datetime(2024, 1, 1)
+        await backend.set("k", [{"added_at": added_at}], ttl=60, tags=["cart:1"])
+
+        assert await backend.get("k") == [{"added_at": added_at.isoformat()}]
+
+        await backend.invalidate_tags(["cart:1"])
+        assert await backend.get("k") is None
+        assert backend.stats.as_dict()["hits"] == 1
+
+
+@pytest.mark.asyncio
+class TestResponseCache:
+    async def test_loader_called_once(self):
+        cache = ResponseCache(LRUCacheBackend(), ttl=60)
+        calls = []
+
+        async def loader():
+            calls.append(1)
+            return [{"beat_id": 1, "user_id": 2}]
+
+        for _ in range(3):
+            rows = await cache.get_or_load("k", loader, tags=track_tags)
+
+        assert rows == [{"beat_id": 1, "user_id": 2}]
+        assert len(calls) == 1
+
+        await cache.invalidate("author:2")
+        await cache.get_or_load("k", loader, tags=track_tags)
+        assert len(calls) == 2
+
+    @pytest.mark.parametrize(
+        "backend", [LRUCacheBackend(), SharedCacheBackend(FakeRedis())]
+    )
+    async def test_batch_shares_entries_with_single_lookups(self, backend):
+        cache = ResponseCache(backend, ttl=60)
+        requested = []
+
+        async def load_many(ids):
+            requested.append(ids)
+            return {id_: {"beat_id": id_, "user_id": 1} for id_ in ids if id_ != 3}
+
+        async def load_one():
+            raise AssertionError("Should be served from the batch entries")
+
+        found = await cache.get_or_load_many(
+            [1, 2, 3], key=str, loader=load_many, tags=lambda card: track_tags([card])
+        )
+        assert sorted(found) == [1, 2]
+
+        assert await cache.get_or_load("2", load_one, tags=track_tags) == {
+            "beat_id": 2,
+            "user_id": 1,
+        }
+
+        await cache.get_or_load_many(
+            [2, 3], key=str, loader=load_many, tags=lambda card: track_tags([card])
+        )
+        assert requested == [[1, 2, 3], [3]]
+
+    async def test_empty_result_is_not_cached(self):
+        cache = ResponseCache(LRUCacheBackend(), ttl=60)
+
+        async def loader():
+            return []
+
+        await cache.get_or_load("k", loader, tags=track_tags)
+        assert cache.stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+class TestVersions:
+    @pytest.mark.parametrize(
+        "backend", [LRUCacheBackend(), SharedCacheBackend(FakeRedis())]
+    )
+    async def test_invalidation_bumps_versions(self, backend):
+        cache = ResponseCache(backend, ttl=60)
+        before = await cache.versions(["author:1", "author:2"])
+
+        await cache.invalidate("author:1")
+        await cache.bump_versions("author:1")
+
+        after = await cache.versions(["author:1", "author:2"])
+        assert after[0] != before[0]
+        assert after[1] == before[1]
+
+    async def test_shared_versions_are_bumped_in_one_round_trip(self):
+        redis = FakeRedis()
+        backend = SharedCacheBackend(redis, prefix="p:", version_ttl=60)
+
+        await backend.incr_versions(["a", "b"])
+        await backend.incr_versions([])
+
+        assert await backend.get_versions(["a", "b", "c"]) == ["1", "1", "0"]
+        assert redis.round_trips == 1
+        assert redis.ttls == {"p:version:a": 60, "p:version:b": 60}
+
+    async def test_evicted_counters_do_not_repeat_versions(self):
+        backend = LRUCacheBackend(max_versions=1)
+        await backend.incr_versions(["a"])
+        (first,) = await backend.get_versions(["a"])
+
+        await backend.incr_versions(["b"])
+        await backend.incr_versions(["a"])
+
+        assert await backend.get_versions(["a"]) != [first]
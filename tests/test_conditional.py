@@ -0,0 +1,86 @@
+from fastapi import FastAPI, Request, Response
+from fastapi.testclient import TestClient
+
+from src.cache import (
+    cache_headers,
+    etag_matches,
+    make_etag,
+    not_modified,
+    response_cache,
+    versioned_etag,
+    with_headers,
+)
+from src.cache.cache import LRUCacheBackend, SharedCacheBackend
+from src.serialization import FastJSONResponse
+from tests.test_cache import FakeRedis
+
+
+def test_etag_matching_is_weak_and_accepts_lists():
+    etag = make_etag("profile", 1)
+    assert etag.startswith('W/"')
+    assert etag_matches(etag, etag)
+    assert etag_matches(etag[2:], etag)
+    assert etag_matches(f'"other", {etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches(make_etag("profile", 2), etag)
+
+
+def test_public_and_private_policies():
+    public = cache_headers('W/"x"')
+    assert public["Cache-Control"].startswith("public, max-age=")
+    assert "stale-while-revalidate=" in public["Cache-Control"]
+    assert cache_headers('W/"x"', private=True)["Cache-Control"] == "private, no-cache"
+    assert public["Vary"] == "Cookie"
+
+
+async def test_versioned_etag_changes_on_writes():
+    before = await versioned_etag(["author:77"], "profile", 77)
+    assert await versioned_etag(["author:77"], "profile", 77) == before
+
+    await response_cache.invalidate("author:77")
+    assert await versioned_etag(["author:77"], "profile", 77) != before
+
+
+async def test_process_counters_only_count_without_a_shared_backend(monkeypatch):
+    monkeypatch.setattr(response_cache, "backend", LRUCacheBackend())
+    assert await versioned_etag(
+        ["trending"], "trending", local_versions=[1]
+    ) != await versioned_etag(["trending"], "trending", local_versions=[2])
+
+    # Two workers at the same local version may serve different rankings
+    monkeypatch.setattr(response_cache, "backend", SharedCacheBackend(FakeRedis()))
+    before = await versioned_etag(["trending"], "trending", local_versions=[1])
+    assert await versioned_etag(["trending"], "trending", local_versions=[2]) == before
+
+    await response_cache.bump_versions("trending")
+    assert await versioned_etag(["trending"], "trending", local_versions=[1]) != before
+
+
+def test_endpoint_answers_304_before_loading():
+    app = FastAPI()
+    loads = []
+
+    @app.get("/item")
+    async def item(request: Request, response: Response, fast: bool = False):
+        headers = cache_headers(make_etag("item"))
+        unchanged = not_modified(request, headers)
+        if unchanged is not None:
+            return unchanged
+        loads.append(1)
+        result = FastJSONResponse({"ok": True}) if fast else {"ok": True}
+        return with_headers(result, response, headers)
+
+    client = TestClient(app)
+    for params in ({}, {"fast": "true"}):
+        first = client.get("/item", params=params)
+        assert first.status_code == 200
+        assert first.headers["etag"] == make_etag("item")
+
+        again = client.get(
+            "/item", params=params, headers={"If-None-Match": first.headers["etag"]}
+        )
+        assert again.status_code == 304
+        assert again.content == b""
+        assert again.headers["cache-control"] == first.headers["cache-control"]
+    assert len(loads) == 2
@@ -0,0 +1,144 @@
+import asyncio
+import io
+
+import pytest
+from fastapi import HTTPException
+
+from src.config import IMAGE_SIZES
+from src.images import (
+    VariantGenerator,
+    ensure_variant,
+    generate_variants,
+    images,
+    is_image_key,
+    router,
+    variant_key,
+    variant_urls,
+)
+from src.images.router import get_image_variant
+from src.storage import LocalStorage
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def make_png(width: int, height: int) -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", (width, height), "red").save(output, format="PNG")
+    return output.getvalue()
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = LocalStorage(tmp_path)
+    storage.save("covers/beat.png", make_png(2000, 1000))
+    return storage
+
+
+def test_variant_urls():
+    urls = variant_urls("covers/my beat.png")
+
+    assert sorted(urls) == sorted(IMAGE_SIZES)
+    assert urls[64] == "/image/64/covers/my%20beat.png"
+    assert variant_urls("") == {}
+
+
+def test_variant_fits_the_size(storage):
+    key = ensure_variant(storage, "covers/beat.png", 256)
+
+    assert key == variant_key("covers/beat.png", 256)
+    with Image.open(storage.open(key)) as image:
+        assert image.format == "WEBP"
+        assert image.size == (256, 128)
+
+
+def test_sources_sharing_a_stem_get_their_own_variants(storage):
+    storage.save("covers/beat.jpg", make_png(40, 40))
+
+    png = ensure_variant(storage, "covers/beat.png", 64)
+    jpg = ensure_variant(storage, "covers/beat.jpg", 64)
+
+    assert png != jpg
+    with Image.open(storage.open(png)) as image:
+        assert image.size == (64, 32)
+    with Image.open(storage.open(jpg)) as image:
+        assert image.size == (40, 40)
+
+
+def test_small_images_are_not_upscaled(storage):
+    storage.save("covers/small.png", make_png(40, 40))
+
+    with Image.open(
+        storage.open(ensure_variant(storage, "covers/small.png", 64))
+    ) as image:
+        assert image.size == (40, 40)
+
+
+def test_generate_variants_on_upload(storage):
+    keys = generate_variants(storage, "covers/beat.png")
+
+    assert keys == [variant_key("covers/beat.png", size) for size in IMAGE_SIZES]
+    assert all(storage.exists(key) for key in keys)
+
+
+async def test_concurrent_requests_share_one_resize(storage, monkeypatch):
+    calls = []
+    original = ensure_variant
+
+    def counting_ensure_variant(*args):
+        calls.append(args)
+        return original(*args)
+
+    monkeypatch.setattr("src.images.images.ensure_variant", counting_ensure_variant)
+    generator = VariantGenerator(storage)
+
+    keys = await asyncio.gather(
+        *(generator.get("covers/beat.png", 1024) for _ in range(5))
+    )
+
+    assert len(set(keys)) == 1
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize(
+    "key",
+    [
+        "backend/images/beats/1.jpg",
+        "backend/images/profiles/2.PNG",
+    ],
+)
+def test_image_keys(key):
+    assert is_image_key(key)
+
+
+@pytest.mark.parametrize(
+    "key",
+    [
+        ".env",
+        "backend/images/../../.env",
+        "backend/images/beats/notes.txt",
+        "backend/imagesx/1.jpg",
+        "/etc/passwd.png",
+        "backend/beats_src/1.mp3",
+        "backend/images",
+    ],
+)
+def test_other_files_are_not_image_keys(key):
+    assert not is_image_key(key)
+
+
+@pytest.mark.asyncio
+class TestImageRouter:
+    async def test_other_files_are_not_served(self):
+        with pytest.raises(HTTPException) as raised:
+            await get_image_variant(64, ".env", request=None)
+        assert raised.value.status_code == 404
+
+    async def test_originals_are_not_served_without_pillow(self, tmp_path, monkeypatch):
+        storage = LocalStorage(tmp_path)
+        storage.save("backend/images/beats/1.png", make_png(100, 100))
+        monkeypatch.setattr(router, "variant_generator", VariantGenerator(storage))
+        monkeypatch.setattr(images, "Image", None)
+
+        with pytest.raises(HTTPException) as raised:
+            await get_image_variant(64, "backend/images/beats/1.png", request=None)
+        assert raised.value.status_code == 503
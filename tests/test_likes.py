@@ -0,0 +1,153 @@
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+
+from src.auth.principal import Principal
+from src.users.queries import (
+    add_to_cart_statement,
+    like_statement,
+    remove_from_cart_statement,
+    unlike_statement,
+)
+from src.users.router import (
+    add_beat_to_cart,
+    like_beat,
+    remove_beat_from_cart,
+    unlike_beat,
+)
+
+
+def compile_sql(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+class TestStatements:
+    def test_like_inserts_and_bumps_both_counters(self):
+        sql = compile_sql(like_statement(1, 2))
+
+        assert sql.startswith("WITH inserted_like AS")
+        assert "ON CONFLICT (user_id, beat_id) DO NOTHING" in sql
+        assert "SET likes_count=greatest(beats.likes_count +" in sql
+        assert "UPDATE users SET total_likes" in sql
+        assert "WHERE beats.beat_id IN (SELECT inserted_like.beat_id" in sql
+        # Answered from the beat, an author-less beat still returns its row
+        assert sql.endswith(
+            "SELECT liked_beat.beat_id, liked_beat.user_id AS author_id, "
+            "liked_beat.likes_count \nFROM liked_beat"
+        )
+
+    def test_unlike_deletes_and_decrements_both_counters(self):
+        sql = compile_sql(unlike_statement(1, 2))
+        params = unlike_statement(1, 2).compile().params
+
+        assert sql.startswith("WITH deleted_like AS")
+        assert "DELETE FROM likes" in sql
+        assert "UPDATE users SET total_likes" in sql
+        assert -1 in params.values()
+
+    def test_cart_statements_return_the_changed_beat(self):
+        added = compile_sql(add_to_cart_statement(1, 2))
+        removed = compile_sql(remove_from_cart_statement(1, 2))
+
+        assert "ON CONFLICT (user_id, beat_id) DO NOTHING" in added
+        assert added.endswith("RETURNING carts.beat_id")
+        assert removed.startswith("DELETE FROM carts")
+        assert removed.endswith("RETURNING carts.beat_id")
+
+
+class FakeResult:
+    def __init__(self, row):
+        self.row = row
+
+    def mappings(self):
+        return self
+
+    def first(self):
+        return self.row
+
+
+class FakeSession:
+    """Answers every statement with ``row``, or raises ``error``"""
+
+    def __init__(self, row=None, error=None):
+        self.row = row
+        self.error = error
+        self.rollbacks = 0
+
+    async def execute(self, statement):
+        if self.error is not None:
+            raise self.error
+        return FakeResult(self.row)
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+
+USER = Principal(id=1, role_id=1, token_id=None)
+
+
+async def call(endpoint, session, user_id=1, beat_id=2):
+    with pytest.raises(HTTPException) as raised:
+        await endpoint(user_id, beat_id, Response(), current_user=USER, session=session)
+    return raised.value.status_code
+
+
+@pytest.mark.asyncio
+class TestEndpoints:
+    async def test_already_liked(self):
+        assert await call(like_beat, FakeSession()) == 400
+
+    async def test_liking_a_missing_beat(self):
+        session = FakeSession(error=IntegrityError("INSERT", {}, Exception()))
+
+        assert await call(like_beat, session) == 404
+        assert session.rollbacks == 1
+
+    async def test_not_liked(self):
+        assert await call(unlike_beat, FakeSession()) == 404
+
+    async def test_already_in_cart(self):
+        assert await call(add_beat_to_cart, FakeSession()) == 400
+
+    async def test_not_in_cart(self):
+        assert await call(remove_beat_from_cart, FakeSession()) == 404
+
+    async def test_other_users_are_refused(self):
+        for endpoint in (
+            like_beat,
+            unlike_beat,
+            add_beat_to_cart,
+            remove_beat_from_cart,
+        ):
+            assert await call(endpoint, FakeSession(), user_id=2) == 403
+
+    async def test_database_errors(self):
+        session = FakeSession(error=RuntimeError("connection lost"))
+        for endpoint in (
+            like_beat,
+            unlike_beat,
+            add_beat_to_cart,
+            remove_beat_from_cart,
+        ):
+            assert await call(endpoint, session) == 500
+
+    async def test_new_like(self):
+        session = FakeSession({"beat_id": 2, "author_id": 5, "likes_count": 8})
+        response = Response()
+
+        result = await like_beat(1, 2, response, current_user=USER, session=session)
+
+        assert result == {"message": "Beat liked successfully"}
+        assert session.rollbacks == 0
+        assert "set-cookie" in response.headers
+
+    async def test_like_of_a_beat_without_author(self):
+        session = FakeSession({"beat_id": 2, "author_id": None, "likes_count": 1})
+
+        result = await like_beat(1, 2, Response(), current_user=USER, session=session)
+
+        assert result == {"message": "Beat liked successfully"}
@@ -0,0 +1,114 @@
+import json
+
+import pytest
+
+from src.beats.live import (
+    LiveCounters,
+    LiveSubscription,
+    LocalBroker,
+    TooManySubscriptions,
+)
+
+
+class FailingBroker(LocalBroker):
+    async def publish(self, message):
+        raise ConnectionError("broker is gone")
+
+
+def parse_event(chunk: bytes):
+    data = [line for line in chunk.decode().splitlines() if line.startswith("data: ")]
+    return json.loads(data[0][len("data: ") :])
+
+
+@pytest.mark.asyncio
+class TestLiveCounters:
+    async def test_changes_are_coalesced_per_tick(self):
+        broker = LocalBroker()
+        hub = LiveCounters(broker)
+        broker.subscribe(hub.receive)
+        subscription = hub.subscribe([1, 2])
+
+        hub.publish(1, likes=1)
+        hub.publish(1, likes=2)
+        hub.publish(1, plays=7)
+        hub.publish(3, likes=5)
+        await hub.flush()
+
+        assert broker.messages == 1
+        assert await subscription.next(0.1) == {1: {"likes": 2, "plays": 7}}
+        assert await subscription.next(0.01) is None
+
+    async def test_broker_fans_out_to_every_worker(self):
+        broker = LocalBroker()
+        writer, reader = LiveCounters(broker), LiveCounters(broker)
+        broker.subscribe(writer.receive)
+        broker.subscribe(reader.receive)
+        subscription = reader.subscribe([1])
+
+        writer.publish(1, likes=4)
+        await writer.flush()
+
+        assert await subscription.next(0.1) == {1: {"likes": 4}}
+        assert writer.stats()["sent"] == 1 and reader.stats()["delivered"] == 1
+
+    async def test_failed_send_keeps_newer_counters(self):
+        hub = LiveCounters(FailingBroker())
+        hub.publish(1, likes=1, plays=3)
+        await hub.flush()
+        hub.publish(1, likes=2)
+
+        assert hub._outgoing == {1: {"likes": 2, "plays": 3}}
+        assert hub.stats()["send_errors"] == 1
+
+    async def test_connections_are_limited(self):
+        hub = LiveCounters(max_connections=1)
+        subscription = hub.subscribe([1])
+        with pytest.raises(TooManySubscriptions):
+            hub.subscribe([2])
+
+        hub.unsubscribe(subscription)
+
+        hub.subscribe([2])
+        assert hub.stats()["followed_beats"] == 1
+
+    async def test_events_start_with_the_snapshot_and_unsubscribe(self):
+        hub = LiveCounters()
+        subscription = hub.subscribe([1])
+        events = hub.events(subscription, {1: {"likes": 3, "plays": 9}}, keepalive=0.01)
+
+        first = await events.__anext__()
+        hub.receive({1: {"likes": 4}})
+        second = await events.__anext__()
+        idle = await events.__anext__()
+        await events.aclose()
+
+        assert first.startswith(b"retry:")
+        assert parse_event(first) == {"1": {"likes": 3, "plays": 9}}
+        assert parse_event(second) == {"1": {"likes": 4}}
+        assert idle == b": keepalive\n\n"
+        assert hub.stats()["subscriptions"] == 0
+
+    async def test_started_hub_flushes_on_stop(self):
+        hub = LiveCounters(tick=60)
+        subscription = hub.subscribe([1])
+        hub.start()
+
+        hub.publish(1, likes=1)
+        await hub.stop()
+
+        assert await subscription.next(0.1) == {1: {"likes": 1}}
+
+
+@pytest.mark.asyncio
+class TestLiveSubscription:
+    async def test_full_queue_merges_into_the_latest_counters(self):
+        subscription = LiveSubscription([1, 2], max_queue=1)
+
+        subscription.offer({1: {"likes": 1}})
+        subscription.offer({1: {"likes": 2}})
+        subscription.offer({1: {"likes": 3}, 2: {"plays": 1}})
+
+        assert await subscription.next(0.1) == {1: {"likes": 1}}
+        assert await subscription.next(0.1) == {1: {"likes": 3}, 2: {"plays": 1}}
+        assert await subscription.next(0.01) is None
+        assert subscription.merged == 2
@@ -0,0 +1,86 @@
+import pytest
+
+from src.auth.principal import Principal
+from src.users.membership import (
+    CART,
+    LIKED,
+    MembershipIndex,
+    add_membership_flags,
+    membership_index,
+)
+
+
+class FakeSession:
+    """Answers membership queries from (list, beat id) rows per user"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    async def execute(self, statement):
+        self.queries += 1
+        params = statement.compile().params.values()
+        user_id = next(value for value in params if isinstance(value, int))
+        return iter(self.rows.get(user_id, []))
+
+
+@pytest.mark.asyncio
+class TestMembershipIndex:
+    async def test_loads_a_user_once(self):
+        index = MembershipIndex(ttl=60)
+        session = FakeSession({1: [(LIKED, 10), (CART, 11), (LIKED, 12)]})
+
+        membership = await index.get(session, 1)
+        await index.get(session, 1)
+
+        assert membership.liked == {10, 12}
+        assert membership.cart == {11}
+        assert session.queries == 1
+        assert index.stats() == {"users": 1, "beat_ids": 3, "hits": 1, "misses": 1}
+
+    async def test_writes_update_loaded_sets(self):
+        index = MembershipIndex(ttl=60)
+        session = FakeSession({1: [(LIKED, 10)]})
+        await index.get(session, 1)
+
+        index.add_like(1, 20)
+        index.remove_like(1, 10)
+        index.add_to_cart(1, 30)
+        index.add_to_cart(2, 30)
+
+        membership = await index.get(session, 1)
+        assert membership.liked == {20}
+        assert membership.cart == {30}
+        assert index.stats()["users"] == 1
+
+    async def test_expired_entries_are_reloaded(self):
+        index = MembershipIndex(ttl=0)
+        session = FakeSession({})
+        await index.get(session, 1)
+        await index.get(session, 1)
+        assert session.queries == 2
+
+    async def test_least_recently_used_users_are_evicted(self):
+        index = MembershipIndex(ttl=60, max_users=1)
+        session = FakeSession({})
+        await index.get(session, 1)
+        await index.get(session, 2)
+        await index.get(session, 1)
+        assert session.queries == 3
+
+
+@pytest.mark.asyncio
+async def test_flags_are_only_set_for_viewers():
+    membership_index.clear()
+    session = FakeSession({1: [(LIKED, 10), (CART, 11)]})
+    cards = [{"beat_id": 10}, {"beat_id": 11}]
+
+    assert await add_membership_flags(session, None, cards) == cards
+    assert session.queries == 0
+
+    flagged = await add_membership_flags(session, Principal(1, 1, None), cards)
+    assert flagged == [
+        {"beat_id": 10, "is_liked": True, "in_cart": False},
+        {"beat_id": 11, "is_liked": False, "in_cart": True},
+    ]
+    membership_index.clear()
@@ -0,0 +1,87 @@
+from sqlalchemy import create_engine, text
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from src.monitoring.metrics import (
+    Histogram,
+    MetricsMiddleware,
+    RequestStats,
+    _request_stats,
+    gauges,
+    parameters_shape,
+    request_latency,
+    request_statements,
+)
+
+
+def test_histogram_exposes_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    histogram.observe(0.05, route="/a")
+    histogram.observe(0.5, route="/a")
+    histogram.observe(5.0, route="/a")
+
+    lines = histogram.expose()
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{route="/a"} 3' in lines
+    assert 'latency_seconds_sum{route="/a"} 5.55' in lines
+
+
+def test_parameters_shape_hides_values():
+    assert parameters_shape({"email": "a@b.c", "id": 1}) == {
+        "email": "str",
+        "id": "int",
+    }
+    assert parameters_shape([(1, "x"), (2, "y")]) == "2 x ['int', 'str']"
+
+
+def test_gauges_skip_non_numeric_values():
+    lines = gauges("pool", {"size": 5, "healthy": True, "name": "primary"}, "Pool")
+    assert "pool_size 5" in lines
+    assert "pool_healthy 1" in lines
+    assert not any(line.startswith("pool_name") for line in lines)
+
+
+def test_statements_are_counted_for_the_current_request():
+    engine = create_engine("sqlite://")
+    stats = RequestStats()
+    token = _request_stats.set(stats)
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("select 1"))
+            connection.execute(text("select 2"))
+    finally:
+        _request_stats.reset(token)
+
+    assert stats.statements == 2
+    assert stats.db_seconds > 0
+
+
+def test_middleware_labels_requests_with_the_route_template():
+    async def get_item(request):
+        return PlainTextResponse(request.path_params["item_id"])
+
+    app = Starlette(routes=[Route("/items/{item_id}", get_item)])
+    app.add_middleware(MetricsMiddleware, routes=lambda: app.routes)
+
+    with TestClient(app) as client:
+        assert client.get("/items/1").status_code == 200
+        assert client.get("/items/2").status_code == 200
+        assert client.get("/missing").status_code == 404
+
+    lines = request_latency.expose()
+    assert (
+        'http_request_duration_seconds_count{method="GET",route="/items/{item_id}",status="200"} 2'
+        in lines
+    )
+    assert (
+        'http_request_duration_seconds_count{method="GET",route="<unmatched>",status="404"} 1'
+        in lines
+    )
+    assert any(
+        line.startswith('http_request_sql_statements_count{route="/items/{item_id}"}')
+        for line in request_statements.expose()
+    )
@@ -0,0 +1,190 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.recommendations import neighbours  # noqa: E402
+from src.recommendations.models import beat_neighbours, job_watermarks  # noqa: E402
+from src.recommendations.neighbours import (  # noqa: E402
+    LikeMatrix,
+    compute_neighbours,
+    write_neighbours,
+)
+
+NOW = datetime(2024, 5, 1)
+
+# user -> liked beats
+LIKES = {1: [10, 20, 30], 2: [10, 20], 3: [20, 30], 4: [40], 5: [10, 20, 50]}
+
+
+def like_arrays(likes=LIKES):
+    pairs = [(user, beat) for user, beats in likes.items() for beat in beats]
+    return np.array([p[0] for p in pairs]), np.array([p[1] for p in pairs])
+
+
+def dense_cooccurrences(matrix: LikeMatrix):
+    dense = np.zeros((len(matrix.user_ids), len(matrix.beat_ids)), np.int64)
+    for user in range(len(matrix.user_ids)):
+        start, end = matrix.user_indptr[user], matrix.user_indptr[user + 1]
+        dense[user, matrix.user_beats[start:end]] = 1
+    return dense.T @ dense
+
+
+@pytest.fixture(params=["numpy", "scipy"])
+def counting(request, monkeypatch):
+    if request.param == "scipy":
+        pytest.importorskip("scipy")
+    else:
+        monkeypatch.setattr(neighbours, "sparse", None)
+
+
+class TestLikeMatrix:
+    def test_cooccurrences_match_the_dense_product(self, counting):
+        rng = np.random.default_rng(3)
+        users = rng.integers(1, 40, 600)
+        beats = rng.integers(1, 80, 600)
+        unique = np.unique(users * 1000 + beats)
+        matrix = LikeMatrix(unique // 1000, unique % 1000)
+        expected = dense_cooccurrences(matrix)
+
+        block = np.array([0, 5, 17, 3])
+        positions, columns, counts = matrix.cooccurrences(block)
+
+        got = np.zeros((len(block), len(matrix.beat_ids)), np.int64)
+        got[positions, columns] = counts
+        assert (got == expected[block]).all()
+        assert (counts > 0).all()
+
+    def test_top_neighbours_rank_by_cosine(self, counting):
+        matrix = LikeMatrix(*like_arrays())
+        beat_10 = int(np.searchsorted(matrix.beat_ids, 10))
+
+        rows = matrix.top_neighbours(np.array([beat_10]), top_n=2)
+
+        # 20 shares all three likers of 10, 30 and 50 one each, but 50 has
+        # no other liker
+        assert [row["neighbour_id"] for row in rows] == [20, 50]
+        assert [row["rank"] for row in rows] == [0, 1]
+        assert rows[0]["common_likes"] == 3
+        assert rows[0]["score"] == pytest.approx(3 / np.sqrt(3 * 4))
+
+    def test_beats_without_co_likes_have_no_neighbours(self):
+        matrix = LikeMatrix(*like_arrays())
+        beat_40 = int(np.searchsorted(matrix.beat_ids, 40))
+
+        assert matrix.top_neighbours(np.array([beat_40]), top_n=5) == []
+
+    def test_beats_liked_by(self):
+        matrix = LikeMatrix(*like_arrays())
+
+        beats = matrix.beats_liked_by(np.array([3, 4, 99]))
+
+        assert matrix.beat_ids[beats].tolist() == [20, 30, 40]
+
+    def test_blocks_follow_the_pair_budget(self):
+        matrix = LikeMatrix(*like_arrays())
+        beats = np.arange(len(matrix.beat_ids))
+
+        blocks = matrix.blocks(beats, max_pairs=8, max_beats=2)
+
+        assert np.concatenate(blocks).tolist() == beats.tolist()
+        assert all(len(block) <= 2 for block in blocks)
+        assert len(blocks) > len(beats) // 2
+        assert matrix.blocks(beats[:0], 8, 2) == []
+
+
+class FakeResult:
+    def __init__(self, rows=(), value=None):
+        self.rows = list(rows)
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+    async def partitions(self, size):
+        for start in range(0, len(self.rows), size):
+            yield self.rows[start : start + size]
+
+
+class FakeSession:
+    """Serves likes and a watermark, records what the job writes"""
+
+    def __init__(self, likes, watermark=None):
+        self.likes = likes
+        self.watermark = watermark
+        self.deleted = []
+        self.inserted = []
+        self.saved_watermark = None
+        self.commits = 0
+
+    async def stream(self, statement):
+        return FakeResult(self.likes)
+
+    async def execute(self, statement, rows=None):
+        table = getattr(statement, "table", None)
+        if statement.is_select:
+            return FakeResult(value=self.watermark)
+        if table is job_watermarks:
+            self.saved_watermark = statement.compile().params["watermark"]
+        elif statement.is_delete:
+            self.deleted.append(statement)
+        elif table is beat_neighbours:
+            self.inserted.extend(rows)
+        return FakeResult()
+
+    async def commit(self):
+        self.commits += 1
+
+
+def like_rows(likes=LIKES, recent_users=()):
+    return [
+        (user, beat, NOW if user in recent_users else NOW - timedelta(days=30))
+        for user, beats in likes.items()
+        for beat in beats
+    ]
+
+
+@pytest.mark.asyncio
+class TestNeighboursJob:
+    async def test_writes_every_block_in_its_own_transaction(self):
+        matrix = LikeMatrix(*like_arrays())
+        session = FakeSession([])
+
+        written = await write_neighbours(
+            session, matrix, np.arange(len(matrix.beat_ids)), top_n=3, max_beats=2
+        )
+
+        assert written == len(session.inserted)
+        assert len(session.deleted) == session.commits == 3
+        assert {row["beat_id"] for row in session.inserted} == {10, 20, 30, 50}
+
+    async def test_first_run_is_full(self):
+        session = FakeSession(like_rows(recent_users={4}))
+
+        stats = await compute_neighbours(session)
+
+        assert stats["full"] and stats["beats"] == 5 and stats["likes"] == 11
+        assert session.saved_watermark == NOW
+        # The last delete drops the beats that were not recomputed
+        assert "computed_at" in str(session.deleted[-1])
+
+    async def test_incremental_run_recomputes_beats_of_recent_likers(self):
+        session = FakeSession(
+            like_rows(recent_users={3}), watermark=NOW - timedelta(days=1)
+        )
+
+        stats = await compute_neighbours(session)
+
+        assert not stats["full"]
+        assert stats["beats"] == 2
+        assert {row["beat_id"] for row in session.inserted} == {20, 30}
+        assert session.saved_watermark == NOW
+
+    async def test_incremental_run_without_new_likes_writes_nothing(self):
+        session = FakeSession(like_rows(), watermark=NOW)
+
+        stats = await compute_neighbours(session)
+
+        assert stats["beats"] == stats["rows"] == 0
+        assert session.inserted == [] and session.saved_watermark is None
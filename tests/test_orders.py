@@ -0,0 +1,270 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from pydantic import ValidationError
+from sqlalchemy.dialects import postgresql
+
+from src.orders.checkout import CartChanged, EmptyCart, checkout
+from src.orders.payments import FakePaymentProvider, PaymentConflict, PaymentDeclined
+from src.orders.pricing import UnpricedBeat, UnsellableBeat, price_lines
+from src.orders.queries import create_order_statement, pay_order_statement
+from src.orders.schemas import CheckoutRequest
+
+CART = [
+    {"beat_id": 1, "user_id": 10, "price": "19.99", "price_amount": Decimal("19.99")},
+    {"beat_id": 2, "user_id": 11, "price": "5", "price_amount": None},
+]
+
+
+class TestPricing:
+    def test_license_tiers_multiply_the_price(self):
+        lines, total = price_lines(CART, {2: "stems"})
+
+        assert [line["price_amount"] for line in lines] == [
+            Decimal("19.99"),
+            Decimal("25.00"),
+        ]
+        assert [line["license"] for line in lines] == ["mp3", "stems"]
+        assert lines[0]["seller_id"] == 10
+        assert total == Decimal("44.99")
+
+    def test_legacy_text_prices_are_parsed(self):
+        items = [{"beat_id": 3, "user_id": 10, "price": "$20", "price_amount": None}]
+
+        assert price_lines(items, {})[1] == Decimal("20.00")
+
+    def test_unreadable_price_is_rejected(self):
+        items = [{"beat_id": 3, "user_id": 10, "price": "ask", "price_amount": None}]
+
+        with pytest.raises(UnpricedBeat) as raised:
+            price_lines(items, {})
+        assert raised.value.beat_id == 3
+
+    def test_beat_without_author_is_rejected(self):
+        items = [*CART, {**CART[0], "beat_id": 3, "user_id": None}]
+
+        with pytest.raises(UnsellableBeat) as raised:
+            price_lines(items, {})
+        assert raised.value.beat_id == 3
+
+    def test_empty_cart_costs_nothing(self):
+        assert price_lines([], {}) == ([], Decimal("0.00"))
+
+    def test_unknown_license_is_rejected(self):
+        with pytest.raises(ValidationError):
+            CheckoutRequest(licenses={1: "exclusive"})
+        assert CheckoutRequest(licenses={1: "wav"}).licenses == {1: "wav"}
+
+
+@pytest.mark.asyncio
+class TestFakePaymentProvider:
+    async def test_retry_returns_the_first_payment(self):
+        provider = FakePaymentProvider(latency=0)
+
+        first = await provider.charge("key", Decimal("10.00"))
+        again = await provider.charge("key", Decimal("10.00"))
+
+        assert again is first
+        assert provider.stats() == {"charged": 1, "replayed": 1, "declined": 0}
+
+    async def test_same_key_with_another_amount_conflicts(self):
+        provider = FakePaymentProvider(latency=0)
+        await provider.charge("key", Decimal("10.00"))
+
+        with pytest.raises(PaymentConflict):
+            await provider.charge("key", Decimal("12.00"))
+
+    async def test_declines_above_the_limit(self):
+        provider = FakePaymentProvider(latency=0, decline_above=Decimal("100"))
+
+        with pytest.raises(PaymentDeclined):
+            await provider.charge("key", Decimal("100.01"))
+        assert provider.stats()["declined"] == 1
+
+
+def test_order_is_written_pending_by_one_statement():
+    lines, total = price_lines(CART, {})
+    statement = create_order_statement(1, "key", total, lines)
+
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+
+    assert sql.count("INSERT INTO") == 2 and "DELETE FROM carts" not in sql
+    assert "ON CONFLICT (user_id, idempotency_key) DO NOTHING" in sql
+    assert "pending" in statement.compile().params.values()
+
+
+def test_paying_clears_the_cart_in_the_same_statement():
+    statement = pay_order_statement(1, 7, "pay")
+
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+
+    assert sql.startswith("WITH paid AS \n(UPDATE orders SET status=")
+    assert "orders.status = %(status_1)s" in sql and "DELETE FROM carts" in sql
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def mappings(self):
+        return self
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+    def all(self):
+        return self.rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class FakeSession:
+    """Answers the checkout statements from an in-memory cart and orders"""
+
+    def __init__(self, cart, orders=()):
+        self.cart = list(cart)
+        self.orders = {order["order_id"]: dict(order) for order in orders}
+        self.written = []
+        self.commits = 0
+
+    async def execute(self, statement):
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+        params = statement.compile().params
+        if sql.startswith("WITH new_order"):
+            return self.create(params)
+        if sql.startswith("WITH paid"):
+            order = self.orders.get(params["order_id_1"])
+            if order is None or order["status"] != "pending":
+                return FakeResult([])
+            order.update(status="paid", payment_id=params["param_2"])
+            return FakeResult([(order["order_id"], 0)])
+        if sql.startswith("WITH discarded"):
+            order = self.orders.pop(params["order_id_1"])
+            return FakeResult([(order["order_id"], 0)])
+        if "FROM carts JOIN beats" in sql:
+            return FakeResult(self.cart)
+        if "FROM order_lines" in sql:
+            return FakeResult([])
+        return FakeResult(
+            [
+                order
+                for order in self.orders.values()
+                if params.get("order_id_1", order["order_id"]) == order["order_id"]
+                and params.get("idempotency_key_1", order["idempotency_key"])
+                == order["idempotency_key"]
+            ]
+        )
+
+    def create(self, params):
+        self.written.append(params)
+        if any(o["idempotency_key"] == params["param_2"] for o in self.orders.values()):
+            return FakeResult([])
+        created = {"order_id": 7, "created_at": datetime(2024, 1, 1)}
+        self.orders[7] = {
+            **created,
+            "idempotency_key": params["param_2"],
+            "status": params["param_3"],
+            "payment_id": None,
+            "total_amount": params["param_4"],
+        }
+        return FakeResult([created])
+
+    async def commit(self):
+        self.commits += 1
+
+
+class FailingPaymentProvider(FakePaymentProvider):
+    async def charge(self, idempotency_key, amount):
+        raise ConnectionError("provider timed out")
+
+
+def pending_order(total):
+    return {
+        "order_id": 3,
+        "idempotency_key": "key",
+        "status": "pending",
+        "payment_id": None,
+        "total_amount": total,
+        "created_at": datetime(2024, 1, 1),
+    }
+
+
+@pytest.mark.asyncio
+class TestCheckout:
+    async def test_charges_once_and_writes_the_order(self):
+        provider = FakePaymentProvider(latency=0)
+        session = FakeSession(CART)
+
+        order, created = await checkout(session, 1, "key", {1: "wav"}, None, provider)
+
+        assert created and order["status"] == "paid"
+        assert order["order_id"] == 7 and order["total_amount"] == Decimal("44.98")
+        assert [line["beat_id"] for line in order["lines"]] == [1, 2]
+        assert len(session.written) == 1
+        assert session.orders[7]["payment_id"] == order["payment_id"]
+        assert provider.stats()["charged"] == 1
+
+    async def test_existing_order_is_returned_without_charging(self):
+        provider = FakePaymentProvider(latency=0)
+        existing = {"order_id": 3, "idempotency_key": "key", "status": "paid"}
+        session = FakeSession(CART, orders=[existing])
+
+        order, created = await checkout(session, 1, "key", {}, None, provider)
+
+        assert not created and order["order_id"] == 3 and order["lines"] == []
+        assert session.written == [] and provider.stats()["charged"] == 0
+
+    async def test_order_stays_pending_when_the_payment_fails(self):
+        session = FakeSession(CART)
+
+        with pytest.raises(ConnectionError):
+            await checkout(
+                session, 1, "key", {}, None, FailingPaymentProvider(latency=0)
+            )
+
+        assert session.orders[7]["status"] == "pending"
+        assert session.orders[7]["total_amount"] == Decimal("24.99")
+
+    async def test_retry_pays_the_pending_order_even_if_the_cart_changed(self):
+        provider = FakePaymentProvider(latency=0)
+        # The first attempt was charged, then failed to mark its order paid
+        await provider.charge("checkout:1:key", Decimal("24.99"))
+        session = FakeSession(CART[:1], orders=[pending_order(Decimal("24.99"))])
+
+        order, created = await checkout(session, 1, "key", {}, None, provider)
+
+        assert created and order["order_id"] == 3 and order["status"] == "paid"
+        assert session.written == []
+        assert provider.stats() == {"charged": 1, "replayed": 1, "declined": 0}
+
+    async def test_key_charged_for_another_cart(self):
+        provider = FakePaymentProvider(latency=0)
+        await provider.charge("checkout:1:key", Decimal("1.00"))
+        session = FakeSession(CART)
+
+        with pytest.raises(CartChanged):
+            await checkout(session, 1, "key", {}, None, provider)
+        assert session.orders == {}
+
+    async def test_declined_payment_discards_the_pending_order(self):
+        provider = FakePaymentProvider(latency=0, decline_above=Decimal("10"))
+        session = FakeSession(CART)
+
+        with pytest.raises(PaymentDeclined):
+            await checkout(session, 1, "key", {}, None, provider)
+        assert session.orders == {}
+
+    async def test_beat_without_author_is_not_charged(self):
+        provider = FakePaymentProvider(latency=0)
+        session = FakeSession([{**CART[0], "user_id": None}])
+
+        with pytest.raises(UnsellableBeat):
+            await checkout(session, 1, "key", {}, None, provider)
+        assert session.orders == {}
+        assert provider.stats()["charged"] == 0
+
+    async def test_empty_cart(self):
+        with pytest.raises(EmptyCart):
+            await checkout(FakeSession([]), 1, "key", {}, None, FakePaymentProvider())
@@ -0,0 +1,21 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from src.pagination import decode_cursor, encode_cursor
+
+
+def test_cursor_roundtrip():
+    added_at = datetime(2024, 1, 2, 3, 4, 5)
+    cursor = encode_cursor([added_at, 42])
+
+    assert decode_cursor(cursor, (datetime.fromisoformat, int)) == (added_at, 42)
+    assert decode_cursor(None, (int,)) is None
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", encode_cursor([1]), "e30"])
+def test_invalid_cursor(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, (datetime.fromisoformat, int))
+    assert error.value.status_code == 400
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from src.auth.passwords import PooledPasswordHelper, create_crypt_context
+
+
+@pytest.fixture
+def helper():
+    helper = PooledPasswordHelper(workers=1)
+    yield helper
+    helper.shutdown()
+
+
+async def test_hash_runs_in_the_pool(helper):
+    hashed_password = await helper.hash_async("secret")
+
+    assert helper.verify_and_update("secret", hashed_password) == (True, None)
+    assert helper.describe()["completed"] == 1
+
+
+async def test_concurrent_hashes_queue_behind_the_cap(helper):
+    await asyncio.gather(*(helper.hash_async("secret") for _ in range(3)))
+
+    stats = helper.describe()
+    assert stats["completed"] == 3
+    assert stats["max_waiting"] == 2
+    assert stats["max_wait_seconds"] > 0
+    assert stats["in_flight"] == stats["waiting"] == 0
+
+
+async def test_hash_with_other_rounds_is_upgraded(helper):
+    old_hash = create_crypt_context(rounds=4).hash("secret")
+
+    verified, updated = await helper.verify_and_update_async("secret", old_hash)
+
+    assert verified
+    assert updated is not None and updated != old_hash
+    assert helper.verify_and_update("secret", updated) == (True, None)
+    assert helper.describe()["rehashes"] == 1
+
+
+async def test_wrong_password_is_rejected(helper):
+    hashed_password = await helper.hash_async("secret")
+
+    assert await helper.verify_and_update_async("other", hashed_password) == (
+        False,
+        None,
+    )
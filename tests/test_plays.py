@@ -0,0 +1,169 @@
+import asyncio
+
+import pytest
+
+from src.beats import plays as plays_module
+from src.beats.plays import PlayBuffer, PlayBufferFull, add_plays_statement, flush_plays
+from src.beats.trending import TrendingRanking
+
+
+class FakeDatabase:
+    """Stands in for Postgres, collects the counts every flush would write"""
+
+    def __init__(self, fail_times: int = 0):
+        self.flushes = []
+        self.fail_times = fail_times
+
+    async def flush(self, counts):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise ConnectionError("database is down")
+        self.flushes.append(counts)
+
+    def totals(self):
+        totals = {}
+        for counts in self.flushes:
+            for beat_id, plays in counts.items():
+                totals[beat_id] = totals.get(beat_id, 0) + plays
+        return totals
+
+
+@pytest.mark.asyncio
+class TestPlayBuffer:
+    async def test_coalesces_plays_per_beat(self):
+        database = FakeDatabase()
+        buffer = PlayBuffer(database.flush, flush_interval=60, flush_threshold=1000)
+        buffer.start()
+
+        for beat_id in [1, 2, 1, 1, 3]:
+            buffer.record(beat_id)
+        await buffer.stop()
+
+        assert database.flushes == [{1: 3, 2: 1, 3: 1}]
+        assert buffer.stats()["flushed_plays"] == 5
+
+    async def test_flushes_on_threshold(self):
+        database = FakeDatabase()
+        buffer = PlayBuffer(database.flush, flush_interval=60, flush_threshold=3)
+        buffer.start()
+
+        for _ in range(3):
+            buffer.record(7)
+        await asyncio.sleep(0.01)
+
+        assert database.flushes == [{7: 3}]
+        await buffer.stop()
+
+    async def test_flushes_on_interval(self):
+        database = FakeDatabase()
+        buffer = PlayBuffer(database.flush, flush_interval=0.01, flush_threshold=100)
+        buffer.start()
+
+        buffer.record(7)
+        await asyncio.sleep(0.05)
+
+        assert database.flushes == [{7: 1}]
+        await buffer.stop()
+
+    async def test_rejects_when_full(self):
+        buffer = PlayBuffer(FakeDatabase().flush, max_queue=2)
+
+        buffer.record(1)
+        buffer.record(1)
+        with pytest.raises(PlayBufferFull):
+            buffer.record(1)
+
+        assert buffer.stats()["queue_depth"] == 2
+        assert buffer.stats()["rejected"] == 1
+
+    async def test_failed_flush_is_retried(self):
+        database = FakeDatabase(fail_times=1)
+        buffer = PlayBuffer(database.flush, flush_interval=60, flush_threshold=2)
+        buffer.start()
+
+        buffer.record(1)
+        buffer.record(1)
+        await asyncio.sleep(0.01)
+        assert buffer.stats()["flush_errors"] == 1
+
+        buffer.record(2)
+        await buffer.stop()
+
+        assert database.totals() == {1: 2, 2: 1}
+
+
+def test_add_plays_statement_updates_beats_and_authors():
+    sql = str(add_plays_statement({2: 5, 1: 3}))
+
+    assert "UPDATE beats SET plays_count" in sql
+    assert "UPDATE users SET total_plays" in sql
+
+
+class FakePlaysResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeSessionMaker:
+    """Session factory whose statement only finds the beats in ``known``"""
+
+    def __init__(self, known):
+        self.known = known
+        self.commits = 0
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def execute(self, statement):
+        return FakePlaysResult(self.known)
+
+    async def commit(self):
+        self.commits += 1
+
+
+@pytest.mark.asyncio
+async def test_unknown_beats_do_not_reach_trending(monkeypatch):
+    ranking = TrendingRanking(top_k=2)
+    ranking.load([])
+    monkeypatch.setattr(plays_module, "trending", ranking)
+    monkeypatch.setattr(
+        plays_module, "async_session_maker", FakeSessionMaker([(1, 4, 9, 3)])
+    )
+
+    await flush_plays({1: 3, 404: 2})
+
+    assert set(ranking._scores) == {1}
+
+
+class FailingCache:
+    async def bump_versions(self, *tags):
+        raise ConnectionError("redis is gone")
+
+
+@pytest.mark.asyncio
+async def test_counts_are_not_committed_twice_when_the_cache_fails(monkeypatch):
+    ranking = TrendingRanking(top_k=2)
+    ranking.load([])
+    sessions = FakeSessionMaker([(1, 4, 9, 3)])
+    monkeypatch.setattr(plays_module, "trending", ranking)
+    monkeypatch.setattr(plays_module, "async_session_maker", sessions)
+    monkeypatch.setattr(plays_module, "response_cache", FailingCache())
+    buffer = PlayBuffer(flush_plays, flush_interval=60, flush_threshold=1000)
+    buffer.start()
+
+    buffer.record(1)
+    await buffer.stop()
+    await buffer.flush()
+
+    assert sessions.commits == 1
+    assert buffer.stats()["flush_errors"] == 0
+    assert set(ranking._scores) == {1}
@@ -0,0 +1,37 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import exc
+from sqlalchemy.util import greenlet_spawn
+
+from src.database.pool import InstrumentedAsyncPool
+
+
+def sqlite_connection():
+    return sqlite3.connect(":memory:", check_same_thread=False)
+
+
+@pytest.mark.asyncio
+async def test_pool_records_overflow_and_starvation():
+    pool = InstrumentedAsyncPool(
+        sqlite_connection, pool_size=1, max_overflow=1, timeout=0.01
+    )
+
+    def checkout_more_than_allowed():
+        first = pool.connect()
+        second = pool.connect()
+        assert pool.describe()["checked_out"] == 2
+        with pytest.raises(exc.TimeoutError):
+            pool.connect()
+        first.close()
+        second.close()
+
+    await greenlet_spawn(checkout_more_than_allowed)
+
+    stats = pool.describe()
+    assert stats["checkouts"] == 3
+    assert stats["checkout_timeouts"] == 1
+    assert stats["connections_created"] == 2
+    assert stats["overflow_events"] == 1
+    assert stats["checked_out"] == 0
+    assert stats["checkout_seconds_max"] >= 0.01
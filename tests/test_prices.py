@@ -0,0 +1,116 @@
+from decimal import Decimal
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from src.beats import prices
+from src.beats.prices import parse_price, price_amounts_statement, sync_price_amounts
+from src.users.reconcile import CounterReconciler
+
+
+@pytest.mark.parametrize(
+    "price, amount",
+    [
+        ("19.99", "19.99"),
+        ("20", "20.00"),
+        ("$20", "20.00"),
+        ("20,00", "20.00"),
+        ("20,5 €", "20.50"),
+        ("1,299.00 USD", "1299.00"),
+        ("1.299,00", "1299.00"),
+        ("1,299", "1299.00"),
+        (" 9.999 ", "10.00"),
+    ],
+)
+def test_parse_price(price, amount):
+    assert parse_price(price) == Decimal(amount)
+
+
+@pytest.mark.parametrize(
+    "price", [None, "", "free", "-5", ".", "1e9", "10-20", "999999999"]
+)
+def test_unreadable_prices(price):
+    assert parse_price(price) is None
+
+
+def test_amounts_are_only_set_while_the_price_is_unchanged():
+    statement = price_amounts_statement([(1, "$20", Decimal("20.00")), (2, "?", None)])
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+
+    assert sql.startswith(
+        "UPDATE beats SET price_amount=CAST(parsed.amount AS NUMERIC(10, 2))"
+    )
+    assert "beats.price = parsed.price" in sql
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeSession:
+    """Serves beats by id from a dict, applies the price updates to it"""
+
+    def __init__(self, beats):
+        self.beats = beats
+        self.commits = 0
+
+    async def execute(self, statement):
+        if isinstance(statement, list):
+            return self.update(statement)
+        params = statement.compile().params
+        after, limit = params["beat_id_1"], params["param_1"]
+        ids = sorted(beat_id for beat_id in self.beats if beat_id > after)
+        return FakeResult([(i, *self.beats[i]) for i in ids[:limit]])
+
+    def update(self, changes):
+        updated = []
+        for beat_id, price, amount in changes:
+            if self.beats[beat_id][0] == price:
+                self.beats[beat_id] = (price, amount)
+                updated.append((beat_id,))
+        return FakeResult(updated)
+
+    async def commit(self):
+        self.commits += 1
+
+
+@pytest.mark.asyncio
+async def test_sync_backfills_and_repairs_in_batches(monkeypatch):
+    # The session applies the changes themselves instead of the statement
+    monkeypatch.setattr(prices, "price_amounts_statement", list)
+    session = FakeSession(
+        {
+            1: ("19.99", None),
+            2: ("$5", Decimal("5.00")),
+            3: ("25", Decimal("20.00")),
+            4: ("ask me", None),
+            5: ("20,00", None),
+        }
+    )
+
+    stats = await sync_price_amounts(session, batch_size=2)
+
+    assert stats == {"scanned": 5, "updated": 3, "unparseable": 1}
+    assert session.beats[1][1] == Decimal("19.99")
+    assert session.beats[3][1] == Decimal("25.00")
+    assert session.beats[5][1] == Decimal("20.00")
+    assert session.commits == 3
+
+
+@pytest.mark.asyncio
+async def test_reconciler_syncs_prices_even_if_counters_fail():
+    async def reconcile():
+        raise RuntimeError("database is gone")
+
+    async def sync_prices():
+        return {"scanned": 3, "updated": 2, "unparseable": 0}
+
+    reconciler = CounterReconciler(reconcile, interval=60, sync_prices=sync_prices)
+    await reconciler.run_once()
+
+    assert reconciler.describe()["repaired_prices"] == 2
+    assert reconciler.describe()["errors"] == 1
@@ -0,0 +1,110 @@
+import pytest
+from fastapi import HTTPException
+from fastapi_users import exceptions
+
+from src.auth.base_config import CachedJWTStrategy, get_current_principal
+from src.auth.models import User
+from src.auth.principal import invalidate_principals, principal_cache
+
+
+class FakeUserManager:
+    def __init__(self, users):
+        self.users = users
+        self.loads = 0
+
+    def parse_id(self, value):
+        try:
+            return int(value)
+        except ValueError:
+            raise exceptions.InvalidID()
+
+    async def get(self, user_id):
+        self.loads += 1
+        if user_id not in self.users:
+            raise exceptions.UserNotExists()
+        return self.users[user_id]
+
+
+def make_user(**overrides):
+    values = dict(
+        id=1,
+        email="producer@example.com",
+        username="producer",
+        role_id=1,
+        hashed_password="hash",
+        is_active=True,
+        is_superuser=False,
+        is_verified=False,
+    )
+    values.update(overrides)
+    return User(**values)
+
+
+@pytest.fixture(autouse=True)
+async def clear_principal_cache():
+    await principal_cache.clear()
+
+
+@pytest.fixture
+def strategy():
+    return CachedJWTStrategy(secret="secret", lifetime_seconds=60)
+
+
+@pytest.mark.asyncio
+async def test_user_is_loaded_once_per_token(strategy):
+    manager = FakeUserManager({1: make_user()})
+    token = await strategy.write_token(manager.users[1])
+
+    first = await strategy.read_token(token, manager)
+    second = await strategy.read_token(token, manager)
+
+    assert first.id == second.id == 1
+    assert second.username == "producer"
+    assert manager.loads == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidation_reloads_the_user(strategy):
+    manager = FakeUserManager({1: make_user()})
+    token = await strategy.write_token(manager.users[1])
+    await strategy.read_token(token, manager)
+
+    manager.users[1] = make_user(is_active=False)
+    await invalidate_principals(1)
+
+    with pytest.raises(HTTPException) as error:
+        await get_current_principal(token, manager, strategy)
+    assert error.value.status_code == 401
+    assert manager.loads == 2
+
+
+@pytest.mark.asyncio
+async def test_token_with_a_stale_role_is_rejected(strategy):
+    manager = FakeUserManager({1: make_user()})
+    token = await strategy.write_token(manager.users[1])
+    manager.users[1] = make_user(role_id=2)
+
+    assert await strategy.read_token(token, manager) is None
+
+
+@pytest.mark.asyncio
+async def test_principal_comes_from_the_token_claims(strategy):
+    manager = FakeUserManager({1: make_user()})
+    token = await strategy.write_token(manager.users[1])
+
+    principal = await get_current_principal(token, manager, strategy)
+    await get_current_principal(token, manager, strategy)
+
+    assert (principal.id, principal.role_id) == (1, 1)
+    assert principal.token_id is not None
+    assert manager.loads == 1
+
+
+@pytest.mark.asyncio
+async def test_invalid_token_is_rejected(strategy):
+    manager = FakeUserManager({})
+    for token in (None, "not-a-token"):
+        with pytest.raises(HTTPException) as error:
+            await get_current_principal(token, manager, strategy)
+        assert error.value.status_code == 401
+    assert manager.loads == 0
@@ -0,0 +1,188 @@
+import threading
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.recommendations import (  # noqa: E402
+    FeatureMatrix,
+    RecommendationIndex,
+    RecommendationsUnavailable,
+)
+from src.recommendations import index as index_module  # noqa: E402
+
+
+def make_features(**options) -> FeatureMatrix:
+    features = FeatureMatrix(**options)
+    features.add_beats(
+        [1, 2, 3, 4],
+        [90, 92, 90, 170],
+        [19.99, 19.99, 19.99, 199.0],
+        [120, 125, None, 240],
+    )
+    return features
+
+
+class TestFeatureMatrix:
+    def test_vectors_are_unit(self):
+        features = make_features()
+        norms = np.linalg.norm(features.matrix[:, : features.size], axis=0)
+        assert np.allclose(norms, 1, atol=1e-5)
+
+    def test_content_alone_ranks_close_tempo_and_price_first(self):
+        [neighbours] = make_features().similar([1], 3)
+
+        assert [beat_id for beat_id, _ in neighbours][-1] == 4
+        assert neighbours[0][1] > 0.9
+
+    def test_shared_audience_outranks_content(self):
+        features = make_features()
+        features.add_likes(list(range(50)), [4] * 50)
+        features.add_likes(list(range(50)), [1] * 50)
+        features.add_likes(list(range(100, 150)), [2] * 50)
+
+        [neighbours] = features.similar([1], 3)
+
+        assert neighbours[0][0] == 4
+
+    def test_unlike_restores_the_vector(self):
+        features = make_features()
+        before = features.matrix[:, :4].copy()
+
+        features.add_likes([7, 8], [1, 1])
+        features.add_likes([7, 8], [1, 1], delta=-1)
+
+        assert np.allclose(features.matrix[:, :4], before, atol=1e-6)
+
+    def test_unknown_beats_are_skipped(self):
+        features = make_features()
+        features.add_likes([1], [99])
+
+        assert features.similar([99, 1], 2)[0] == []
+        assert len(features.similar([99, 1], 2)[1]) == 2
+
+    def test_top_k_excludes_and_stops_at_the_catalog(self):
+        features = make_features()
+        [result] = features.top_k(features.profile([1, 2]), 10, [{1, 2}])
+
+        assert sorted(beat_id for beat_id, _ in result) == [3, 4]
+        assert features.top_k(features.profile([1]), 5, [{1, 2, 3, 4}]) == [[]]
+
+    def test_batched_queries_match_single_ones(self):
+        features = make_features()
+        batch = features.similar([1, 3, 4], 2)
+
+        assert batch == [features.similar([beat_id], 2)[0] for beat_id in (1, 3, 4)]
+
+    def test_grows_past_its_capacity(self):
+        features = FeatureMatrix(capacity=2)
+        features.add_beats(range(1, 6), [90] * 5, [10] * 5, [100] * 5)
+        features.add_likes([1], [5])
+
+        assert features.size == 5
+        assert {beat_id for beat_id, _ in features.similar([5], 4)[0]} == {1, 2, 3, 4}
+
+    def test_users_project_to_fixed_signs(self):
+        features = FeatureMatrix(colike_dims=64)
+        projection = features.user_projection(np.array([1, 2, 1]))
+
+        assert set(np.unique(projection)) == {-1.0, 1.0}
+        assert (projection[0] == projection[2]).all()
+        assert (projection[0] != projection[1]).any()
+
+
+@pytest.mark.asyncio
+class TestRecommendationIndex:
+    async def test_unavailable_until_built(self):
+        async def load():
+            return make_features()
+
+        index = RecommendationIndex(load=load)
+        with pytest.raises(RecommendationsUnavailable):
+            index.similar(1, 3)
+
+        await index.rebuild()
+
+        assert len(index.similar(1, 3)) == 3
+        assert index.similar(99, 3) is None
+        assert index.stats()["beats"] == 4
+
+    async def test_recommend_leaves_out_liked_and_carted(self):
+        async def load():
+            return make_features()
+
+        index = RecommendationIndex(load=load)
+        await index.rebuild()
+
+        recommended = index.recommend({1}, 3, exclude={2})
+
+        assert [beat_id for beat_id, _ in recommended] == [3, 4]
+        assert index.recommend(set(), 3) == []
+
+    async def test_likes_and_uploads_update_the_index(self):
+        async def load():
+            return make_features()
+
+        index = RecommendationIndex(load=load)
+        await index.rebuild()
+        index.add_beat(5, 170, 199.0, 240)
+        index.record_like(1, 5)
+
+        assert index.similar(4, 1)[0][0] == 5
+        assert index.stats()["likes_applied"] == 1
+
+    async def test_failed_build_keeps_the_previous_index(self):
+        calls = []
+
+        async def load():
+            calls.append(1)
+            if len(calls) > 1:
+                raise RuntimeError("database is gone")
+            return make_features()
+
+        index = RecommendationIndex(load=load)
+        await index.rebuild()
+        await index.rebuild()
+
+        assert index.stats()["errors"] == 1
+        assert index.features is not None
+
+    async def test_vectors_are_built_off_the_event_loop(self, monkeypatch):
+        threads = []
+
+        class RecordingFeatures(FeatureMatrix):
+            def add_beats(self, *columns):
+                threads.append(threading.get_ident())
+                super().add_beats(*columns)
+
+            def add_likes(self, *columns):
+                threads.append(threading.get_ident())
+                super().add_likes(*columns)
+
+        class FakeResult:
+            def __init__(self, rows):
+                self.rows = rows
+
+            async def partitions(self, size):
+                for start in range(0, len(self.rows), size):
+                    yield self.rows[start : start + size]
+
+        class FakeSession:
+            def __init__(self):
+                self.results = [
+                    [(1, 90, 19.99, 120), (2, 92, 19.99, 125), (3, 170, 199.0, 240)],
+                    [(10, 1), (10, 2), (11, 3)],
+                ]
+
+            async def stream(self, query):
+                return FakeResult(self.results.pop(0))
+
+        monkeypatch.setattr(index_module, "FeatureMatrix", RecordingFeatures)
+        monkeypatch.setattr(index_module, "LOAD_BATCH_SIZE", 2)
+
+        features = await index_module.load_features(FakeSession())
+
+        assert features.size == 3
+        assert len(threads) == 4
+        assert threading.get_ident() not in threads
+        assert features.similar([1], 1)[0][0][0] == 2
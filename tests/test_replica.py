@@ -0,0 +1,105 @@
+import pytest
+from fastapi import Response
+from starlette.requests import Request
+
+from src.database.replica import (
+    PRIMARY_COOKIE,
+    ReplicaMonitor,
+    _sign,
+    stick_to_primary,
+    wrote_recently,
+)
+
+
+class FakeResult:
+    def __init__(self, lag):
+        self.lag = lag
+
+    def scalar(self):
+        return self.lag
+
+
+class FakeConnection:
+    def __init__(self, engine):
+        self.engine = engine
+
+    async def __aenter__(self):
+        if self.engine.down:
+            raise ConnectionRefusedError()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def execute(self, query):
+        return FakeResult(self.engine.lag)
+
+
+class FakeEngine:
+    """Stands in for the replica engine, reports a configurable lag"""
+
+    def __init__(self, lag=0.0, down=False):
+        self.lag = lag
+        self.down = down
+
+    def connect(self):
+        return FakeConnection(self)
+
+
+def request_with_cookies(cookies):
+    header = "; ".join(f"{name}={value}" for name, value in cookies.items())
+    return Request({"type": "http", "headers": [(b"cookie", header.encode())]})
+
+
+@pytest.mark.asyncio
+class TestReplicaMonitor:
+    async def test_unusable_before_first_check(self):
+        assert not ReplicaMonitor(FakeEngine()).usable()
+
+    async def test_lagging_replica_is_not_used(self):
+        engine = FakeEngine(lag=1.0)
+        monitor = ReplicaMonitor(engine, max_lag=5)
+
+        await monitor.check()
+        assert monitor.usable()
+
+        engine.lag = 30.0
+        await monitor.check()
+        assert not monitor.usable()
+
+    async def test_unreachable_replica_is_not_used(self):
+        engine = FakeEngine()
+        monitor = ReplicaMonitor(engine, max_lag=5)
+        await monitor.check()
+
+        engine.down = True
+        await monitor.check()
+        assert not monitor.usable()
+
+
+def test_writer_sticks_to_primary():
+    response = Response()
+    stick_to_primary(response)
+    cookie = response.headers["set-cookie"]
+    value = cookie.split(";")[0].split("=")[1]
+
+    assert wrote_recently(request_with_cookies({PRIMARY_COOKIE: value}))
+    assert not wrote_recently(request_with_cookies({PRIMARY_COOKIE: "1"}))
+    assert not wrote_recently(request_with_cookies({PRIMARY_COOKIE: "junk"}))
+    assert not wrote_recently(request_with_cookies({}))
+
+
+def test_forged_primary_cookies_are_ignored():
+    response = Response()
+    stick_to_primary(response)
+    value = response.headers["set-cookie"].split(";")[0].split("=")[1]
+    expires, signature = value.split(".")
+    far_future = str(int(expires) + 10**6)
+
+    assert not wrote_recently(request_with_cookies({PRIMARY_COOKIE: far_future}))
+    assert not wrote_recently(
+        request_with_cookies({PRIMARY_COOKIE: f"{far_future}.{signature}"})
+    )
+    assert not wrote_recently(
+        request_with_cookies({PRIMARY_COOKIE: f"{far_future}.{_sign(far_future)}"})
+    )
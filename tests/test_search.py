@@ -0,0 +1,31 @@
+from sqlalchemy.dialects import postgresql
+
+from src.beats.search import SearchFilters
+
+
+def compile_clauses(clauses):
+    return [str(clause.compile(dialect=postgresql.dialect())) for clause in clauses]
+
+
+def test_filters_are_grouped_per_facet():
+    filters = SearchFilters(q="dark", bpm_min=120, price_max=50)
+
+    assert len(filters.text) == 1
+    assert compile_clauses(filters.bpm) == ["beats.bpm >= %(bpm_1)s"]
+    assert compile_clauses(filters.price) == [
+        "beats.price_amount <= %(price_amount_1)s"
+    ]
+    assert len(filters.all()) == 3
+
+
+def test_text_match_uses_title_and_author_vectors():
+    (clause,) = SearchFilters(q="dark").text
+    sql = compile_clauses([clause])[0]
+
+    assert "beats.search_vector @@ websearch_to_tsquery" in sql
+    assert "users.search_vector @@ websearch_to_tsquery" in sql
+    assert "UNION" in sql
+
+
+def test_no_filters():
+    assert SearchFilters().all() == []
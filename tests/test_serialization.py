@@ -0,0 +1,72 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+
+from src.beats.schemas import TrackCard, track_card_rows
+from src.serialization import serialization
+from src.serialization.serialization import FastJSONResponse, dumps
+from src.users.schemas import TrackCardForLiked, liked_card_rows
+
+
+def card_row(beat_id: int, **changes):
+    row = {
+        "beat_id": beat_id,
+        "user_id": 3,
+        "title": "night drill",
+        "price": "29.99",
+        "price_amount": Decimal("29.99"),
+        "bpm": 140,
+        "image": "backend/images/beats/1.jpg",
+        "audio_file": "backend/beats_src/1.mp3",
+        "added_at": datetime(2024, 5, 1, 12, 30, 15, 123456),
+        "likes_count": 10,
+        "plays_count": 200,
+        "duration_seconds": 151.5,
+        "username": "producer3",
+        "user_total_likes": 40,
+        "user_total_plays": 900,
+        "profile_photo": "backend/images/profiles/3.jpg",
+    }
+    row.update(changes)
+    return row
+
+
+def validated(model, row):
+    """What the response model would have sent"""
+    return json.loads(json.dumps(jsonable_encoder(model(**row))))
+
+
+@pytest.mark.parametrize(
+    "row",
+    [
+        card_row(1),
+        card_row(2, duration_seconds=None, is_liked=True, in_cart=False),
+        card_row(3, score=1.5, added_at=datetime(2024, 5, 1)),
+        card_row(4, image_variants={64: "/custom"}),
+    ],
+)
+def test_rows_match_the_response_model(row):
+    assert json.loads(dumps(track_card_rows(row))) == validated(TrackCard, row)
+
+
+def test_subclass_fields_are_kept():
+    row = card_row(1, added_to_likes_at=datetime(2024, 6, 1, 8))
+    fast = json.loads(dumps(liked_card_rows(row)))
+    assert fast == validated(TrackCardForLiked, row)
+    assert fast["added_to_likes_at"] == "2024-06-01T08:00:00"
+
+
+def test_standard_library_encoder_gives_the_same_json(monkeypatch):
+    content = {"items": track_card_rows.many([card_row(1), card_row(2)])}
+    fast = dumps(content)
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert json.loads(dumps(content)) == json.loads(fast)
+
+
+def test_response_renders_with_the_fast_encoder():
+    response = FastJSONResponse({"items": [], "next_cursor": None})
+    assert response.body == b'{"items":[],"next_cursor":null}'
+    assert response.media_type == "application/json"
@@ -0,0 +1,195 @@
+import asyncio
+import io
+import wave
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from src.beats import previews
+from src.beats.previews import (
+    PreviewGenerator,
+    PreviewUnavailable,
+    ensure_preview,
+    preview_key,
+)
+from src.storage import (
+    LocalStorage,
+    StoredFileNotFound,
+    StoredFileResponse,
+    parse_range,
+)
+
+DATA = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = LocalStorage(tmp_path)
+    storage.save("beats/track.mp3", DATA)
+    return storage
+
+
+@pytest.fixture
+def app(storage):
+    async def stream(request):
+        key = "beats/track.mp3"
+        return StoredFileResponse(storage, key, request, storage.stat(key))
+
+    return Starlette(routes=[Route("/audio", stream, methods=["GET", "HEAD"])])
+
+
+@pytest.fixture
+def client(app):
+    return TestClient(app)
+
+
+def test_parse_range():
+    assert parse_range("bytes=0-99", 1000) == (0, 99)
+    assert parse_range("bytes=900-", 1000) == (900, 999)
+    assert parse_range("bytes=-100", 1000) == (900, 999)
+    assert parse_range("bytes=500-5000", 1000) == (500, 999)
+    assert parse_range("bytes=0-1,5-6", 1000) is None
+    assert parse_range("items=0-1", 1000) is None
+
+
+def test_full_file(client):
+    response = client.get("/audio")
+
+    assert response.status_code == 200
+    assert response.content == DATA
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-type"] == "audio/mpeg"
+    assert response.headers["content-length"] == str(len(DATA))
+
+
+def test_byte_range(client):
+    response = client.get("/audio", headers={"Range": "bytes=100-199"})
+
+    assert response.status_code == 206
+    assert response.content == DATA[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(DATA)}"
+
+
+def test_unsatisfiable_range(client):
+    response = client.get("/audio", headers={"Range": f"bytes={len(DATA)}-"})
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(DATA)}"
+
+
+def test_conditional_requests(client):
+    first = client.get("/audio")
+    etag = first.headers["etag"]
+
+    assert client.get("/audio", headers={"If-None-Match": etag}).status_code == 304
+    last_modified = first.headers["last-modified"]
+    cached = client.get("/audio", headers={"If-Modified-Since": last_modified})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+
+def test_if_range_with_a_stale_etag_sends_the_whole_file(client):
+    etag = client.get("/audio").headers["etag"]
+
+    fresh = client.get("/audio", headers={"Range": "bytes=0-9", "If-Range": etag})
+    stale = client.get("/audio", headers={"Range": "bytes=0-9", "If-Range": '"x"'})
+
+    assert fresh.status_code == 206
+    assert stale.status_code == 200
+    assert stale.content == DATA
+
+
+async def test_head_has_no_body(app):
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.head("/audio")
+
+    assert response.status_code == 200
+    assert response.content == b""
+    assert response.headers["content-length"] == str(len(DATA))
+
+
+def test_keys_cannot_escape_the_root(storage):
+    with pytest.raises(StoredFileNotFound):
+        storage.stat("../outside.mp3")
+
+
+def make_wav(seconds: float, framerate: int = 8000) -> bytes:
+    output = io.BytesIO()
+    with wave.open(output, "wb") as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(framerate)
+        writer.writeframes(b"\x00\x01" * int(framerate * seconds))
+    return output.getvalue()
+
+
+def test_preview_is_cut_once(storage):
+    storage.save("beats/long.wav", make_wav(seconds=5))
+
+    key = ensure_preview(storage, 7, "beats/long.wav", seconds=2)
+    assert key == preview_key(7, "beats/long.wav")
+    with wave.open(storage.open(key), "rb") as reader:
+        assert reader.getnframes() == 2 * 8000
+
+    mtime = storage.stat(key).mtime_ns
+    assert ensure_preview(storage, 7, "beats/long.wav", seconds=2) == key
+    assert storage.stat(key).mtime_ns == mtime
+
+
+@pytest.mark.parametrize(
+    "data", [b"RIFF", make_wav(seconds=1)[:30]], ids=["empty", "truncated header"]
+)
+def test_corrupt_audio_has_no_preview(storage, data):
+    storage.save("beats/broken.wav", data)
+
+    with pytest.raises(PreviewUnavailable):
+        ensure_preview(storage, 8, "beats/broken.wav", seconds=2)
+
+
+async def test_concurrent_requests_share_one_cut(storage, monkeypatch):
+    storage.save("beats/long.wav", make_wav(seconds=5))
+    calls = []
+
+    def counting_ensure_preview(*args):
+        calls.append(args)
+        return ensure_preview(*args)
+
+    monkeypatch.setattr(previews, "ensure_preview", counting_ensure_preview)
+    generator = PreviewGenerator(storage)
+
+    keys = await asyncio.gather(*(generator.get(7, "beats/long.wav") for _ in range(5)))
+
+    assert keys == [preview_key(7, "beats/long.wav")] * 5
+    assert len(calls) == 1
+
+
+def fake_tool(tmp_path, monkeypatch, name, script):
+    path = tmp_path / "bin" / name
+    path.parent.mkdir(exist_ok=True)
+    path.write_text(f"#!/bin/sh\n{script}\n")
+    path.chmod(0o755)
+    monkeypatch.setenv("PATH", str(path.parent), prepend=":")
+
+
+def test_compressed_previews_are_cut_by_streaming_ffmpeg(
+    storage, tmp_path, monkeypatch
+):
+    # Stops reading early like ffmpeg does once the preview is cut
+    fake_tool(tmp_path, monkeypatch, "ffmpeg", "head -c 1000")
+    storage.save("beats/long.mp3", DATA * 100)
+
+    key = ensure_preview(storage, 9, "beats/long.mp3", seconds=2)
+
+    assert key == preview_key(9, "beats/long.mp3")
+    with storage.open(key) as file:
+        assert file.read() == (DATA * 100)[:1000]
+
+
+def test_compressed_previews_need_ffmpeg(storage, monkeypatch):
+    monkeypatch.setattr(previews.shutil, "which", lambda name: None)
+
+    with pytest.raises(PreviewUnavailable):
+        ensure_preview(storage, 9, "beats/track.mp3", seconds=2)
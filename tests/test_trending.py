@@ -0,0 +1,119 @@
+from datetime import datetime
+
+from src.beats.trending import TrendingRanking, trending_candidates_query
+
+HOUR = 3600
+
+
+def make_card(beat_id: int, score: float, likes_count: int = 0):
+    return {
+        "beat_id": beat_id,
+        "user_id": 1,
+        "title": f"beat {beat_id}",
+        "price": "100",
+        "bpm": 140,
+        "image": "image.png",
+        "audio_file": "beat.mp3",
+        "added_at": datetime(2024, 1, 1),
+        "likes_count": likes_count,
+        "plays_count": 0,
+        "username": "producer",
+        "user_total_likes": 0,
+        "user_total_plays": 0,
+        "profile_photo": "photo.png",
+        "score": score,
+    }
+
+
+def make_ranking(top_k: int = 2) -> TrendingRanking:
+    return TrendingRanking(
+        top_k=top_k,
+        half_life_seconds=HOUR,
+        like_weight=1.0,
+        play_weight=0.5,
+        refresh_interval=60,
+    )
+
+
+class TestTrendingRanking:
+    def test_load_keeps_top_k_in_score_order(self):
+        ranking = make_ranking()
+        ranking.load([make_card(1, 1.0), make_card(2, 3.0), make_card(3, 2.0)], 0)
+
+        assert [card["beat_id"] for card in ranking.top(10)] == [2, 3]
+        assert [card["beat_id"] for card in ranking.top(1)] == [2]
+        assert "score" not in ranking.top(1)[0]
+
+    def test_like_moves_beat_up(self):
+        ranking = make_ranking()
+        ranking.load([make_card(1, 1.0), make_card(2, 1.5), make_card(3, 0.9)], 0)
+
+        ranking.record_like(3, now=0)
+        ranking.record_like(3, now=0)
+
+        assert [card["beat_id"] for card in ranking.top(2)] == [3, 2]
+        assert ranking.top(1)[0]["likes_count"] == 2
+
+    def test_recent_events_outweigh_old_ones(self):
+        ranking = make_ranking()
+        ranking.load([make_card(1, 0.0), make_card(2, 0.0)], 0)
+
+        ranking.record_like(1, now=0)
+        ranking.record_play(2, count=1, now=2 * HOUR)
+
+        # A play is worth half a like, but the like is two half-lives older
+        assert [card["beat_id"] for card in ranking.top(2)] == [2, 1]
+
+    def test_unknown_beat_overtaking_top_marks_dirty(self):
+        ranking = make_ranking()
+        ranking.load([make_card(1, 2.0), make_card(2, 1.5)], 0)
+        assert not ranking.needs_refresh(now=1)
+
+        ranking.record_like(42, now=1)
+        assert not ranking.needs_refresh(now=1)
+
+        ranking.record_like(42, now=1)
+        assert ranking.needs_refresh(now=1)
+
+    def test_refresh_interval(self):
+        ranking = make_ranking()
+        assert ranking.needs_refresh(now=0)
+
+        ranking.load([make_card(1, 1.0)], 0)
+        assert not ranking.needs_refresh(now=59)
+        assert ranking.needs_refresh(now=60)
+
+    def test_version_changes_with_served_cards(self):
+        ranking = make_ranking()
+        ranking.load([make_card(1, 1.0), make_card(2, 0.5)], 0)
+        loaded = ranking.version
+
+        ranking.record_like(2, now=0)
+        liked = ranking.version
+        assert liked != loaded
+
+        # Not a candidate and too low to enter the top
+        ranking.record_play(99, count=0, now=0)
+        assert ranking.version == liked
+
+
+def test_candidates_query_is_bounded():
+    query = trending_candidates_query(
+        limit=100, half_life_seconds=HOUR, like_weight=1.0, play_weight=0.1
+    )
+    assert query._limit == 100
+
+
+def test_pages_follow_each_other_across_refresh():
+    ranking = make_ranking(top_k=3)
+    rows = [make_card(1, 3.0), make_card(2, 2.0), make_card(3, 1.0)]
+    ranking.load(rows, 0)
+
+    first, after = ranking.page(2)
+    assert [card["beat_id"] for card in first] == [1, 2]
+
+    # Same likes one half-life later, every decayed score is halved
+    ranking.load([{**row, "score": row["score"] / 2} for row in rows], HOUR)
+    second, after = ranking.page(2, after)
+    assert [card["beat_id"] for card in second] == [3]
+    assert after is None
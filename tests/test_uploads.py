@@ -0,0 +1,290 @@
+import asyncio
+import hashlib
+import wave
+
+import pytest
+
+from src.beats.previews import PreviewUnavailable
+from src.storage import LocalStorage
+from src.uploads import chunks, metadata, worker
+from src.uploads.chunks import (
+    ChunkTooLarge,
+    create_partial,
+    file_sha256,
+    partial_path,
+    write_chunk,
+)
+from src.uploads.metadata import AudioInfo, read_audio_info
+from src.uploads.worker import UploadRejected, UploadWorker, process_upload
+
+
+async def body(*pieces):
+    for piece in pieces:
+        yield piece
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(chunks, "UPLOAD_TMP_DIR", str(tmp_path))
+
+
+async def test_chunks_are_written_at_their_offset():
+    create_partial("abc")
+
+    first = await write_chunk("abc", 0, body(b"hello ", b"big "), limit=100)
+    second = await write_chunk("abc", 10, body(b"world"), limit=100)
+
+    assert first == (10, hashlib.sha256(b"hello big ").hexdigest())
+    assert second[0] == 5
+    path = chunks.partial_path("abc")
+    assert path.read_bytes() == b"hello big world"
+    assert file_sha256(path) == hashlib.sha256(b"hello big world").hexdigest()
+
+
+async def test_oversized_chunk_is_rejected():
+    create_partial("abc")
+
+    with pytest.raises(ChunkTooLarge):
+        await write_chunk("abc", 0, body(b"x" * 10, b"x" * 10), limit=15)
+
+
+def test_checksum_ignores_bytes_past_the_received_size(tmp_path):
+    path = tmp_path / "file"
+    path.write_bytes(b"kept" + b"leftover of a failed chunk")
+
+    assert file_sha256(path, size=4) == hashlib.sha256(b"kept").hexdigest()
+
+
+def test_wav_duration(tmp_path):
+    path = tmp_path / "beat.wav"
+    with wave.open(str(path), "wb") as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(8000)
+        writer.writeframes(b"\x00\x00" * 8000 * 3)
+
+    assert read_audio_info(path).duration_seconds == 3
+
+
+def test_partial_files_are_read_in_the_format_of_the_upload(tmp_path):
+    path = tmp_path / "upload.part"
+    with wave.open(str(path), "wb") as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(8000)
+        writer.writeframes(b"\x00\x00" * 8000 * 2)
+
+    assert read_audio_info(path, ".WAV").duration_seconds == 2
+
+
+def test_compressed_durations_are_probed_without_decoding(tmp_path, monkeypatch):
+    tool = tmp_path / "bin" / "ffprobe"
+    tool.parent.mkdir()
+    tool.write_text("#!/bin/sh\necho 12.5\n")
+    tool.chmod(0o755)
+    monkeypatch.setenv("PATH", str(tool.parent), prepend=":")
+    path = tmp_path / "upload.part"
+    path.write_bytes(b"ID3")
+
+    assert read_audio_info(path, ".mp3").duration_seconds == 12.5
+
+
+def test_unknown_durations_without_ffprobe(tmp_path, monkeypatch):
+    monkeypatch.setattr(metadata.shutil, "which", lambda name: None)
+    path = tmp_path / "upload.part"
+    path.write_bytes(b"ID3")
+
+    assert read_audio_info(path, ".mp3").duration_seconds is None
+
+
+def test_wav_tempo(tmp_path):
+    np = pytest.importorskip("numpy")
+    rate, bpm = 22050, 120
+    signal = np.random.default_rng(0).normal(0, 50, rate * 20)
+    period = rate * 60 / bpm
+    for beat in range(int(len(signal) / period)):
+        start = int(beat * period)
+        signal[start : start + 500] += 8000 * np.exp(-np.arange(500) / 100)
+
+    path = tmp_path / "beat.wav"
+    with wave.open(str(path), "wb") as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(rate)
+        writer.writeframes(signal.astype("<i2").tobytes())
+
+    assert abs(read_audio_info(path).bpm - bpm) <= 1
+
+
+class FakeUploads:
+    def __init__(self, uploads):
+        self.status = {upload_id: "uploaded" for upload_id in uploads}
+        self.processed = []
+        self.failed = {}
+
+    async def claim(self, upload_id):
+        if upload_id == "unreachable":
+            raise ConnectionError("database is down")
+        if self.status.get(upload_id) != "uploaded":
+            return None
+        self.status[upload_id] = "processing"
+        return {"upload_id": upload_id}
+
+    async def process(self, upload):
+        if upload["upload_id"] == "silent":
+            raise UploadRejected("The tempo could not be detected, set the bpm")
+        if upload["upload_id"] == "broken":
+            raise RuntimeError("database is down")
+        self.processed.append(upload["upload_id"])
+        self.status[upload["upload_id"]] = "done"
+
+    async def fail(self, upload_id, error):
+        self.status[upload_id] = "failed"
+        self.failed[upload_id] = error
+
+    async def sweep(self, limit):
+        return [id_ for id_, status in self.status.items() if status == "uploaded"]
+
+    async def expire(self, limit):
+        expired = [id_ for id_, status in self.status.items() if status == "pending"]
+        for upload_id in expired:
+            self.status[upload_id] = "failed"
+        return expired
+
+
+def make_worker(uploads):
+    return UploadWorker(
+        claim=uploads.claim,
+        process=uploads.process,
+        fail=uploads.fail,
+        sweep=uploads.sweep,
+        expire=uploads.expire,
+        workers=2,
+        sweep_interval=3600,
+    )
+
+
+async def test_worker_processes_each_upload_once():
+    uploads = FakeUploads(["a", "b"])
+    worker = make_worker(uploads)
+    worker.enqueue("a")
+    worker.enqueue("a")
+    worker.start()
+    await asyncio.sleep(0)
+    worker.enqueue("a")
+    await worker.join()
+    await worker.stop()
+
+    assert sorted(uploads.processed) == ["a", "b"]
+    assert worker.stats()["processed"] == 2
+
+
+async def test_rejected_uploads_fail_and_errors_are_retried_later():
+    uploads = FakeUploads(["silent", "broken"])
+    worker = make_worker(uploads)
+
+    await worker.handle("silent")
+    await worker.handle("broken")
+
+    assert uploads.status == {"silent": "failed", "broken": "processing"}
+    assert "bpm" in uploads.failed["silent"]
+    assert (worker.failed, worker.errors) == (1, 1)
+
+
+async def test_worker_survives_errors_outside_processing():
+    uploads = FakeUploads(["a"])
+    worker = make_worker(uploads)
+    worker.start()
+    worker.enqueue("unreachable")
+    worker.enqueue("a")
+    await worker.join()
+    await worker.stop()
+
+    assert uploads.processed == ["a"]
+    assert worker.stats()["errors"] == 1
+
+
+async def test_sweep_expires_abandoned_uploads():
+    uploads = FakeUploads(["a"])
+    uploads.status["abandoned"] = "pending"
+    worker = make_worker(uploads)
+    worker.start()
+    # The first sweep runs right away
+    await asyncio.sleep(0)
+    await worker.join()
+    await worker.stop()
+
+    assert uploads.status == {"a": "done", "abandoned": "failed"}
+    assert worker.stats()["expired"] == 1
+
+
+class FakeResult:
+    def scalar_one(self):
+        return 7
+
+
+class FakeSessionMaker:
+    def __init__(self):
+        self.commits = 0
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def execute(self, statement):
+        return FakeResult()
+
+    async def commit(self):
+        self.commits += 1
+
+
+class FailingCache:
+    async def invalidate(self, *tags):
+        raise ConnectionError("redis is gone")
+
+
+class FakeIndex:
+    def __init__(self):
+        self.beats = []
+
+    def add_beat(self, *beat):
+        self.beats.append(beat)
+
+
+async def test_failures_after_the_commit_do_not_fail_the_upload(tmp_path, monkeypatch):
+    partial_path("up").write_bytes(b"RIFF")
+    sessions, index = FakeSessionMaker(), FakeIndex()
+
+    def no_preview(*args):
+        raise PreviewUnavailable("no ffmpeg")
+
+    def corrupt_waveform(*args):
+        raise wave.Error("file does not start with RIFF id")
+
+    monkeypatch.setattr(
+        worker, "read_audio_info", lambda path, suffix: AudioInfo(10.0, 90)
+    )
+    monkeypatch.setattr(worker, "async_session_maker", sessions)
+    monkeypatch.setattr(worker, "response_cache", FailingCache())
+    monkeypatch.setattr(worker, "recommendation_index", index)
+    monkeypatch.setattr(worker, "ensure_preview", no_preview)
+    monkeypatch.setattr(worker, "ensure_waveform", corrupt_waveform)
+    upload = {
+        "upload_id": "up",
+        "user_id": 3,
+        "title": "Night",
+        "price": "$20",
+        "bpm": None,
+        "filename": "night.wav",
+    }
+
+    beat_id = await process_upload(upload, LocalStorage(tmp_path / "store"))
+
+    assert beat_id == 7
+    assert sessions.commits == 1
+    assert index.beats == []
@@ -0,0 +1,138 @@
+import asyncio
+import io
+import wave
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.beats import waveforms  # noqa: E402
+from src.beats.waveforms import (  # noqa: E402
+    HEADER,
+    WaveformGenerator,
+    WaveformUnavailable,
+    ensure_waveform,
+    make_waveform,
+    read_waveform,
+    resample_waveform,
+    waveform_key,
+)
+from src.storage import LocalStorage  # noqa: E402
+
+
+def make_wav(seconds: float, width: int = 2, channels: int = 2, rate: int = 8000):
+    """A 440 Hz tone whose amplitude rises from silence to full scale"""
+    t = np.arange(int(seconds * rate)) / rate
+    signal = np.sin(2 * np.pi * 440 * t) * (t / seconds)
+    if width == 1:
+        samples = (signal * 127 + 128).astype("u1")
+    elif width == 2:
+        samples = (signal * 32767).astype("<i2")
+    else:
+        values = (signal * (2**23 - 1)).astype("<i4")
+        samples = values.view("u1").reshape(-1, 4)[:, :3].copy()
+    frames = np.repeat(samples.reshape(len(t), -1), channels, axis=0)
+
+    output = io.BytesIO()
+    with wave.open(output, "wb") as writer:
+        writer.setnchannels(channels)
+        writer.setsampwidth(width)
+        writer.setframerate(rate)
+        writer.writeframes(frames.tobytes())
+    return output.getvalue()
+
+
+@pytest.mark.parametrize("width", [1, 2, 3])
+def test_peaks_follow_the_signal(width):
+    data = make_waveform(io.BytesIO(make_wav(10, width=width)), ".wav", peaks=100)
+
+    assert len(data) == HEADER.size + 100 * 2 * 2
+    (bits, rate, samples_per_peak), values = read_waveform(io.BytesIO(data))
+    assert (bits, rate, samples_per_peak) == (16, 8000, 800)
+    mins, maxs = values[:, 0] / 32767, values[:, 1] / 32767
+    assert (mins <= maxs).all()
+    assert abs(maxs[0]) < 0.02 and maxs[-1] > 0.97 and mins[-1] < -0.97
+    assert np.all(np.diff(maxs[::10]) > 0)
+
+
+def test_long_files_are_decoded_block_by_block(monkeypatch):
+    monkeypatch.setattr(waveforms, "BLOCK_FRAMES", 1000)
+    data = make_waveform(io.BytesIO(make_wav(10, channels=1)), ".wav", peaks=1024)
+    _, values = read_waveform(io.BytesIO(data))
+    # 80000 samples in windows of 256 give fewer pairs than requested
+    assert len(values) == 313
+
+
+def test_stored_waveform_is_memory_mapped_and_resampled(tmp_path):
+    path = tmp_path / "beat.bbwf"
+    path.write_bytes(make_waveform(io.BytesIO(make_wav(10)), ".wav", peaks=200))
+
+    with open(path, "rb") as file:
+        _, values = read_waveform(file)
+        assert isinstance(values.base, np.memmap) or isinstance(values, np.memmap)
+        full_max = values[:, 1].max()
+
+    with open(path, "rb") as file:
+        smaller = resample_waveform(file, 50)
+    (_, _, samples_per_peak), values = read_waveform(io.BytesIO(smaller))
+    assert len(values) == 50 and samples_per_peak == 1600
+    assert values[:, 1].max() == full_max
+
+
+def test_eight_bit_waveforms_are_half_the_size(monkeypatch):
+    monkeypatch.setattr(waveforms, "WAVEFORM_BITS", 8)
+    source = io.BytesIO(make_wav(5))
+    sample_rate, blocks = waveforms._wav_blocks(source)
+    samples_per_peak, mins, maxs = waveforms.compute_peaks(blocks, 100)
+    data = waveforms.encode_waveform(sample_rate, samples_per_peak, mins, maxs, 8)
+
+    assert len(data) == HEADER.size + 200
+    assert read_waveform(io.BytesIO(data))[0][0] == 8
+
+
+def test_waveform_is_computed_once(tmp_path):
+    storage = LocalStorage(tmp_path)
+    storage.save("beats/1.wav", make_wav(2))
+
+    key = ensure_waveform(storage, 1, "beats/1.wav")
+    assert key == waveform_key(1)
+    computed = storage.stat(key).mtime_ns
+
+    assert ensure_waveform(storage, 1, "beats/1.wav") == key
+    assert storage.stat(key).mtime_ns == computed
+
+
+def test_compressed_audio_needs_ffmpeg(monkeypatch):
+    monkeypatch.setattr(waveforms.shutil, "which", lambda name: None)
+    with pytest.raises(waveforms.WaveformUnavailable):
+        make_waveform(io.BytesIO(b"ID3"), ".mp3")
+
+
+@pytest.mark.parametrize(
+    "data",
+    [b"RIFF", make_wav(1)[:30], b"not a wav file"],
+    ids=["empty", "truncated header", "not a wav"],
+)
+def test_corrupt_wav_files_have_no_waveform(data):
+    with pytest.raises(WaveformUnavailable):
+        make_waveform(io.BytesIO(data), ".wav")
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_decode(tmp_path, monkeypatch):
+    storage = LocalStorage(tmp_path)
+    storage.save("beats/1.wav", make_wav(2))
+    calls = []
+
+    def counting_ensure_waveform(*args):
+        calls.append(args)
+        return ensure_waveform(*args)
+
+    monkeypatch.setattr(waveforms, "ensure_waveform", counting_ensure_waveform)
+    generator = WaveformGenerator(storage)
+
+    keys = await asyncio.gather(*(generator.get(1, "beats/1.wav") for _ in range(5)))
+
+    assert keys == [waveform_key(1)] * 5
+    assert len(calls) == 1
+    assert generator._pending == {}